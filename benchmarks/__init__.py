@@ -0,0 +1,6 @@
+#
+# benchmarks of unlight2:
+#   bench_*.py  micro-benchmarks of single components
+#   suite.py    load test of a real server, JSON report + baseline compare
+#               python -m benchmarks.suite --help
+#
@@ -0,0 +1,84 @@
+#
+# connection churn: one request per connection (health checks, clients
+# without keep-alive), object pool and gc tuning on/off
+#
+#   python -m benchmarks.bench_churn [connections] [seconds]
+#
+import asyncio
+import gc
+import os
+import signal
+import sys
+import multiprocessing as mp
+from time import perf_counter
+
+from unlight2.server import Server
+
+from .harness import free_port, running
+
+CONNECTIONS = 32
+SECONDS = 5
+MODES = (
+    ("no pool", dict(pool_size=0, gc_freeze=False)),
+    ("pool", dict(pool_size=256, gc_freeze=False)),
+    ("pool+gc_freeze", dict(pool_size=256, gc_freeze=True)),
+    ("pool+gc_freeze+threshold", dict(pool_size=256, gc_freeze=True, gc_threshold=(50000, 20, 100))))
+
+REQUEST = b"GET /health HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n"
+
+
+def serve(port, options, stats):
+    server = Server(("127.0.0.1", port), shutdown_timeout=1, **options)
+
+    @server.router.get("/health")
+    async def health(request, response):
+        response.json({"status": "ok"})
+
+    def report(sig, frame):
+        times = os.times()
+        stats[:] = [sum(gen["collections"] for gen in gc.get_stats()), times.user + times.system]
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    signal.signal(signal.SIGUSR1, report)
+    server.run()
+
+async def client(port, deadline, latencies):
+    while perf_counter() < deadline:
+        start = perf_counter()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(REQUEST)
+        await reader.read()
+        writer.close()
+        latencies.append(perf_counter() - start)
+
+async def load(port, connections, seconds):
+    latencies = []
+    deadline = perf_counter() + seconds
+    await asyncio.gather(*(client(port, deadline, latencies) for _ in range(connections)))
+    return latencies
+
+def run_mode(name, options, connections, seconds):
+    port = free_port()
+    stats = mp.Manager().list()
+    with running(serve, (port, options, stats), port, stop=signal.SIGUSR1): # reports, then stops
+        latencies = asyncio.run(load(port, connections, seconds))
+
+    latencies.sort()
+    total = len(latencies)
+    p50 = latencies[total // 2] * 1000
+    p99 = latencies[int(total * 0.99)] * 1000
+    collections, cpu = stats
+    print(f"{name:<26} {total / seconds:10.0f} {p50:8.2f} {p99:8.2f} "
+            f"{cpu / total * 1e6:12.1f} {collections:>8}")
+
+def main():
+    args = [int(arg) for arg in sys.argv[1:3]]
+    connections, seconds = args + [CONNECTIONS, SECONDS][len(args):]
+    print(f"{connections} concurrent clients, new connection per request, {seconds}s per mode")
+    print(f"{'mode':<26} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'server us/req':>12} {'gc runs':>8}")
+    for name, options in MODES:
+        run_mode(name, options, connections, seconds)
+
+
+if __name__ == "__main__":
+    main()
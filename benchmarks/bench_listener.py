@@ -0,0 +1,66 @@
+#
+# listener: loopback tcp (default and tuned socket options) vs unix domain
+# socket, single worker, keep-alive and new-connection scenarios
+#
+#   python -m benchmarks.bench_listener [connections] [seconds]
+#
+import os
+import sys
+import tempfile
+
+from .harness import free_port, running
+from .loadgen import load
+from .scenarios import build_scenarios, build_server, write_static
+
+CONNECTIONS = 32
+SECONDS = 3
+SCENARIOS = ("hello", "hello_close", "json_post", "static_small")
+LISTENERS = (
+    ("tcp", {}),
+    ("tcp tuned", dict(tcp_defer_accept=1, tcp_fastopen=256, backlog=4096)),
+    ("unix", None))
+
+
+def serve(address, static_dir, options):
+    build_server(address, static_dir, **options).run()
+
+def run_listener(name, options, static_dir, scenarios, connections, seconds):
+    if options is None:
+        address, options = os.path.join(static_dir, "unlight2.sock"), {}
+        host, port = address, None
+    else:
+        address = port = free_port()
+        host = "127.0.0.1"
+    results = {}
+    with running(serve, (address, static_dir, options), address):
+        for scenario in scenarios:
+            results[scenario.name] = result = load(host, port, scenario, connections,
+                    seconds, 0.5).summary()
+            print(f"{name:<10} {scenario.name:<14} {result['rps']:10.0f} {result['p50_ms']:8.3f} "
+                    f"{result['p99_ms']:8.3f} {result['errors']:6d}", flush=True)
+    return results
+
+def main():
+    args = [int(arg) for arg in sys.argv[1:3]]
+    connections, seconds = args + [CONNECTIONS, SECONDS][len(args):]
+    scenarios = [scenario for scenario in build_scenarios() if scenario.name in SCENARIOS]
+    print(f"{connections} connections, {seconds}s per scenario, one worker")
+    print(f"{'listener':<10} {'scenario':<14} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    results = {}
+    with tempfile.TemporaryDirectory() as static_dir:
+        write_static(static_dir)
+        for name, options in LISTENERS:
+            results[name] = run_listener(name, options, static_dir, scenarios,
+                    connections, seconds)
+
+    print(f"\nunix vs tcp: {'req/s':>8} {'p50':>8} {'p99':>8}")
+    for scenario in scenarios:
+        tcp, unix = results["tcp"][scenario.name], results["unix"][scenario.name]
+        if not (tcp["rps"] and tcp["p50_ms"] and tcp["p99_ms"]):
+            continue
+        print(f"{scenario.name:<12} {unix['rps'] / tcp['rps'] - 1:+8.1%} "
+                f"{unix['p50_ms'] / tcp['p50_ms'] - 1:+8.1%} {unix['p99_ms'] / tcp['p99_ms'] - 1:+8.1%}")
+
+
+if __name__ == "__main__":
+    main()
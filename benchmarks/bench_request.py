@@ -0,0 +1,135 @@
+#
+# request parse overhead:
+#   httptools alone vs the old eager field decoding vs lazy `Request`,
+#   with handlers reading nothing / the path / query + headers + cookies
+#
+#   python -m benchmarks.bench_request
+#
+from time import perf_counter
+
+from httptools import HttpRequestParser, parse_url
+
+from unlight2.simple_http import Request
+
+LOOPS = 100000
+
+RAW = (b"GET /api/v1/users?page=2&size=20&sort=name HTTP/1.1\r\n"
+    b"Host: bench.local\r\n"
+    b"User-Agent: Mozilla/5.0 (X11; Linux x86_64) Gecko/20100101 Firefox/118.0\r\n"
+    b"Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8\r\n"
+    b"Accept-Language: en-US,en;q=0.5\r\n"
+    b"Accept-Encoding: gzip, deflate, br\r\n"
+    b"Cookie: session=8f2a1c; theme=dark; lang=en\r\n"
+    b"Cache-Control: max-age=0\r\n"
+    b"Connection: keep-alive\r\n\r\n")
+
+
+class Parse:
+    ''' stand-in protocol: parser callbacks only '''
+
+    env = {}
+
+    def __init__(self, request_cls):
+        self.request_cls = request_cls
+        self.request = None
+
+    def on_message_begin(self):
+        self.request = self.request_cls(self)
+
+    def on_url(self, burl):
+        self.request.add_burl(burl)
+
+    def on_header(self, bname, bvalue):
+        self.request.add_bheader(bname, bvalue)
+
+
+class Bare:
+    ''' no request object at all '''
+
+    def __init__(self, protocol):
+        pass
+
+    def add_burl(self, burl):
+        pass
+
+    def add_bheader(self, bname, bvalue):
+        pass
+
+
+class Eager:
+    ''' the old `Request`: every url part and known header classified up front '''
+
+    __slots__ = ("burl", "bheaders", "bpath", "bquery_params", "bhost", "bagent",
+            "baccept", "baccept_encoding", "bcookies", "bcache_control")
+
+    def __init__(self, protocol):
+        self.bheaders = {}
+
+    def add_burl(self, burl):
+        self.burl = burl
+        url = parse_url(burl)
+        self.bhost = url.host
+        self.bpath = url.path
+        bquery_params = {}
+        if url.query:
+            for q in url.query.split(b"&"):
+                p, v = q.split(b"=")
+                bquery_params[p] = v
+        self.bquery_params = bquery_params
+
+    def add_bheader(self, bname, bvalue):
+        bname = bname.strip()
+        self.bheaders[bname] = bvalue
+        l_bname = bname.lower()
+        if l_bname == b"host":
+            self.bhost = bvalue
+        elif l_bname == b"user-agent":
+            self.bagent = bvalue
+        elif l_bname == b"accept":
+            self.baccept = bvalue
+        elif l_bname == b"accept-encoding":
+            self.baccept_encoding = bvalue
+        elif l_bname == b"cookie":
+            self.bcookies = bvalue.split(b";")
+        elif l_bname == b"cache-control":
+            self.bcache_control = bvalue
+
+    def get_path(self):
+        return self.bpath.decode()
+
+
+def read_nothing(request):
+    pass
+
+def read_path(request):
+    request.get_path()
+
+def read_more(request):
+    request.get_path()
+    request.get_query("page")
+    request.get_bheader(b"accept-encoding")
+    request.get_cookie("session")
+
+def rate(request_cls, read):
+    protocol = Parse(request_cls)
+    parser = HttpRequestParser(protocol)
+    start = perf_counter()
+    for _ in range(LOOPS):
+        parser.feed_data(RAW)
+        read(protocol.request)
+    return LOOPS / (perf_counter() - start)
+
+def main():
+    print(f"{'case':<28} {'req/s':>12}")
+    for name, request_cls, read in (
+            ("httptools only", Bare, read_nothing),
+            ("eager (old)", Eager, read_nothing),
+            ("eager (old), path", Eager, read_path),
+            ("lazy, nothing read", Request, read_nothing),
+            ("lazy, path", Request, read_path),
+            ("lazy, path+query+headers", Request, read_more)):
+        print(f"{name:<28} {rate(request_cls, read):12.0f}")
+
+
+if __name__ == "__main__":
+    main()
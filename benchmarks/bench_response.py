@@ -0,0 +1,96 @@
+#
+# response encoding micro-benchmark:
+#   pre-encoded status/header blocks + cached Date vs the old `+=` encoder
+#
+#   python -m benchmarks.bench_response
+#
+from time import perf_counter
+
+import orjson as json
+
+from unlight2.simple_http import Response
+
+LOOPS = 200000
+
+
+class NullProtocol:
+    ''' swallow writes '''
+
+    def write(self, enc_data, response=None):
+        pass
+
+
+class LegacyResponse:
+    ''' the old `Response` encoder '''
+
+    def __init__(self, protocol, version="1.1"):
+        self.protocol = protocol
+        self.version = version
+        self.reset()
+        self.headers["Connection"] = "keep-alive"
+        self.headers["Keep-Alive"] = 10
+
+    def reset(self):
+        self.code = 200
+        self.msg = "OK"
+        self.headers = {
+                "Content-Type": "text/plain;charset=utf-8",
+                "Connection": "close"}
+
+    def encode_headers(self):
+        headers = ""
+        for h, v in self.headers.items():
+            if v:
+                headers += f"{h}: {v}\r\n"
+        title = f"HTTP/{self.version} {self.code} {self.msg}\r\n"
+        return title.encode() + headers.encode()
+
+    def text(self, data):
+        enc_data = data.encode()
+        self.headers["Content-Type"] = "text/plain"
+        self.headers["Content-Length"] = len(enc_data)
+        self.protocol.write(self.encode_headers() + b"\r\n" + enc_data)
+
+    def json(self, data):
+        enc_data = json.dumps(data)
+        self.headers["Content-Type"] = "application/json"
+        self.headers["Content-Length"] = len(enc_data)
+        self.protocol.write(self.encode_headers() + b"\r\n" + enc_data)
+
+
+def rate_legacy(protocol, method, data):
+    response = LegacyResponse(protocol)
+    send = getattr(response, method)
+    reset = response.reset
+    start = perf_counter()
+    for _ in range(LOOPS):
+        send(data)
+        reset()
+    return LOOPS / (perf_counter() - start)
+
+def rate(protocol, method, data):
+    response = Response(protocol, None)
+    response.set_keep_alive(10)
+    send = getattr(response, method)
+    reset = response.reset
+    start = perf_counter()
+    for _ in range(LOOPS):
+        response.keep_alive = True
+        send(data)
+        reset()
+    return LOOPS / (perf_counter() - start)
+
+def main():
+    protocol = NullProtocol()
+    cases = (
+        ("text", "hello world!"),
+        ("json", {"hello": "world", "id": 1}))
+    print(f"{'case':<6} {'legacy/s':>12} {'new/s':>12}")
+    for method, data in cases:
+        old = rate_legacy(protocol, method, data)
+        new = rate(protocol, method, data)
+        print(f"{method:<6} {old:12.0f} {new:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
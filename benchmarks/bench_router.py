@@ -0,0 +1,63 @@
+#
+# route lookup micro-benchmark:
+#   compiled route tree vs the old `dict + static prefix scan`
+#
+#   python -m benchmarks.bench_router
+#
+import tempfile
+from time import perf_counter
+
+from unlight2.httproute import HttpRouter
+
+ROUTE_COUNTS = (10, 100, 1000)
+LOOPS = 200000
+
+
+def legacy_lookup(table, path):
+    ''' the old `HttpRouter.handle_request` lookup '''
+    handle = table["GET"].get(path)
+    if handle:
+        return handle
+    for path_key, path_dest in table["STATIC"].items():
+        if path.startswith(path_key):
+            return path_dest
+    return None
+
+def build(n, static_dir):
+    router = HttpRouter.get_router()
+    table = {"GET": {}, "STATIC": {}}
+    handler = lambda request, response: None
+    for i in range(n):
+        router.get(f"/api/v1/res{i}")(handler)
+        router.get(f"/users{i}/{{id}}/orders/{{oid}}")(handler)
+        router.set_static_dir(f"/static{i:04d}", static_dir)
+        table["GET"][f"/api/v1/res{i}"] = handler
+        table["STATIC"][f"/static{i:04d}"] = static_dir
+    router.freeze()
+    return router, table
+
+def rate(func, *args):
+    start = perf_counter()
+    for _ in range(LOOPS):
+        func(*args)
+    return LOOPS / (perf_counter() - start)
+
+def main():
+    static_dir = tempfile.mkdtemp()
+    print(f"{'routes':>6} {'case':<8} {'legacy/s':>12} {'tree/s':>12}")
+    for n in ROUTE_COUNTS:
+        router, table = build(n, static_dir)
+        last = n - 1
+        cases = (
+            ("exact", f"/api/v1/res{last}"),
+            ("static", f"/static{last:04d}/css/site.css"),
+            ("params", f"/users{last}/42/orders/7"))
+        for name, path in cases:
+            legacy = rate(legacy_lookup, table, path) if name != "params" else 0
+            tree = rate(router.lookup, "GET", path)
+            legacy = f"{legacy:12.0f}" if legacy else f"{'-':>12}"
+            print(f"{n:>6} {name:<8} {legacy} {tree:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#
+# json body validation: hand-written dict checks vs compiled `body=` schema,
+# on the decoded body and on the raw bytes (decode included)
+#
+#   python -m benchmarks.bench_schema
+#
+from dataclasses import dataclass, field
+from typing import Optional, Literal
+from time import perf_counter
+
+import orjson as json
+
+from unlight2.schema import compile_schema
+
+LOOPS = 20000
+
+
+@dataclass
+class Item:
+    sku: str
+    price: float
+    qty: int = 1
+
+@dataclass
+class Address:
+    city: str
+    zip: str
+    line: Optional[str] = None
+
+@dataclass
+class Order:
+    user: str
+    items: list[Item]
+    address: Address
+    mode: Literal["standard", "express"] = "standard"
+    tags: list[str] = field(default_factory=list)
+    note: Optional[str] = None
+
+
+def hand_written(data):
+    ''' what handlers did before: isinstance checks, then build the objects '''
+    if not isinstance(data, dict):
+        raise ValueError("body: expected object")
+    user = data.get("user")
+    if not isinstance(user, str):
+        raise ValueError("user: expected str")
+    raw_items = data.get("items")
+    if not isinstance(raw_items, list):
+        raise ValueError("items: expected array")
+    items = []
+    for i, raw in enumerate(raw_items):
+        if not isinstance(raw, dict):
+            raise ValueError(f"items[{i}]: expected object")
+        sku, price, qty = raw.get("sku"), raw.get("price"), raw.get("qty", 1)
+        if not isinstance(sku, str):
+            raise ValueError(f"items[{i}].sku: expected str")
+        if isinstance(price, bool) or not isinstance(price, (int, float)):
+            raise ValueError(f"items[{i}].price: expected float")
+        if isinstance(qty, bool) or not isinstance(qty, int):
+            raise ValueError(f"items[{i}].qty: expected int")
+        items.append(Item(sku, float(price), qty))
+    raw_address = data.get("address")
+    if not isinstance(raw_address, dict):
+        raise ValueError("address: expected object")
+    city, zip_code, line = raw_address.get("city"), raw_address.get("zip"), raw_address.get("line")
+    if not isinstance(city, str) or not isinstance(zip_code, str):
+        raise ValueError("address: expected city and zip")
+    if line is not None and not isinstance(line, str):
+        raise ValueError("address.line: expected str")
+    mode = data.get("mode", "standard")
+    if mode not in ("standard", "express"):
+        raise ValueError("mode: expected 'standard' | 'express'")
+    tags = data.get("tags", [])
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError("tags: expected array of str")
+    note = data.get("note")
+    if note is not None and not isinstance(note, str):
+        raise ValueError("note: expected str")
+    return Order(user, items, Address(city, zip_code, line), mode, tags, note)
+
+def payload(n_items):
+    return json.dumps({
+        "user": "user-4711",
+        "items": [{"sku": f"SKU-{i:05d}", "price": 9.99 + i, "qty": i % 3 + 1}
+            for i in range(n_items)],
+        "address": {"city": "Berlin", "zip": "10115", "line": "Unter den Linden 1"},
+        "mode": "express",
+        "tags": ["gift", "priority"]})
+
+def rate(func, arg, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(LOOPS):
+            func(arg)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return LOOPS / best
+
+def main():
+    convert = compile_schema(Order)
+    decode_old = lambda bbody: json.loads(bbody.decode()) # str copy first, as `add_bbody` did
+    cases = (
+        ("decode only (old: bytes -> str -> json)", decode_old, "bytes"),
+        ("decode only (bytes -> json)", json.loads, "bytes"),
+        ("hand-written checks", hand_written, "data"),
+        ("compiled schema", convert, "data"),
+        ("old decode + hand-written", lambda b: hand_written(decode_old(b)), "bytes"),
+        ("decode + compiled schema", lambda b: convert(json.loads(b)), "bytes"))
+    print(f"{'items':>5} {'bytes':>6} {'case':<40} {'per second':>12} {'us':>8}")
+    for n_items in (1, 10, 100):
+        bbody = payload(n_items)
+        data = json.loads(bbody)
+        assert convert(data) == hand_written(data)
+        for name, func, kind in cases:
+            per_second = rate(func, bbody if kind == "bytes" else data)
+            print(f"{n_items:>5} {len(bbody):>6} {name:<40} {per_second:12.0f} {1e6 / per_second:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#
+# connection timeout micro-benchmark:
+#   shared `TimerWheel` vs one `loop.call_later` handle per timeout
+#
+#   python -m benchmarks.bench_timer
+#
+import asyncio
+import tracemalloc
+from time import perf_counter
+
+import uvloop
+
+from unlight2.timer import TimerWheel
+
+CHURN = 100000                   # connections, each arms/cancels 3 timeouts
+IDLE_COUNTS = (1000, 10000, 100000)
+REARM = 100000
+
+
+def noop():
+    pass
+
+def churn(timers):
+    ''' request timeout -> response timeout -> keep-alive, like one short connection '''
+    start = perf_counter()
+    for _ in range(CHURN):
+        timers.call_later(60, noop).cancel()
+        timers.call_later(60, noop).cancel()
+        timers.call_later(10, noop).cancel()
+    return CHURN / (perf_counter() - start)
+
+def idle(timers, n):
+    ''' n idle keep-alive connections, then re-arm their timers one by one '''
+    tracemalloc.start()
+    handles = [timers.call_later(10 + i % 50, noop) for i in range(n)]
+    memory = tracemalloc.get_traced_memory()[0] / n
+    tracemalloc.stop()
+
+    start = perf_counter()
+    for i in range(REARM):
+        idx = i % n
+        handles[idx].cancel()
+        handles[idx] = timers.call_later(10, noop)
+    rearm = REARM / (perf_counter() - start)
+    for handle in handles:
+        handle.cancel()
+    return memory, rearm
+
+async def run():
+    loop = asyncio.get_running_loop()
+    wheel = TimerWheel(loop)
+    print(f"{'case':<14} {'call_later':>12} {'wheel':>12}")
+    print(f"{'churn conn/s':<14} {churn(loop):12.0f} {churn(wheel):12.0f}")
+    for n in IDLE_COUNTS:
+        loop_mem, loop_rearm = idle(loop, n)
+        wheel_mem, wheel_rearm = idle(wheel, n)
+        print(f"{n} idle")
+        print(f"{'  rearm/s':<14} {loop_rearm:12.0f} {wheel_rearm:12.0f}")
+        print(f"{'  bytes/conn':<14} {loop_mem:12.0f} {wheel_mem:12.0f}")
+        await asyncio.sleep(0) # let the loop drop cancelled handles
+
+def main():
+    for name, runner in (("uvloop", uvloop.run), ("asyncio", asyncio.run)):
+        print(f"[{name}]")
+        runner(run())
+
+
+if __name__ == "__main__":
+    main()
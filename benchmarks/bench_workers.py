@@ -0,0 +1,85 @@
+#
+# prefork accept strategies:
+#   per-worker reuse_port sockets vs one listener shared by all workers,
+#   with and without cpu pinning. long-lived keep-alive clients make the
+#   kernel's reuse_port hashing visible in the per-worker distribution
+#
+#   python -m benchmarks.bench_workers [workers] [connections] [seconds]
+#
+import asyncio
+import os
+import sys
+from time import perf_counter, sleep
+
+from unlight2.server import Server
+
+from .harness import free_port, running
+
+WORKERS = 4
+CONNECTIONS = 32
+SECONDS = 5
+MODES = (
+    ("reuse_port", False),
+    ("shared", False),
+    ("reuse_port", True),
+    ("shared", True))
+
+REQUEST = b"GET / HTTP/1.1\r\nHost: bench\r\n\r\n"
+
+
+def serve(port, workers, listener, cpu_affinity):
+    server = Server(("127.0.0.1", port), shutdown_timeout=1)
+
+    @server.router.get("/")
+    async def index(request, response):
+        response.text(str(os.getpid()))
+
+    server.run_multi_process(workers, listener=listener, cpu_affinity=cpu_affinity)
+
+async def client(port, deadline, latencies, pids):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while perf_counter() < deadline:
+            start = perf_counter()
+            writer.write(REQUEST)
+            head = await reader.readuntil(b"\r\n\r\n")
+            size = int(head.split(b"Content-Length: ", 1)[1].split(b"\r\n", 1)[0])
+            body = await reader.readexactly(size)
+            latencies.append(perf_counter() - start)
+            pids[body] = pids.get(body, 0) + 1
+    finally:
+        writer.close()
+
+async def load(port, connections, seconds):
+    latencies, pids = [], {}
+    deadline = perf_counter() + seconds
+    await asyncio.gather(*(client(port, deadline, latencies, pids) for _ in range(connections)))
+    return latencies, pids
+
+def run_mode(workers, connections, seconds, listener, cpu_affinity):
+    port = free_port()
+    with running(serve, (port, workers, listener, cpu_affinity), port):
+        sleep(0.5) # every worker listening
+        latencies, pids = asyncio.run(load(port, connections, seconds))
+
+    latencies.sort()
+    total = len(latencies)
+    p50 = latencies[total // 2] * 1000
+    p99 = latencies[int(total * 0.99)] * 1000
+    shares = sorted((count * 100 / total for count in pids.values()), reverse=True)
+    shares += [0.0] * (workers - len(shares))
+    name = f"{listener}{'+affinity' if cpu_affinity else ''}"
+    print(f"{name:<20} {total / seconds:10.0f} {p50:8.2f} {p99:8.2f}  "
+            + " ".join(f"{share:5.1f}" for share in shares))
+
+def main():
+    args = [int(arg) for arg in sys.argv[1:4]]
+    workers, connections, seconds = args + [WORKERS, CONNECTIONS, SECONDS][len(args):]
+    print(f"{workers} workers, {connections} keep-alive connections, {seconds}s per mode")
+    print(f"{'mode':<20} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8}  requests per worker %")
+    for listener, cpu_affinity in MODES:
+        run_mode(workers, connections, seconds, listener, cpu_affinity)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#
+# server processes of the load benchmarks (and tests/): free port, start,
+# wait until listening, stop
+#
+import os
+import signal
+import socket
+import multiprocessing as mp
+from contextlib import contextmanager
+from time import monotonic, sleep
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_listening(address, timeout=10):
+    ''' `address`: port on 127.0.0.1 or unix socket path '''
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        try:
+            if isinstance(address, str):
+                with socket.socket(socket.AF_UNIX) as sock:
+                    sock.connect(address)
+            else:
+                socket.create_connection(("127.0.0.1", address)).close()
+            return
+        except OSError:
+            sleep(0.05)
+    raise RuntimeError("server did not start")
+
+@contextmanager
+def running(target, args, address, stop=signal.SIGTERM):
+    ''' `target(*args)` runs the server in a child process, listening on
+        `address` inside the block, sent `stop` and joined after it '''
+    process = mp.Process(target=target, args=args)
+    process.start()
+    try:
+        wait_listening(address)
+        yield process
+    finally:
+        os.kill(process.pid, stop)
+        process.join()
@@ -0,0 +1,152 @@
+#
+# closed-loop http/1.1 load generator: every connection sends its next
+# request (batch) as soon as the previous answer is in
+#
+import asyncio
+import multiprocessing as mp
+from time import perf_counter
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+class Result:
+    ''' latencies (seconds) of answered requests, merged across client processes '''
+
+    __slots__ = ("latencies", "errors", "elapsed")
+
+    def __init__(self, latencies=None, errors=0, elapsed=0.0):
+        self.latencies = latencies if latencies is not None else []
+        self.errors = errors
+        self.elapsed = elapsed
+
+    def merge(self, other):
+        self.latencies.extend(other.latencies)
+        self.errors += other.errors
+        self.elapsed = max(self.elapsed, other.elapsed)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        def percentile(q):
+            return round(latencies[min(count - 1, int(count * q))] * 1000, 3) if count else None
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "rps": round(count / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+            "p999_ms": percentile(0.999)}
+
+
+async def read_response(reader):
+    ''' one response, returns its status code '''
+    head = await reader.readuntil(b"\r\n\r\n")
+    code = int(head[9:12])
+    length = None
+    chunked = False
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        name = name.lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"transfer-encoding" and b"chunked" in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+    return code
+
+def _open(host, port):
+    ''' port None: `host` is the path of a unix domain socket '''
+    if port is None:
+        return asyncio.open_unix_connection(host)
+    return asyncio.open_connection(host, port)
+
+async def _keep_alive(host, port, scenario, deadline, result):
+    batch = scenario.request * scenario.pipeline
+    reader, writer = await _open(host, port)
+    try:
+        while perf_counter() < deadline:
+            start = perf_counter()
+            writer.write(batch)
+            for _ in range(scenario.pipeline):
+                if await read_response(reader) >= 400:
+                    result.errors += 1
+                else:
+                    result.latencies.append(perf_counter() - start)
+    finally:
+        writer.close()
+
+async def _close(host, port, scenario, deadline, result):
+    while perf_counter() < deadline:
+        start = perf_counter()
+        reader, writer = await _open(host, port)
+        try:
+            writer.write(scenario.request)
+            if await read_response(reader) >= 400:
+                result.errors += 1
+            else:
+                result.latencies.append(perf_counter() - start)
+        finally:
+            writer.close()
+
+async def _connection(host, port, scenario, deadline, result):
+    run = _keep_alive if scenario.keep_alive else _close
+    while perf_counter() < deadline:
+        try:
+            await run(host, port, scenario, deadline, result)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            result.errors += 1
+
+async def _load(host, port, scenario, connections, duration, warmup):
+    if warmup:
+        await asyncio.gather(*(_connection(host, port, scenario, perf_counter() + warmup, Result())
+                for _ in range(connections)))
+    result = Result()
+    start = perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(_connection(host, port, scenario, deadline, result)
+            for _ in range(connections)))
+    result.elapsed = perf_counter() - start
+    return result
+
+def run_client(host, port, scenario, connections, duration, warmup=0):
+    ''' one client process: `connections` concurrent connections '''
+    coro = _load(host, port, scenario, connections, duration, warmup)
+    if uvloop is not None:
+        return uvloop.run(coro)
+    return asyncio.run(coro)
+
+def _client_main(conn, *args):
+    result = run_client(*args)
+    conn.send((result.latencies, result.errors, result.elapsed))
+    conn.close()
+
+def load(host, port, scenario, connections=64, duration=5, warmup=1, processes=1):
+    ''' spread `connections` over `processes` client processes '''
+    if processes <= 1:
+        return run_client(host, port, scenario, connections, duration, warmup)
+    clients = []
+    for i in range(processes):
+        share = connections // processes + (i < connections % processes)
+        rconn, wconn = mp.Pipe(duplex=False)
+        process = mp.Process(target=_client_main,
+                args=(wconn, host, port, scenario, share, duration, warmup))
+        process.start()
+        wconn.close()
+        clients.append((process, rconn))
+    result = Result()
+    for process, rconn in clients:
+        result.merge(Result(*rconn.recv()))
+        process.join()
+    return result
@@ -0,0 +1,108 @@
+#
+# load test scenarios: the server app and the raw requests driving it
+#
+import os
+import random
+
+import orjson as json
+
+from unlight2.server import Server
+
+SMALL_FILE = "small.css"
+LARGE_FILE = "large.bin"
+UPLOAD_SIZE = 64 * 1024
+BOUNDARY = b"unlight2benchboundary"
+
+
+class Scenario:
+    ''' one kind of request, sent `pipeline` at a time per connection.
+        `keep_alive=False`: new connection per request '''
+
+    __slots__ = ("name", "request", "keep_alive", "pipeline")
+
+    def __init__(self, name, request, keep_alive=True, pipeline=1):
+        self.name = name
+        self.request = request
+        self.keep_alive = keep_alive
+        self.pipeline = pipeline
+
+
+def _request(method, path, body=b"", content_type=None, close=False):
+    head = [b"%s %s HTTP/1.1\r\nHost: bench\r\n" % (method, path)]
+    if content_type:
+        head.append(b"Content-Type: %s\r\n" % content_type)
+    if body:
+        head.append(b"Content-Length: %d\r\n" % len(body))
+    if close:
+        head.append(b"Connection: close\r\n")
+    head.append(b"\r\n")
+    return b"".join(head) + body
+
+def _multipart(seed):
+    data = random.Random(seed).randbytes(UPLOAD_SIZE)
+    return b"".join((
+        b"--%s\r\n" % BOUNDARY,
+        b'Content-Disposition: form-data; name="title"\r\n\r\nbench\r\n',
+        b"--%s\r\n" % BOUNDARY,
+        b'Content-Disposition: form-data; name="file"; filename="bench.bin"\r\n',
+        b"Content-Type: application/octet-stream\r\n\r\n",
+        data,
+        b"\r\n--%s--\r\n" % BOUNDARY))
+
+def build_scenarios(seed=0):
+    json_body = json.dumps({"user": "bench", "items": list(range(32)), "tags": ["a", "b", "c"]})
+    form_body = b"name=bench&email=bench%40example.com&age=42&note=hello+world"
+    hello = _request(b"GET", b"/hello")
+    return (
+        Scenario("hello", hello),
+        Scenario("hello_close", _request(b"GET", b"/hello", close=True), keep_alive=False),
+        Scenario("hello_pipelined", hello, pipeline=16),
+        Scenario("json_post", _request(b"POST", b"/json", json_body, b"application/json")),
+        Scenario("form_post", _request(b"POST", b"/form", form_body,
+            b"application/x-www-form-urlencoded")),
+        Scenario("multipart_upload", _request(b"POST", b"/upload", _multipart(seed),
+            b"multipart/form-data; boundary=" + BOUNDARY)),
+        Scenario("static_small", _request(b"GET", b"/static/" + SMALL_FILE.encode())),
+        Scenario("static_large", _request(b"GET", b"/static/" + LARGE_FILE.encode())))
+
+def write_static(static_dir, seed=0):
+    ''' same bytes every run '''
+    with open(os.path.join(static_dir, SMALL_FILE), "wb") as f:
+        f.write(b"body { margin: 0; font-family: sans-serif; }\n" * 48) # ~2KB
+    with open(os.path.join(static_dir, LARGE_FILE), "wb") as f:
+        f.write(random.Random(seed).randbytes(4 * 1024 * 1024))
+
+def rss_kb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+def build_server(address, static_dir, **options):
+    ''' `address`: port on loopback or unix socket path '''
+    if isinstance(address, int):
+        address = ("127.0.0.1", address)
+    server = Server(address, shutdown_timeout=1, **options)
+    router = server.router
+
+    @router.get("/hello")
+    async def hello(request, response):
+        response.text("Hello, World!")
+
+    @router.post("/json")
+    async def echo_json(request, response):
+        data = request.json
+        response.json({"user": data["user"], "items": len(data["items"])})
+
+    @router.post("/form")
+    async def form(request, response):
+        response.text(request.form["name"])
+
+    @router.post("/upload", max_body_size=UPLOAD_SIZE * 2)
+    async def upload(request, response):
+        response.text(str(request.form["file"].size))
+
+    @router.get("/rss")
+    async def rss(request, response):
+        response.text(f"{os.getpid()} {rss_kb()}")
+
+    router.set_static_dir("static", static_dir)
+    return server
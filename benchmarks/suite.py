@@ -0,0 +1,151 @@
+#
+# load test suite: real server on loopback, single process and prefork,
+# every scenario of `scenarios.py`, JSON report, compare with a baseline
+#
+#   python -m benchmarks.suite --json report.json
+#   python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+#   python -m benchmarks.suite --baseline benchmarks/baseline.json   # exit 1 on regression
+#
+import argparse
+import asyncio
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from time import sleep, strftime
+
+import orjson as json
+
+from .harness import free_port, running
+from .loadgen import load
+from .scenarios import build_scenarios, build_server, write_static
+
+MODES = ("single", "multi")
+
+
+def serve(port, static_dir, workers):
+    server = build_server(port, static_dir)
+    if workers == 1:
+        server.run()
+    else:
+        server.run_multi_process(workers)
+
+async def _worker_rss(port, workers):
+    ''' {pid: rss kb} of the workers: ask /rss on new connections
+        until every worker answered (the kernel spreads connections) '''
+    found = {}
+    for _ in range(workers * 50):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /rss HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+        data = await reader.read()
+        writer.close()
+        pid, rss = data.partition(b"\r\n\r\n")[2].split()
+        found[int(pid)] = int(rss)
+        if len(found) >= workers:
+            break
+    return found
+
+def worker_rss(port, workers):
+    return sorted(asyncio.run(_worker_rss(port, workers)).values())
+
+def run_mode(mode, args, static_dir, scenarios):
+    workers = 1 if mode == "single" else args.workers
+    port = free_port()
+    results = {}
+    with running(serve, (port, static_dir, workers), port):
+        sleep(0.5 if workers == 1 else 1.5) # every worker listening
+        for scenario in scenarios:
+            result = load("127.0.0.1", port, scenario, args.connections,
+                    args.duration, args.warmup, args.clients).summary()
+            result["rss_kb"] = worker_rss(port, workers)
+            results[scenario.name] = result
+            print(f"{mode:<7} {scenario.name:<18} {result['rps']:10.0f} {result['p50_ms']:8.2f} "
+                    f"{result['p99_ms']:8.2f} {result['p999_ms']:9.2f} {result['errors']:6d}  "
+                    f"{' '.join(str(rss // 1024) for rss in result['rss_kb'])}", flush=True)
+    return results
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "time": strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "workers": args.workers,
+        "connections": args.connections,
+        "clients": args.clients,
+        "duration": args.duration}
+
+def compare(report, baseline, tolerance):
+    ''' print the change of every result in both, returns the regressions:
+        req/s down or p99 up by more than `tolerance` '''
+    regressions = []
+    print(f"\n{'mode':<7} {'scenario':<18} {'req/s':>10} {'change':>8} {'p99 ms':>8} {'change':>8}")
+    for mode, results in report["results"].items():
+        for name, result in results.items():
+            base = baseline.get("results", {}).get(mode, {}).get(name)
+            if not base or not base["rps"] or not base["p99_ms"]:
+                continue
+            rps = (result["rps"] - base["rps"]) / base["rps"]
+            p99 = (result["p99_ms"] - base["p99_ms"]) / base["p99_ms"]
+            slower = rps < -tolerance or p99 > tolerance
+            if slower:
+                regressions.append(f"{mode}/{name}")
+            print(f"{mode:<7} {name:<18} {result['rps']:10.0f} {rps:+8.1%} "
+                    f"{result['p99_ms']:8.2f} {p99:+8.1%}{'  REGRESSION' if slower else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite",
+            description="load test of unlight2 on loopback")
+    parser.add_argument("--modes", default=",".join(MODES), help="single,multi")
+    parser.add_argument("--scenarios", default="", help="comma separated names, default all")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)),
+            help="load generator processes")
+    parser.add_argument("--duration", type=float, default=5, help="seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--baseline", help="compare with this report")
+    parser.add_argument("--save-baseline", help="write the report as new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+            help="allowed relative req/s drop or p99 rise (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    scenarios = build_scenarios(args.seed)
+    if args.scenarios:
+        names = args.scenarios.split(",")
+        scenarios = [scenario for scenario in scenarios if scenario.name in names]
+    modes = [mode for mode in args.modes.split(",") if mode in MODES]
+
+    report = {"meta": metadata(args), "results": {}}
+    print(f"{'mode':<7} {'scenario':<18} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+            f"{'p999 ms':>9} {'errors':>6}  rss MB per worker")
+    with tempfile.TemporaryDirectory() as static_dir:
+        write_static(static_dir, args.seed)
+        for mode in modes:
+            report["results"][mode] = run_mode(mode, args, static_dir, scenarios)
+
+    data = json.dumps(report, option=json.OPT_INDENT_2)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "wb") as f:
+                f.write(data)
+    if args.baseline:
+        with open(args.baseline, "rb") as f:
+            regressions = compare(report, json.loads(f.read()), args.tolerance)
+        if regressions:
+            print(f"\nregressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
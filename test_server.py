@@ -1,4 +1,7 @@
+import hashlib
 from unlight2 import server as u2
+from unlight2.multipart import MultipartPart
+from unlight2.cache import CacheRule
 
 # 创建服务
 server = u2.Server(("127.0.0.1", 9919))
@@ -20,16 +23,35 @@ async def modify_json(request, response):
     data["way"] = request.json.get("way")
     response.text(f"modify ok, new data: {data}")
 
+# 响应缓存5秒(按查询参数page区分), 并发未命中只执行一次处理函数
+@server.router.get("/top", cache=CacheRule(5, query=("page",)))
+async def top(request, response):
+    response.json({"top": [1, 2, 3]})
+
+# 分块流式返回, 边生成边发送
+@server.router.get("/report")
+async def report(request, response):
+    async def rows():
+        for i in range(1000):
+            yield f"{i},row-{i}\n"
+    response.content_type = "text/csv"
+    await response.stream(rows())
+
+# 同步(阻塞/CPU密集)处理函数在进程池中执行, 不阻塞其他连接
+@server.router.post("/sha256", executor="process")
+def sha256(request, response):
+    response.text(hashlib.sha256(request.file or b"").hexdigest())
+
 # 设置静态访问目录为当前目录
 server.router.set_static_dir("static", ".")
 # 通过表单上传指定文件(虽然使用get也能正常解析路径,但正常使用post请求做方法绑定)
-@server.router.post("/upload_file")
+# 大文件边接收边解析, 超过1M的文件暂存到临时文件
+@server.router.post("/upload_file", max_body_size=1024*1024*1024)
 async def upload_file(request, response):
     form = request.form
     for key, value in form.items():
-        if type(value) is bytes:
-            with open(key, "wb") as f:
-                f.write(value)
+        if isinstance(value, MultipartPart):
+            value.save(value.filename or key)
         else:
             print("--- other key: ", key, value)
     response.text("ok!")
@@ -0,0 +1,75 @@
+#
+# shared helpers: servers run in forked processes, clients talk raw http/1.1
+#
+import os
+import signal
+import socket
+import multiprocessing as mp
+
+import pytest
+
+from benchmarks.harness import free_port, wait_listening
+
+
+def http(port, raw, timeout=10):
+    ''' send `raw`, read until the server closes '''
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as sock:
+        sock.sendall(raw)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+def descendants(pid):
+    ''' pids of every process below `pid` (linux /proc) '''
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                pass
+    found, frontier = set(), {pid}
+    while frontier:
+        frontier = {child for child, parent in parents.items() if parent in frontier} - found
+        found |= frontier
+    return found
+
+def alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+@pytest.fixture
+def serve():
+    ''' serve(build, workers=1) -> (process, port): `build(port)` returns the
+        `Server`, run in a forked process (the master if `workers` > 1),
+        killed at teardown if still alive '''
+    processes = []
+    def start(build, workers=1):
+        port = free_port()
+        def run():
+            server = build(port)
+            if workers > 1:
+                server.run_multi_process(workers)
+            else:
+                server.run()
+        process = mp.get_context("fork").Process(target=run)
+        process.start()
+        processes.append(process)
+        wait_listening(port)
+        return process, port
+    yield start
+    for process in processes:
+        for pid in descendants(process.pid) | {process.pid}:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        process.join()
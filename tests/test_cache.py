@@ -0,0 +1,46 @@
+from itertools import count
+
+from unlight2.server import Server
+
+from conftest import http
+
+
+def build(port):
+    server = Server(("127.0.0.1", port))
+    calls = count(1)
+
+    @server.router.get("/session", cache=60)
+    async def session(request, response):
+        n = next(calls)
+        response.update_headers({"Set-Cookie": f"sid=user{n}; HttpOnly"})
+        response.text(f"hello user{n}")
+
+    @server.router.get("/private", cache=60)
+    async def private(request, response):
+        response.update_headers({"Cache-Control": "private, max-age=60"})
+        response.text(f"private {next(calls)}")
+
+    @server.router.get("/public", cache=60)
+    async def public(request, response):
+        response.text(f"public {next(calls)}")
+
+    return server
+
+def get(port, path):
+    return http(port, b"GET %s HTTP/1.1\r\nHost: t\r\nConnection: close\r\n\r\n" % path)
+
+
+def test_set_cookie_not_replayed(serve):
+    ''' a cached Set-Cookie would hand one user's session to the next '''
+    _, port = serve(build)
+    first, second = get(port, b"/session"), get(port, b"/session")
+    assert first.startswith(b"HTTP/1.1 200") and second.startswith(b"HTTP/1.1 200")
+    assert b"Set-Cookie: sid=user1;" in first and b"hello user1" in first
+    assert b"Set-Cookie: sid=user2;" in second and b"hello user2" in second
+
+def test_private_not_cached_public_cached(serve):
+    _, port = serve(build)
+    assert get(port, b"/private").endswith(b"private 1")
+    assert get(port, b"/private").endswith(b"private 2")
+    assert get(port, b"/public").endswith(b"public 3")
+    assert get(port, b"/public").endswith(b"public 3")
@@ -0,0 +1,37 @@
+import os
+import signal
+from time import monotonic, sleep
+
+from unlight2.server import Server
+
+from conftest import http, descendants, alive
+
+
+def square(request, response):
+    ''' process pool handler: module level, picklable '''
+    n = int(request.get_query("n", 0))
+    response.text(str(n * n))
+
+def build(port):
+    server = Server(("127.0.0.1", port), shutdown_timeout=1)
+    server.router.get("/square", executor="process")(square)
+    return server
+
+
+def test_workers_exit_promptly_after_process_route(serve):
+    ''' prefork workers with a process pool stop on SIGTERM, no pool child is left '''
+    process, port = serve(build, workers=2)
+    sleep(0.5) # both workers listening
+    for _ in range(8): # spread over the workers
+        data = http(port, b"GET /square?n=7 HTTP/1.1\r\nHost: t\r\nConnection: close\r\n\r\n")
+        assert data.startswith(b"HTTP/1.1 200") and data.endswith(b"\r\n\r\n49")
+    children = descendants(process.pid)
+    assert len(children) > 2 # workers + their pool processes
+
+    start = monotonic()
+    os.kill(process.pid, signal.SIGTERM)
+    process.join(10)
+    assert not process.is_alive(), "master still running after SIGTERM"
+    assert monotonic() - start < 5
+    sleep(0.5)
+    assert not [pid for pid in children if alive(pid)], "worker or pool process left"
@@ -0,0 +1,45 @@
+import os
+import re
+import signal
+from time import monotonic, sleep
+
+from unlight2.server import Server
+
+from conftest import http
+
+
+def build(port):
+    server = Server(("127.0.0.1", port), metrics_path="/metrics", shutdown_timeout=1)
+
+    @server.router.get("/h")
+    async def hello(request, response):
+        response.text("h")
+
+    return server
+
+def get(port, path):
+    return http(port, b"GET %s HTTP/1.1\r\nHost: t\r\nConnection: close\r\n\r\n" % path, timeout=5)
+
+def worker_pids(text):
+    return set(re.findall(r'unlight2_worker_in_flight_requests\{worker="\d+",pid="(\d+)"\}', text))
+
+
+def test_status_codes_and_retired_workers(serve):
+    process, port = serve(build, workers=2)
+    sleep(0.5) # both workers listening
+    for path in (b"/h", b"/h", b"/missing"):
+        get(port, path)
+    text = get(port, b"/metrics").decode()
+    assert 'unlight2_requests_total{route="GET /h",code="200"} 2' in text
+    assert 'unlight2_requests_total{route="unmatched",code="404"} 1' in text
+    before = worker_pids(text)
+    assert len(before) == 2
+
+    os.kill(process.pid, signal.SIGHUP) # rolling reload: old workers retire
+    deadline = monotonic() + 15
+    while monotonic() < deadline:
+        pids = worker_pids(get(port, b"/metrics").decode())
+        if not pids & before:
+            break
+        sleep(0.2)
+    assert len(pids) == 2 and not pids & before
@@ -0,0 +1,79 @@
+import pytest
+
+from unlight2.multipart import MultipartParser
+from unlight2.server import Server
+
+from conftest import http
+
+BOUNDARY = b"----unlight2-7MA4YWxkTrZu0gW"
+
+BODY = (b"--" + BOUNDARY + b"\r\n"
+    b'Content-Disposition: form-data; name="title"\r\n\r\n'
+    b"hello\r\n"
+    b"--" + BOUNDARY + b"\r\n"
+    b'Content-Disposition: form-data; name="doc"; filename="a.txt"\r\n'
+    b"Content-Type: text/plain\r\n\r\n"
+    b"line 1\r\n\r\nline 3\r\n--not the boundary\r\n"
+    b"\r\n--" + BOUNDARY + b"--\r\n")
+
+DOC = b"line 1\r\n\r\nline 3\r\n--not the boundary\r\n"
+
+
+def parse(chunks):
+    parser = MultipartParser(BOUNDARY)
+    done = []
+    for chunk in chunks:
+        done += parser.feed(chunk)
+    form = parser.close()
+    return [part.name for part in done], form
+
+def test_whole_body():
+    names, form = parse([BODY])
+    assert names == ["title", "doc"]
+    assert form["title"] == "hello"
+    assert form["doc"].filename == "a.txt" and form["doc"].content_type == "text/plain"
+    assert form["doc"].read() == DOC # blank line and "--" lines inside the part
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(BOUNDARY) + 3])
+def test_delimiter_split_across_chunks(size):
+    names, form = parse([BODY[i:i + size] for i in range(0, len(BODY), size)])
+    assert names == ["title", "doc"]
+    assert form["title"] == "hello" and form["doc"].read() == DOC
+
+def test_split_inside_delimiter():
+    cut = BODY.index(b"\r\n--" + BOUNDARY + b"--") + 5 # "\r\n--" + 1 byte of the boundary
+    names, form = parse([BODY[:cut], BODY[cut:]])
+    assert form["doc"].read() == DOC
+
+def test_missing_final_boundary():
+    parser = MultipartParser(BOUNDARY)
+    parser.feed(BODY[:BODY.rindex(b"\r\n--" + BOUNDARY)])
+    with pytest.raises(ValueError):
+        parser.close()
+
+def test_bad_delimiter_line():
+    with pytest.raises(ValueError):
+        MultipartParser(BOUNDARY).feed(b"--" + BOUNDARY + b"xx\r\n")
+
+
+def build(port):
+    server = Server(("127.0.0.1", port))
+
+    @server.router.post("/upload")
+    async def upload(request, response):
+        form = request.form
+        response.json({"title": form["title"], "doc": form["doc"].read().decode()})
+
+    return server
+
+def post(port, body):
+    return http(port, b"POST /upload HTTP/1.1\r\nHost: t\r\nConnection: close\r\n"
+        b"Content-Type: multipart/form-data; boundary=" + BOUNDARY + b"\r\n"
+        b"Content-Length: %d\r\n\r\n" % len(body) + body, timeout=5)
+
+def test_upload_route(serve):
+    _, port = serve(build)
+    data = post(port, BODY)
+    assert data.startswith(b"HTTP/1.1 200")
+    assert data.endswith(b'{"title":"hello","doc":"line 1\\r\\n\\r\\nline 3\\r\\n--not the boundary\\r\\n"}')
+    assert post(port, BODY[:BODY.rindex(b"\r\n--" + BOUNDARY)]).startswith(b"HTTP/1.1 400")
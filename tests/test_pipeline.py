@@ -0,0 +1,68 @@
+import asyncio
+import re
+import socket
+
+from unlight2.exception import UnlightException
+from unlight2.server import Server
+
+from conftest import http
+
+
+def build(port):
+    server = Server(("127.0.0.1", port))
+
+    @server.router.get("/h")
+    async def hello(request, response):
+        response.text("h")
+
+    @server.router.get("/sleep/{ms}")
+    async def sleep(request, response):
+        await asyncio.sleep(int(request.params["ms"]) / 1000)
+        response.text(request.params["ms"])
+
+    @server.router.get("/fail")
+    async def fail(request, response):
+        raise RuntimeError("handler bug")
+
+    @server.router.get("/busy")
+    async def busy(request, response):
+        raise UnlightException(503)
+
+    return server
+
+def responses(data):
+    ''' (code, body) of each response, bodies are short text '''
+    out = []
+    for m in re.finditer(rb"HTTP/1\.1 (\d{3}) [^\r]*\r\n(.*?)\r\n\r\n", data, re.S):
+        length = int(re.search(rb"Content-Length: (\d+)", m.group(2)).group(1))
+        out.append((int(m.group(1)), data[m.end():m.end() + length]))
+    return out
+
+def pipelined(port, paths):
+    raw = b"".join(b"GET %s HTTP/1.1\r\nHost: t\r\n\r\n" % path for path in paths[:-1])
+    raw += b"GET %s HTTP/1.1\r\nHost: t\r\nConnection: close\r\n\r\n" % paths[-1]
+    return responses(http(port, raw, timeout=5))
+
+
+def test_responses_in_request_order(serve):
+    ''' handlers finish out of order, responses are written in request order '''
+    _, port = serve(build)
+    paths = [b"/sleep/%d" % ms for ms in (300, 10, 200, 0, 100, 50)] * 4
+    assert pipelined(port, paths) == [(200, path.rsplit(b"/", 1)[1]) for path in paths]
+
+def test_handler_errors_keep_pipeline(serve):
+    ''' 404, raised UnlightException and handler errors answer in order, the
+        requests behind them are still served '''
+    _, port = serve(build)
+    assert pipelined(port, [b"/h", b"/missing", b"/h", b"/fail", b"/busy", b"/h"]) == [
+        (200, b"h"), (404, b""), (200, b"h"), (500, b""), (503, b""), (200, b"h")]
+
+def test_parse_error_closes(serve):
+    _, port = serve(build)
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        sock.sendall(b"GET /h HTTP/1.1\r\nHost: t\r\n\r\nGARBAGE\r\n\r\nGET /h HTTP/1.1\r\n\r\n")
+        data = b""
+        while chunk := sock.recv(65536):
+            data += chunk
+    codes = [code for code, _ in responses(data)]
+    assert codes[0] == 200 and codes[-1] >= 400 and len(codes) == 2
@@ -0,0 +1,41 @@
+import orjson as json
+import pytest
+
+from unlight2.server import Server
+
+from conftest import http
+
+
+def build(port):
+    server = Server(("127.0.0.1", port))
+
+    @server.router.get("/q")
+    async def queries(request, response):
+        response.json({"queries": request.get_queries(), "tag": request.get_query("tag"),
+            "tags": request.get_query_list("tag"), "path": request.get_path()})
+
+    return server
+
+def get(port, target):
+    data = http(port, b"GET %s HTTP/1.1\r\nHost: t\r\nConnection: close\r\n\r\n" % target, timeout=5)
+    assert data.startswith(b"HTTP/1.1 200"), data
+    return json.loads(data.split(b"\r\n\r\n", 1)[1])
+
+
+@pytest.mark.parametrize("target, queries", [
+    (b"/q?a", {"a": [""]}),
+    (b"/q?a=", {"a": [""]}),
+    (b"/q?b=1=2", {"b": ["1=2"]}),
+    (b"/q?&&a=1&", {"a": ["1"]}),
+    (b"/q?=x", {"": ["x"]}),
+    (b"/q?tag=a&tag=b&x=1&tag=c", {"tag": ["a", "b", "c"], "x": ["1"]}),
+    (b"/q?na%20me=v%26w&tag=%E4%BD%A0+%E5%A5%BD&tag=a%2Bb", {
+        "na me": ["v&w"], "tag": ["你 好", "a+b"]}),
+    (b"/q?bad=%zz%", {"bad": ["%zz%"]}),
+    (b"/q?a=1#frag", {"a": ["1"]})])
+def test_query_parsing(serve, target, queries):
+    _, port = serve(build)
+    body = get(port, target)
+    assert body["queries"] == queries and body["path"] == "/q"
+    tags = queries.get("tag", [])
+    assert body["tags"] == tags and body["tag"] == (tags[0] if tags else None)
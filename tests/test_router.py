@@ -0,0 +1,54 @@
+import pytest
+
+from unlight2.httproute import HttpRouter
+
+
+async def handler(request, response):
+    pass
+
+@pytest.fixture
+def router(tmp_path):
+    router = HttpRouter.get_router() # fresh route table
+    for method, path in (
+            ("GET", "/users/me"),
+            ("GET", "/users/{id}"),
+            ("GET", "/users/{id}/orders/{oid}"),
+            ("GET", "/users/me/settings"),
+            ("GET", "/a/b/c"),
+            ("GET", "/a/{x}/d"),
+            ("POST", "/users/{id}")):
+        getattr(router, method.lower())(path)(handler)
+    (tmp_path / "css").mkdir()
+    router.set_static_dir("/static", str(tmp_path))
+    router.freeze()
+    return router
+
+def match(router, method, path):
+    route, params, static = router.lookup(method, path)
+    return (route.path if route else None), params, static
+
+
+def test_static_segment_wins(router):
+    assert match(router, "GET", "/users/me") == ("/users/me", None, None)
+    assert match(router, "GET", "/users/42") == ("/users/{id}", {"id": "42"}, None)
+    assert match(router, "POST", "/users/me") == ("/users/{id}", {"id": "me"}, None)
+
+def test_backtracking_to_param(router):
+    ''' "me" is a static child of /users, but /users/me/orders/7 only exists
+        under {id}: the walk backs up and takes the param branch '''
+    assert match(router, "GET", "/users/me/orders/7") == (
+        "/users/{id}/orders/{oid}", {"id": "me", "oid": "7"}, None)
+    assert match(router, "GET", "/users/me/settings") == ("/users/me/settings", None, None)
+    assert match(router, "GET", "/a/b/d") == ("/a/{x}/d", {"x": "b"}, None)
+    assert match(router, "GET", "/a/b/c") == ("/a/b/c", None, None)
+
+def test_no_match(router):
+    assert match(router, "GET", "/users/1/orders") == (None, None, None)
+    assert match(router, "GET", "/a/b/e") == (None, None, None)
+    assert match(router, "DELETE", "/users/1") == (None, None, None)
+
+def test_static_dir(router, tmp_path):
+    assert match(router, "GET", "/static/css/site.css") == (
+        None, None, str(tmp_path / "css" / "site.css"))
+    assert match(router, "GET", "/static/../secret") == (None, None, None)
+    assert match(router, "POST", "/static/css/site.css") == (None, None, None)
@@ -0,0 +1,52 @@
+from dataclasses import dataclass, field, KW_ONLY
+from typing import Literal
+
+import pytest
+
+from unlight2.schema import compile_schema, SchemaError
+from unlight2.server import Server
+
+from conftest import http
+
+
+@dataclass
+class Interleaved:
+    a: int
+    b: str = field(default="b", kw_only=True)
+    c: float = 1.0
+    _: KW_ONLY
+    d: bool = False
+
+@dataclass
+class Job:
+    kind: Literal["fast", "slow"]
+
+
+def test_interleaved_kw_only_field():
+    convert = compile_schema(Interleaved)
+    assert convert({"a": 1}) == Interleaved(1)
+    assert convert({"a": 1, "b": "x", "c": 2, "d": True}) == Interleaved(1, 2.0, b="x", d=True)
+
+
+@pytest.mark.parametrize("kind", [[], {}, ["fast"], {"fast": 1}])
+def test_literal_rejects_unhashable(kind):
+    with pytest.raises(SchemaError) as e:
+        compile_schema(Job)({"kind": kind})
+    assert str(e.value).startswith("kind: expected 'fast' | 'slow'")
+
+def test_literal_body_route_answers_400(serve):
+    ''' a converter error must produce a response, not a dead handler '''
+    def build(port):
+        server = Server(("127.0.0.1", port))
+        @server.router.post("/jobs", body=Job)
+        async def jobs(request, response):
+            response.json({"kind": request.data.kind})
+        return server
+
+    _, port = serve(build)
+    for body, status, answer in ((b'{"kind": []}', b"400", b"kind: expected"),
+            (b'{"kind": "slow"}', b"200", b'{"kind":"slow"}')):
+        data = http(port, b"POST /jobs HTTP/1.1\r\nHost: t\r\nConnection: close\r\n"
+            b"Content-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body),
+            timeout=5)
+        assert data.startswith(b"HTTP/1.1 " + status) and answer in data
@@ -0,0 +1,105 @@
+import multiprocessing as mp
+
+import pytest
+
+from unlight2 import sharedcache
+from unlight2.sharedcache import SharedCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sharedcache, "time", lambda: now[0])
+    return now
+
+
+def test_values():
+    kv = SharedCache(capacity=64, segments=4)
+    values = {"b": b"\x00raw", "s": "héllo", "i": -2**63, "big": 2**70, "p": {"a": [1, None]}}
+    for key, value in values.items():
+        kv.set(key, value)
+    assert {key: kv.get(key) for key in values} == values
+    assert kv.get("missing", 7) == 7
+    kv.set("s", "again")
+    assert kv.get("s") == "again" and kv.stats()["used"] == len(values)
+    with pytest.raises(ValueError):
+        kv.set("k" * 65, 1)
+    with pytest.raises(ValueError):
+        kv.set("k", b"v" * 257)
+
+def test_probing_past_deleted_slots():
+    # one segment of 8 slots, every key probes the same table
+    kv = SharedCache(capacity=8, segments=1)
+    keys = [f"key{i}" for i in range(8)]
+    for i, key in enumerate(keys):
+        kv.set(key, i)
+    assert [kv.get(key) for key in keys] == list(range(8))
+    for key in keys[::2]:
+        assert kv.delete(key)
+    assert not kv.delete(keys[0])
+    assert [kv.get(key) for key in keys] == [None, 1, None, 3, None, 5, None, 7]
+    # deleted slots are reused, no duplicates when a key is set again
+    for key in keys[::2]:
+        kv.set(key, "again")
+    kv.set(keys[1], "again")
+    assert kv.stats()["used"] == 8
+    assert [kv.get(key) for key in keys] == ["again", "again", "again", 3, "again", 5, "again", 7]
+
+def test_full_segment_evicts_first_expiring(clock):
+    kv = SharedCache(capacity=4, segments=1)
+    kv.set("never", 0)
+    kv.set("late", 1, ttl=300)
+    kv.set("soon", 2, ttl=10)
+    kv.set("later", 3, ttl=600)
+    kv.set("new", 4)
+    assert kv.get("soon") is None
+    assert [kv.get(key) for key in ("never", "late", "later", "new")] == [0, 1, 3, 4]
+
+def test_ttl(clock):
+    kv = SharedCache(capacity=16, segments=2)
+    kv.set("short", "x", ttl=5)
+    kv.set("forever", "y")
+    clock[0] += 4.9
+    assert kv.get("short") == "x"
+    assert kv.stats()["expired"] == 0
+    clock[0] += 0.1
+    assert kv.stats()["expired"] == 1
+    assert kv.get("short") is None and kv.get("forever") == "y"
+    assert not kv.delete("short")
+    # expired slots are free again
+    kv.set("short", "z")
+    clock[0] += 10**6
+    assert kv.get("short") == "z" and kv.stats() == {"capacity": 16, "used": 2, "expired": 0}
+
+def test_incr(clock):
+    kv = SharedCache(capacity=16, segments=2)
+    assert kv.incr("hits") == 1
+    assert kv.incr("hits", 5) == 6
+    assert kv.decr("hits", 2) == 4 and kv.get("hits") == 4
+    # the ttl starts with the first hit, later ones don't extend it
+    assert kv.incr("rate", ttl=1) == 1
+    clock[0] += 0.5
+    assert kv.incr("rate", ttl=1) == 2
+    clock[0] += 0.5
+    assert kv.get("rate") is None
+    assert kv.incr("rate", ttl=1) == 1
+    kv.set("name", "u2")
+    with pytest.raises(TypeError):
+        kv.incr("name")
+    kv.set("counter", 10)
+    assert kv.incr("counter") == 11
+
+def _add(kv, n):
+    for _ in range(n):
+        kv.incr("shared")
+
+def test_incr_across_processes():
+    kv = SharedCache(capacity=16, segments=2)
+    ctx = mp.get_context("fork")
+    processes = [ctx.Process(target=_add, args=(kv, 500)) for _ in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(10)
+    assert [p.exitcode for p in processes] == [0] * 4
+    assert kv.get("shared") == 2000
@@ -0,0 +1,70 @@
+import socket
+from time import sleep
+
+import pytest
+
+from unlight2 import simple_http
+from unlight2.server import Server
+
+from conftest import http
+
+BIG = 512 * 1024 # over the static cache's max_file_size: sent from disk
+
+
+@pytest.mark.parametrize("error, status", [
+    (FileNotFoundError, b"404"), (PermissionError, b"403")])
+def test_static_file_open_error(serve, tmp_path, error, status):
+    ''' file removed / unreadable between lookup and open: 404 / 403, not 500 '''
+    (tmp_path / "big.bin").write_bytes(b"x" * BIG)
+    def build(port):
+        server = Server(("127.0.0.1", port))
+        server.router.set_static_dir("/files", str(tmp_path))
+        def fail(path, mode="r"):
+            raise error(path)
+        simple_http.open = fail # forked server process only
+        return server
+
+    _, port = serve(build)
+    data = http(port, b"GET /files/big.bin HTTP/1.1\r\nHost: t\r\nConnection: close\r\n\r\n",
+            timeout=5)
+    assert data.startswith(b"HTTP/1.1 " + status)
+    assert b"ETag" not in data
+
+def test_static_file_sent(serve, tmp_path):
+    (tmp_path / "big.bin").write_bytes(b"x" * BIG)
+    def build(port):
+        server = Server(("127.0.0.1", port))
+        server.router.set_static_dir("/files", str(tmp_path))
+        return server
+
+    _, port = serve(build)
+    data = http(port, b"GET /files/big.bin HTTP/1.1\r\nHost: t\r\nConnection: close\r\n\r\n")
+    assert data.startswith(b"HTTP/1.1 200") and data.endswith(b"\r\n\r\n" + b"x" * BIG)
+
+def test_static_file_zero_copy(serve, tmp_path):
+    ''' big files go through os.sendfile, also when the client reads slowly,
+        and the pipelined response behind it follows the whole body '''
+    body = bytes(range(256)) * (64 * 1024) # 16 MB: more than the socket buffers take
+    (tmp_path / "big.bin").write_bytes(body)
+    (tmp_path / "small.txt").write_bytes(b"small")
+    def build(port):
+        server = Server(("127.0.0.1", port))
+        server.router.set_static_dir("/files", str(tmp_path))
+        def copying(self, f, size):
+            raise RuntimeError("mmap fallback used")
+        simple_http.SimpleHttp._write_mmap = copying # forked server process only
+        return server
+
+    _, port = serve(build)
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(b"GET /files/big.bin HTTP/1.1\r\nHost: t\r\n\r\n"
+            b"GET /files/small.txt HTTP/1.1\r\nHost: t\r\nConnection: close\r\n\r\n")
+        sleep(0.3) # server socket buffer fills up, sendfile waits for writability
+        data = bytearray()
+        while chunk := sock.recv(65536):
+            data += chunk
+    head, rest = bytes(data).split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200") and b"Content-Length: %d" % len(body) in head
+    assert rest[:len(body)] == body
+    head, rest = rest[len(body):].split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200") and rest == b"small"
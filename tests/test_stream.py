@@ -0,0 +1,32 @@
+from unlight2.server import Server
+
+from conftest import http
+
+
+def build(port):
+    server = Server(("127.0.0.1", port))
+
+    @server.router.get("/rows")
+    async def rows(request, response):
+        await response.stream((f"row {i}\n" for i in range(3)), trailers={"X-Rows": "3"})
+
+    return server
+
+
+def test_http10_stream_not_chunked(serve):
+    ''' HTTP/1.0 has no chunked encoding: raw body, closed after it '''
+    _, port = serve(build)
+    for raw in (b"GET /rows HTTP/1.0\r\n\r\n",
+            b"GET /rows HTTP/1.0\r\nConnection: keep-alive\r\n\r\n"):
+        head, body = http(port, raw, timeout=5).split(b"\r\n\r\n", 1)
+        assert head.startswith(b"HTTP/1.1 200")
+        assert b"Transfer-Encoding" not in head
+        assert b"Connection: close" in head
+        assert body == b"row 0\nrow 1\nrow 2\n"
+
+def test_http11_stream_chunked(serve):
+    _, port = serve(build)
+    head, body = http(port, b"GET /rows HTTP/1.1\r\nHost: t\r\nConnection: close\r\n\r\n",
+            timeout=5).split(b"\r\n\r\n", 1)
+    assert b"Transfer-Encoding: chunked" in head
+    assert body == b"6\r\nrow 0\n\r\n6\r\nrow 1\n\r\n6\r\nrow 2\n\r\n0\r\nX-Rows: 3\r\n\r\n"
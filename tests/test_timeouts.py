@@ -0,0 +1,48 @@
+import socket
+from functools import partial
+from time import monotonic
+
+from unlight2.server import Server
+from unlight2.simple_http import SimpleHttp
+
+
+def build(port):
+    server = Server(("127.0.0.1", port),
+        protocol_cls=partial(SimpleHttp, request_timeout=1, keep_alive=30))
+
+    @server.router.get("/h")
+    async def hello(request, response):
+        response.text("h")
+
+    @server.router.post("/upload")
+    async def upload(request, response):
+        response.text("ok")
+
+    return server
+
+def read_until_closed(sock):
+    data = b""
+    while chunk := sock.recv(65536):
+        data += chunk
+    return data
+
+
+def test_second_request_headers_time_out(serve):
+    ''' a half-sent request on a keep-alive connection gets 408, not the keep-alive time '''
+    _, port = serve(build)
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(b"GET /h HTTP/1.1\r\nHost: t\r\n\r\nGET /h HTTP/1.1\r\nHo")
+        start = monotonic()
+        data = read_until_closed(sock)
+    assert data.startswith(b"HTTP/1.1 200") and data.count(b"HTTP/1.1 ") == 2
+    assert b"HTTP/1.1 408" in data
+    assert monotonic() - start < 5
+
+def test_slow_body_times_out(serve):
+    _, port = serve(build)
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(b"POST /upload HTTP/1.1\r\nHost: t\r\nContent-Length: 100\r\n\r\n0123456789")
+        start = monotonic()
+        data = read_until_closed(sock)
+    assert data.startswith(b"HTTP/1.1 408")
+    assert monotonic() - start < 5
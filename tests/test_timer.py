@@ -0,0 +1,46 @@
+import asyncio
+from time import monotonic
+
+from unlight2.timer import TimerWheel
+
+
+def test_timer_never_fires_early():
+    ''' deadlines set at any point within a tick fire at `delay` or up to a
+        tick later, not one tick early '''
+    tick = 0.05
+    delays = (0.0, 0.01, tick, 0.07, 3 * tick, 0.23)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        wheel = TimerWheel(loop, tick)
+        wheel.start()
+        fired = []
+        for i in range(8): # different phases of the running tick
+            await asyncio.sleep(tick * 0.37)
+            for delay in delays:
+                wheel.call_later(delay, lambda at, delay: fired.append((monotonic() - at, delay)),
+                        monotonic(), delay)
+        await asyncio.sleep(0.23 + 4 * tick)
+        wheel.stop()
+        return fired
+
+    fired = asyncio.run(main())
+    assert len(fired) == 8 * len(delays)
+    for elapsed, delay in fired:
+        assert elapsed >= delay, f"fired after {elapsed:.3f}s, delay {delay}s"
+        assert elapsed < delay + 2 * tick + 0.05
+
+def test_timer_set_before_start_counts_from_start():
+    async def main():
+        wheel = TimerWheel(asyncio.get_running_loop(), 0.05)
+        fired = []
+        wheel.call_later(0.1, lambda: fired.append(monotonic()))
+        await asyncio.sleep(0.1) # not ticking yet
+        start = monotonic()
+        wheel.start()
+        await asyncio.sleep(0.3)
+        wheel.stop()
+        return fired, start
+
+    fired, start = asyncio.run(main())
+    assert len(fired) == 1 and fired[0] - start >= 0.1
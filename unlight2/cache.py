@@ -0,0 +1,176 @@
+#
+# per-route response cache: TTL, vary keys, LRU byte budget, single-flight
+#
+from asyncio import get_running_loop, shield
+from collections import OrderedDict
+from functools import partial
+from time import monotonic
+
+from .compress import negotiate
+
+
+class CacheRule:
+    ''' cache option of a GET route:
+            router.get("/top", cache=CacheRule(5, query=("page",), headers=("Accept-Language",)))
+            router.get("/top", cache=5) # ttl only
+        responses differ per path, negotiated encoding and the listed
+        query parameters / request headers. responses with Set-Cookie or
+        `Cache-Control: private / no-store` are not cached
+    '''
+
+    __slots__ = ("ttl", "query", "headers")
+
+    def __init__(self, ttl, query=(), headers=()):
+        self.ttl = ttl
+        self.query = tuple(query)
+        self.headers = tuple(name.lower().encode() for name in headers)
+
+    def key(self, request):
+        key = [request._bpath, negotiate(request.get_bheader(b"accept-encoding"))]
+        for name in self.query:
+            key.append(tuple(request.get_query_list(name)))
+        for bname in self.headers:
+            key.append(request.get_bheader(bname))
+        return tuple(key)
+
+
+def shareable(headers):
+    ''' no per-user headers: a Set-Cookie or `Cache-Control: private / no-store`
+        response is never replayed to other clients '''
+    for name, value in headers.items():
+        if value is None:
+            continue
+        name = name.lower()
+        if name == "set-cookie":
+            return False
+        if name == "cache-control":
+            for directive in str(value).lower().split(","):
+                if directive.split("=", 1)[0].strip() in ("private", "no-store"):
+                    return False
+    return True
+
+
+class CachedResponse:
+    ''' encoded 200 response: entity headers + body, replayed by `send_encoded` '''
+
+    __slots__ = ("expires", "msg", "head", "body", "size")
+
+    def __init__(self, expires, msg, head, body):
+        self.expires = expires
+        self.msg = msg
+        self.head = head
+        self.body = body
+        self.size = len(head) + len(body)
+
+    def send(self, response):
+        response.msg = self.msg
+        response.send_encoded(self.head, self.body)
+
+
+class ResponseCache:
+    ''' per-worker LRU of route responses, bounded by bytes.
+        concurrent misses of one key run the handler once, the others wait
+        for its response (single-flight)
+    '''
+
+    __slots__ = (
+        "max_bytes",
+        "entries",
+        "flights",  # key -> future of CachedResponse | None
+        "cur_bytes",
+        "hits",
+        "misses",
+        "coalesced",
+        "evictions"
+    )
+
+    def __init__(self, max_bytes=16*1024*1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # (route, key) -> CachedResponse
+        self.flights = {}
+        self.cur_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def serve(self, route, request, response, call):
+        ''' answer from cache or `await call(route, request, response)` '''
+        key = (route, route.cache.key(request))
+        entry = self.lookup(key)
+        if entry is not None:
+            self.hits += 1
+            entry.send(response)
+            return
+
+        flight = self.flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            entry = await shield(flight)
+            if entry is not None:
+                entry.send(response)
+            else: # not cacheable
+                await call(route, request, response)
+            return
+
+        self.misses += 1
+        flight = self.flights[key] = get_running_loop().create_future()
+        response.capture = partial(self._store, key, route.cache.ttl, flight)
+        try:
+            await call(route, request, response)
+        finally:
+            if not flight.done(): # no (cacheable) body written by now
+                self._land(key, flight, None)
+
+    def lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= monotonic():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, ttl, flight, response, enc_data):
+        ''' `Response.capture`: called with the body about to be written '''
+        entry = None
+        if response.code == 200 and shareable(response.headers):
+            entry = CachedResponse(monotonic() + ttl, response.msg,
+                    response.entity_head(len(enc_data)), bytes(enc_data))
+            if entry.size <= self.max_bytes:
+                if key in self.entries:
+                    self._remove(key)
+                self.entries[key] = entry
+                self.cur_bytes += entry.size
+                self._evict()
+        if not flight.done():
+            self._land(key, flight, entry)
+
+    def _land(self, key, flight, entry):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        flight.set_result(entry)
+
+    def _evict(self):
+        entries = self.entries
+        while self.cur_bytes > self.max_bytes:
+            _, old = entries.popitem(last=False)
+            self.cur_bytes -= old.size
+            self.evictions += 1
+
+    def _remove(self, key):
+        self.cur_bytes -= self.entries.pop(key).size
+
+    def clear(self):
+        self.entries.clear()
+        self.cur_bytes = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.cur_bytes}
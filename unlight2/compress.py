@@ -0,0 +1,77 @@
+#
+# response compression: gzip always, brotli/zstd if installed
+#
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+enabled = True
+min_size = 1024          # smaller bodies are sent as they are
+offload_size = 256*1024  # larger bodies are compressed in the loop's thread pool
+
+compressible_types = ("text/", "json", "javascript", "xml", "svg")
+suffixes = {"br": ".br", "zstd": ".zst", "gzip": ".gz"} # precompressed static files
+
+# preferred first
+encodings = tuple(name for name, mod in (("br", brotli), ("zstd", zstandard), ("gzip", gzip))
+        if mod is not None)
+
+_negotiated = {} # Accept-Encoding value -> encoding
+
+def negotiate(baccept_encoding):
+    ''' best supported encoding of `Accept-Encoding` or None '''
+    if not (enabled and baccept_encoding):
+        return None
+    encoding = _negotiated.get(baccept_encoding, False)
+    if encoding is False:
+        encoding = _negotiate(baccept_encoding)
+        if len(_negotiated) > 256:
+            _negotiated.clear()
+        _negotiated[baccept_encoding] = encoding
+    return encoding
+
+def _negotiate(baccept_encoding):
+    qvalues = {}
+    for bitem in baccept_encoding.lower().split(b","):
+        bname, _, bparams = bitem.partition(b";")
+        q = 1.0
+        bparams = bparams.strip()
+        if bparams.startswith(b"q="):
+            try:
+                q = float(bparams[2:])
+            except ValueError:
+                q = 0.0
+        qvalues[bname.strip().decode("latin-1")] = q
+
+    wildcard = qvalues.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name in encodings:
+        q = qvalues.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+def is_compressible(content_type):
+    if not content_type:
+        return False
+    for t in compressible_types:
+        if t in content_type:
+            return True
+    return False
+
+def compress(data, encoding):
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"unsupported encoding: {encoding}")
@@ -0,0 +1,106 @@
+#
+# live connections of one worker: limit, idle eviction, graceful shutdown
+#
+import asyncio
+from collections import OrderedDict
+
+
+class ConnectionManager:
+    ''' connections of one worker, least recently active first.
+        over `max_conns` the least recently active idle (keep-alive) connection
+        is evicted to make room, if every connection is busy the new one is shed
+        (protocol answers 503 and closes)
+
+        protocol api: `is_idle()`, `shutdown()` (close once in-flight requests
+        are answered), `close()`
+    '''
+
+    __slots__ = (
+        "max_conns",
+        "evict_scan", # idle candidates looked at, oldest first
+        "conns",
+        "closed",
+        "drained",
+        "shed",
+        "evicted",
+        "requests"
+    )
+
+    def __init__(self, max_conns=10000, evict_scan=64):
+        self.max_conns = max_conns
+        self.evict_scan = evict_scan
+        self.conns = OrderedDict() # conn -> None
+        self.closed = False
+        self.drained = None
+        self.shed = 0
+        self.evicted = 0
+        self.requests = 0
+
+    def __len__(self):
+        return len(self.conns)
+
+    def __iter__(self):
+        return iter(list(self.conns))
+
+    def __contains__(self, conn):
+        return conn in self.conns
+
+    def add(self, conn):
+        ''' False: no room, conn should be shed '''
+        conns = self.conns
+        if self.closed or (len(conns) >= self.max_conns and not self._evict()):
+            self.shed += 1
+            return False
+        conns[conn] = None
+        return True
+
+    def touch(self, conn):
+        ''' conn got a request: most recently active '''
+        self.requests += 1
+        if conn in self.conns:
+            self.conns.move_to_end(conn)
+
+    def discard(self, conn):
+        conns = self.conns
+        conns.pop(conn, None)
+        if not conns and self.drained is not None and not self.drained.done():
+            self.drained.set_result(None)
+
+    def _evict(self):
+        victim = None
+        for i, conn in enumerate(self.conns):
+            if i >= self.evict_scan:
+                break
+            if conn.is_idle():
+                victim = conn
+                break
+        if victim is None:
+            return False
+        self.discard(victim)
+        victim.close()
+        self.evicted += 1
+        return True
+
+    async def shutdown(self, timeout=30):
+        ''' graceful: refuse new conns, idle ones close now, busy ones after
+            their in-flight requests, whatever is left after `timeout` is closed '''
+        self.closed = True
+        self.drained = asyncio.get_running_loop().create_future()
+        for conn in self:
+            conn.shutdown()
+        if self.conns:
+            try:
+                await asyncio.wait_for(asyncio.shield(self.drained), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for conn in self:
+            conn.close()
+        self.conns.clear()
+
+    def stats(self):
+        return {
+            "conns": len(self.conns),
+            "max_conns": self.max_conns,
+            "shed": self.shed,
+            "evicted": self.evicted,
+            "requests": self.requests}
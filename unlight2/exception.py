@@ -52,6 +52,6 @@ class UnlightException(Exception):
     __slots__ = ("err_code", "err_msg")
     
     def __init__(self, err_code):
-        super(UnlightException, self).__init__()
+        super(UnlightException, self).__init__(err_code) # picklable (process pool)
         self.err_code = err_code
         self.err_msg = STATUS_CODE_MSG.get(err_code)
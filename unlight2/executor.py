@@ -0,0 +1,194 @@
+#
+# offloaded handlers: bounded thread / process pools of one worker
+#
+import os
+import signal
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from stat import S_ISSOCK
+
+from .exception import UnlightException, STATUS_CODE_MSG
+from .multipart import MultipartPart
+
+THREAD, PROCESS = "thread", "process"
+KINDS = (THREAD, PROCESS) # index = metrics pool slot
+
+
+class OffloadRequest:
+    ''' picklable copy of `Request` for process pool handlers,
+        form-data files are passed as their bytes '''
+
+    __slots__ = ("method", "url", "path", "headers", "query", "params",
+            "raw", "form", "json", "file", "data")
+
+    def __init__(self, request):
+        self.method = request.method
+        self.url = request.get_url()
+        self.path = request.get_path()
+        self.headers = request.get_headers()
+        self.query = request.get_queries()
+        self.params = request.params
+        self.raw = request.raw
+        self.json = request.json
+        self.file = request.file
+        self.data = request.data # `body` schema instances pickle like the json
+        form = request.form
+        if form:
+            form = {name: value.read() if isinstance(value, MultipartPart) else value
+                    for name, value in form.items()}
+        self.form = form
+
+    def get_method(self):
+        return self.method
+
+    def get_url(self):
+        return self.url
+
+    def get_path(self):
+        return self.path
+
+    def get_headers(self):
+        return self.headers
+
+    def get_queries(self):
+        return self.query
+
+    def get_query(self, name, default=None):
+        values = self.query.get(name)
+        return values[0] if values else default
+
+    def get_query_list(self, name):
+        return self.query.get(name, [])
+
+
+class OffloadResponse:
+    ''' what an offloaded handler answers, replayed on the real `Response`
+        by the worker loop (transport is not thread-safe / not in the process) '''
+
+    __slots__ = ("code", "msg", "content_type", "headers", "kind", "body")
+
+    def __init__(self):
+        self.code = 200
+        self.msg = None # default message of `code`
+        self.content_type = "text/plain; charset=utf-8"
+        self.headers = {}
+        self.kind = None
+        self.body = None
+
+    def update_headers(self, headers={}):
+        self.headers.update(headers)
+
+    def text(self, data):
+        self.kind, self.body = "text", data
+
+    def json(self, data):
+        self.kind, self.body = "json", data
+
+    def html(self, path):
+        self.kind, self.body = "html", path
+
+    def file(self, path, content_type="application/octet-stream"):
+        self.kind, self.body = "file", (path, content_type)
+
+    def apply(self, response):
+        ''' returns the sending task if there is one '''
+        response.code = self.code
+        response.msg = self.msg or STATUS_CODE_MSG.get(self.code, "OK")
+        response.content_type = self.content_type
+        if self.headers:
+            response.update_headers(self.headers)
+        kind = self.kind
+        if kind == "json":
+            return response.json(self.body)
+        if kind == "html":
+            return response.html(self.body)
+        if kind == "file":
+            return response.file(*self.body)
+        return response.text(self.body or "")
+
+
+def call(handler, request, response):
+    ''' runs in the pool '''
+    handler(request, response)
+    return response
+
+def _pool_init():
+    # forked from a worker: leave its loop's signal handling alone and close
+    # its sockets, a client sees EOF only once every copy of a connection
+    # (or listener) is closed. the pool itself talks over pipes
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        fds = [int(fd) for fd in os.listdir("/proc/self/fd")]
+    except OSError:
+        fds = range(3, 1024)
+    for fd in fds:
+        try:
+            if S_ISSOCK(os.fstat(fd).st_mode):
+                os.close(fd)
+        except OSError:
+            pass
+
+
+class Executor:
+    ''' bounded pool of one worker, created on first use.
+        more than `max_workers + max_queue` handlers in flight -> 503 '''
+
+    __slots__ = ("kind", "index", "max_workers", "max_queue", "pool", "in_flight",
+            "completed", "rejected", "metrics")
+
+    def __init__(self, kind, max_workers=None, max_queue=64):
+        if kind not in KINDS:
+            raise ValueError(f"unknown executor: {kind}")
+        self.kind = kind
+        self.index = KINDS.index(kind)
+        self.max_workers = max_workers or (os.cpu_count() or 1) * (4 if kind == THREAD else 1)
+        self.max_queue = max_queue
+        self.pool = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.metrics = None # `Metrics` of the worker
+
+    async def run(self, loop, handler, request, response):
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            self._report()
+            raise UnlightException(503)
+        if self.pool is None:
+            if self.kind == THREAD:
+                self.pool = ThreadPoolExecutor(self.max_workers,
+                        thread_name_prefix="unlight2-handler")
+            else:
+                self.pool = ProcessPoolExecutor(self.max_workers,
+                        mp_context=mp.get_context("fork"), initializer=_pool_init)
+        self.in_flight += 1
+        self._report()
+        try:
+            return await loop.run_in_executor(self.pool, call, handler, request, response)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._report()
+
+    def _report(self):
+        if self.metrics is not None:
+            self.metrics.pool(self.index, self.max_workers,
+                    self.in_flight, self.rejected)
+
+    def shutdown(self):
+        ''' queued handlers are dropped, running ones finish. waits: unjoined
+            process pool children keep the worker from exiting '''
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.max_workers),
+            "saturation": min(self.in_flight, self.max_workers) / self.max_workers,
+            "completed": self.completed,
+            "rejected": self.rejected}
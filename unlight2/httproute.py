@@ -1,8 +1,75 @@
 from os import environ, path as ospath
+from asyncio import get_running_loop
+from inspect import iscoroutinefunction
+from time import perf_counter
 
-from .exception import UnlightException
-from .lightlog import lightlog
-unlight_logger = lightlog.get_logger("unlight2")
+from .exception import UnlightException, STATUS_CODE_MSG
+from .static import StaticCache
+from .compress import negotiate
+from .executor import Executor, OffloadRequest, OffloadResponse, THREAD, PROCESS
+from .cache import CacheRule, ResponseCache
+from .trace import HANDLER_START
+from .schema import compile_schema, SchemaError
+from . import logbuffer
+unlight_logger = logbuffer.get_logger("unlight2")
+
+
+class Route:
+    ''' registered handler of one method + path pattern '''
+
+    __slots__ = ("method", "path", "handler", "param_names", "stream", "max_body_size",
+            "executor", "cache", "body", "index")
+
+    def __init__(self, method, path, handler, stream=False, max_body_size=None, executor=None,
+            cache=None, body=None):
+        self.method = method
+        self.path = path
+        self.handler = handler
+        self.stream = stream
+        self.max_body_size = max_body_size # None: protocol `request_limit_size`, 0: unlimited
+        if iscoroutinefunction(handler):
+            if executor is not None:
+                raise ValueError(f"async handler can not be offloaded: {path}")
+        elif executor is None: # sync handlers block, never run them on the loop
+            executor = THREAD
+        if executor not in (None, THREAD, PROCESS):
+            raise ValueError(f"unknown executor: {executor}")
+        if stream and executor is not None:
+            raise ValueError(f"stream route can not be offloaded: {path}")
+        self.executor = executor # None | "thread" | "process"
+        if cache is not None:
+            if method != "GET":
+                raise ValueError(f"only GET responses can be cached: {path}")
+            if not isinstance(cache, CacheRule): # ttl
+                cache = CacheRule(cache)
+        self.cache = cache
+        if body is not None:
+            if method == "GET" or stream:
+                raise ValueError(f"body schema needs a buffered request body: {path}")
+            body = compile_schema(body) # TypeError: unsupported schema
+        self.body = body # converter of the json body -> `request.data`
+        self.param_names = tuple(seg[1:-1] for seg in _split_path(path)
+                if _is_param(seg))
+        self.index = None # metrics slot, set by `freeze()`
+
+
+class _RouteNode:
+    ''' one path segment of the route tree '''
+
+    __slots__ = ("children", "param", "routes", "static_dir")
+
+    def __init__(self):
+        self.children = {}    # segment -> _RouteNode
+        self.param = None     # `{name}` child
+        self.routes = None    # method -> Route
+        self.static_dir = None
+
+
+def _split_path(path):
+    return [seg for seg in path.split("/") if seg]
+
+def _is_param(seg):
+    return seg[0] == "{" and seg[-1] == "}"
 
 
 class HttpRouter:
@@ -39,27 +106,55 @@ class HttpRouter:
         instance.root_dir = root_dir
         # initialize route table(template)
         instance.map = {"GET": {}, "POST": {}, "STATIC": {}}
+        instance.tree = None  # compiled by `freeze()`
+        instance.exact = None # param-free routes: {method: {path: route}}
+        instance.route_labels = None # route index -> "METHOD /path", for metrics
+        instance.static_cache = StaticCache()
+        instance.executors = {THREAD: Executor(THREAD), PROCESS: Executor(PROCESS)}
+        instance.response_cache = ResponseCache()
         cls.instance = instance
         return instance
 
-    def get(self, path):
+    def get(self, path, **options):
         ''' register `GET METHOD`:
-                router.get("/path/to") '''
+                router.get("/path/to")
+                router.get("/users/{id}/orders/{oid}") -> request.params
+                router.get("/thumb", executor="process") -> (sync) handler runs in a pool
+                router.get("/top", cache=5) -> responses cached for 5s, see `CacheRule` '''
         def wrapper(func):
-            self.map["GET"][path] = func
+            self._add_route("GET", path, func, options)
             return func
         return wrapper
 
-    def post(self, path):
+    def post(self, path, **options):
         ''' register `POST METHOD`:
-                router.post("/path/to") '''
+                router.post("/path/to")
+                router.post("/path/to", stream=True) -> `async for chunk in request.stream`
+                router.post("/upload", max_body_size=1024**3) -> form-data files spool to disk
+                router.post("/orders", body=Order) -> json body checked and converted
+                    into `request.data` before the handler runs, 400 otherwise '''
         def wrapper(func):
-            self.map["POST"][path] = func
+            self._add_route("POST", path, func, options)
             return func
         return wrapper
 
+    def _add_route(self, method, path, func, options):
+        if self.tree is not None:
+            raise RuntimeError(f"router is frozen, can not add route: {path}")
+        self.map[method][path] = Route(method, path, func, **options)
+
+    def set_executor(self, kind, max_workers=None, max_queue=64):
+        ''' size the per-worker pool of `executor=kind` routes '''
+        self.executors[kind] = Executor(kind, max_workers, max_queue)
+
+    def set_response_cache(self, max_bytes):
+        ''' memory budget of cached route responses (per worker) '''
+        self.response_cache = ResponseCache(max_bytes)
+
     def set_static_dir(self, path, dest_path):
         ''' build static access dir map '''
+        if self.tree is not None:
+            raise RuntimeError(f"router is frozen, can not add static dir: {path}")
         fp = ospath.join(self.root_dir, dest_path)
         if ospath.exists(fp) and ospath.isdir(fp):
             if path[0] != "/": # startswith "/"
@@ -68,46 +163,203 @@ class HttpRouter:
         else:
             raise NameError(f"static dir is not exists or not dir type: {fp}")
 
-    async def handle_request(self, request, response):
-        ''' no strict '''
+    def freeze(self):
+        ''' compile route table into a segment tree (called once at startup),
+            lookup cost is then proportional to path length, not route count '''
+        tree = _RouteNode()
+        exact = {"GET": {}, "POST": {}}
+        labels = ["static", "unmatched"] # metrics.STATIC, metrics.UNMATCHED
+        for method in ("GET", "POST"):
+            for path, route in self.map[method].items():
+                route.index = len(labels)
+                labels.append(f"{method} {path}")
+                if not route.param_names:
+                    exact[method]["/" + "/".join(_split_path(path))] = route
+                node = self._insert(tree, path)
+                if node.routes is None:
+                    node.routes = {}
+                node.routes[method] = route
+        for path, dest in self.map["STATIC"].items():
+            self._insert(tree, path).static_dir = dest
+        self.exact = exact
+        self.route_labels = labels
+        self.tree = tree
+        return tree
+
+    @staticmethod
+    def _insert(node, path):
+        for seg in _split_path(path):
+            if _is_param(seg):
+                if node.param is None:
+                    node.param = _RouteNode()
+                node = node.param
+            else:
+                child = node.children.get(seg)
+                if child is None:
+                    child = node.children[seg] = _RouteNode()
+                node = child
+        return node
+
+    def lookup(self, method, path):
+        ''' match path: (route, params, static_file_path)
+            static segments win over `{param}`, backtracking if they dead-end '''
+        node = self.tree
+        if node is None:
+            node = self.freeze()
+        exact = self.exact.get(method)
+        if exact is not None:
+            route = exact.get(path)
+            if route is not None:
+                return route, None, None
+        segs = path.split("/")
+        n = len(segs)
+        i = 0
+        values = None
+        forks = None   # (param node, seg index, values len)
+        static = None  # deepest static dir on the walk: (dir, seg index)
+        while True:
+            while i < n:
+                seg = segs[i]
+                i += 1
+                if not seg:
+                    continue
+                if node.static_dir is not None:
+                    static = (node.static_dir, i - 1)
+                child = node.children.get(seg)
+                if child is not None:
+                    if node.param is not None:
+                        if forks is None:
+                            forks = []
+                        forks.append((node.param, i, len(values) if values else 0))
+                    node = child
+                else:
+                    node = node.param
+                    if node is None:
+                        break
+                    if values is None:
+                        values = [seg]
+                    else:
+                        values.append(seg)
+            else:
+                routes = node.routes
+                if routes is not None:
+                    route = routes.get(method)
+                    if route is not None:
+                        if values:
+                            return route, dict(zip(route.param_names, values)), None
+                        return route, None, None
+            if not forks:
+                break
+            node, i, nvalues = forks.pop()
+            if values is None:
+                values = []
+            del values[nvalues:]
+            values.append(segs[i - 1])
+
+        if static is not None and method == "GET":
+            static_dir, i = static
+            rest = [seg for seg in segs[i:] if seg]
+            if rest and ".." not in rest:
+                return None, None, ospath.join(static_dir, *rest)
+        return None, None, None
+
+    def match_request(self, request):
+        ''' resolve route of parsed request line + headers '''
         method = request.get_method()
-        path = request.get_url()
+        path = request.get_path()
         if not (method and path):
-            response.error(UnlightException(404))
-            return
+            request.match = (None, None, None)
+            return None
+        request.match = match = self.lookup(method.upper(), path)
+        return match[0]
 
-        handle = None
-        if method.lower() == "get":
-            handle = self.map["GET"].get(path)
-            if not handle: # maybe static path
-                iter_map = self.map["STATIC"]
-                for path_key, path_dest in iter_map.items():
-                    if path.startswith(path_key):
-                        real_path = path_dest
-                        last_path = path[len(path_key):]
-
-                        if last_path[0] == "/":
-                            last_path = last_path[1:]
-                        real_path = ospath.join(real_path, last_path)
-                        if ospath.exists(real_path):
-                            if last_path.endswith("html"):
-                                response.html(real_path)
-                            else:
-                                response.file(real_path)
-                            return
-                response.error(UnlightException(404))
-                return
-        elif method.lower() == "post":
-            handle = self.map["POST"].get(path)
-            if not handle:
+    async def handle_request(self, request, response):
+        ''' no strict '''
+        trace = request.trace
+        if trace is not None:
+            trace[HANDLER_START] = perf_counter()
+        if request.match is None:
+            self.match_request(request)
+        route, params, real_path = request.match
+        if route is None:
+            cache = self.static_cache
+            entry = cache.lookup(real_path) if real_path else None
+            if entry is None:
                 response.error(UnlightException(404))
                 return
-
+            encoding = negotiate(request.get_bheader(b"accept-encoding")) if entry.compressible else None
+            if entry.not_modified(request.get_bheader(b"if-none-match"),
+                    request.get_bheader(b"if-modified-since")):
+                response.not_modified(entry.validators())
+            elif entry.body is not None:
+                variant = cache.variant(real_path, entry, encoding) if encoding else None
+                if variant:
+                    response.send_encoded(*variant)
+                else:
+                    response.send_encoded(entry.head, entry.body)
+            else:
+                sibling = cache.sibling(real_path, entry, encoding) if encoding else None
+                try:
+                    if sibling:
+                        response.update_headers(entry.validators(encoding))
+                        await response.file(sibling[0], entry.content_type)
+                    else:
+                        response.update_headers(entry.validators())
+                        await response.file(real_path, entry.content_type)
+                except (FileNotFoundError, PermissionError) as e: # removed / unreadable since the lookup
+                    response.headers.clear() # validators of a file not sent
+                    response.error(UnlightException(404 if isinstance(e, FileNotFoundError) else 403))
+            return
+        request.params = params
         try:
-            await handle(request, response)
+            if route.body is not None and not self._convert_body(route, request, response):
+                return
+            if route.cache is None:
+                await self._call(route, request, response)
+            else:
+                await self.response_cache.serve(route, request, response, self._call)
         except UnlightException as e:
             unlight_logger.error("Unlight2 exception request: ------ ", e)
             response.error(e)
         except Exception as e:
             unlight_logger.error("Unlight2 error request: ------ ", e)
             response.error(UnlightException(500))
+
+    def _convert_body(self, route, request, response):
+        ''' `body=Schema` routes: json body -> `request.data`, else 400 with the reason '''
+        try:
+            data = request.json
+            if data is None:
+                raise SchemaError("json body required")
+            request.data = route.body(data)
+            return True
+        except UnlightException: # malformed json
+            reason = "malformed json"
+        except SchemaError as e:
+            reason = str(e)
+        response.code, response.msg = 400, STATUS_CODE_MSG[400]
+        response.json({"error": reason})
+        return False
+
+    async def _call(self, route, request, response):
+        if route.executor is None:
+            await route.handler(request, response)
+        else:
+            await self._offload(route, request, response)
+
+    async def _offload(self, route, request, response):
+        ''' run sync handler in the worker's pool, then answer on the loop '''
+        executor = self.executors[route.executor]
+        if route.executor == PROCESS:
+            request = OffloadRequest(request)
+        answer = await executor.run(get_running_loop(), route.handler, request, OffloadResponse())
+        task = answer.apply(response)
+        if task is not None:
+            await task
+
+    def executor_stats(self):
+        return {kind: executor.stats() for kind, executor in self.executors.items()}
+
+    def shutdown_executors(self):
+        for executor in self.executors.values():
+            executor.shutdown()
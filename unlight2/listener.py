@@ -0,0 +1,121 @@
+#
+# listening socket of the server: unix domain socket or tcp with socket options
+#
+import os
+import socket
+import stat
+
+
+def is_unix(address):
+    ''' a path listens on a unix domain socket, (host, port) on tcp '''
+    return isinstance(address, (str, bytes, os.PathLike))
+
+
+class Listener:
+    ''' `bind()` returns a non-blocking listening socket:
+        unix: `address` is the path, a stale socket file is replaced,
+              `unix_mode` e.g. 0o660 for the proxy's group
+        tcp:  options are set before listen(), accepted connections inherit
+              SO_KEEPALIVE (+ idle/interval/count), SO_RCVBUF and SO_SNDBUF.
+              TCP_NODELAY is set per connection by the loop, see `SimpleHttp`
+    '''
+
+    __slots__ = ("address", "backlog", "tcp_nodelay", "tcp_defer_accept", "tcp_fastopen",
+            "tcp_keepalive", "rcvbuf", "sndbuf", "unix_mode")
+
+    def __init__(self, address,
+            backlog = 1024,
+            tcp_nodelay = True,     # False: small writes may be delayed (Nagle)
+            tcp_defer_accept = 0,   # seconds: accept only once the request arrived
+            tcp_fastopen = 0,       # pending TFO connections, 0: off
+            tcp_keepalive = None,   # True: SO_KEEPALIVE, (idle, interval, count): tuned
+            rcvbuf = None,          # SO_RCVBUF bytes, None: kernel default
+            sndbuf = None,          # SO_SNDBUF bytes
+            unix_mode = None):      # permissions of the socket file
+        self.address = address
+        self.backlog = backlog
+        self.tcp_nodelay = tcp_nodelay
+        self.tcp_defer_accept = tcp_defer_accept
+        self.tcp_fastopen = tcp_fastopen
+        self.tcp_keepalive = tcp_keepalive
+        self.rcvbuf = rcvbuf
+        self.sndbuf = sndbuf
+        self.unix_mode = unix_mode
+
+    @property
+    def unix(self):
+        return is_unix(self.address)
+
+    def bind(self, reuse_port=False):
+        ''' `reuse_port`: tcp only, every prefork worker binds its own socket '''
+        sock = self._bind_unix() if self.unix else self._bind_tcp(reuse_port)
+        sock.setblocking(False)
+        return sock
+
+    def _bind_unix(self):
+        path = os.fspath(self.address)
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode): # left by a killed server
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(path)
+            if self.unix_mode is not None:
+                os.chmod(path, self.unix_mode)
+            self._set_buffers(sock)
+            sock.listen(self.backlog)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def _bind_tcp(self, reuse_port):
+        host, port = self.address
+        family, type_, proto, _, addr = socket.getaddrinfo(host or None, port,
+                type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE)[0]
+        sock = socket.socket(family, type_, proto)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            if self.tcp_nodelay:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.tcp_defer_accept and hasattr(socket, "TCP_DEFER_ACCEPT"):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_DEFER_ACCEPT,
+                        int(self.tcp_defer_accept))
+            if self.tcp_keepalive:
+                self._set_keepalive(sock)
+            self._set_buffers(sock)
+            sock.bind(addr)
+            if self.tcp_fastopen and hasattr(socket, "TCP_FASTOPEN"):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_FASTOPEN, self.tcp_fastopen)
+            sock.listen(self.backlog)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def _set_keepalive(self, sock):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if isinstance(self.tcp_keepalive, tuple) and hasattr(socket, "TCP_KEEPIDLE"):
+            idle, interval, count = self.tcp_keepalive
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count)
+
+    def _set_buffers(self, sock):
+        if self.rcvbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        if self.sndbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+
+    def close(self, sock):
+        ''' close and remove the socket file (unix) '''
+        sock.close()
+        if self.unix:
+            try:
+                os.unlink(os.fspath(self.address))
+            except FileNotFoundError:
+                pass
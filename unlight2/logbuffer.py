@@ -0,0 +1,195 @@
+#
+# batched logging: workers buffer compact records, the log side formats them
+#
+import threading
+from queue import Full, Empty
+from time import time, perf_counter, strftime, localtime
+
+from .lightlog import lightlog
+
+ERROR, WARNING, INFO, ACCESS = 0, 1, 2, 3
+_level_names = ("error", "warning", "info")
+_plain = (str, int, float, bytes, type(None))
+
+QUEUE_SIZE = 1024 # batches waiting for the log side
+
+_buffer = None # `LogBuffer` of this process, once installed
+
+
+class LogBuffer:
+    ''' records of one worker: (level, logger name, time, message, args),
+        access records: (ACCESS, remote addr, time, method, url, code, bytes, us).
+        nothing is formatted here. a batch is put on `queue` every `interval`
+        seconds or once `flush_size` records are waiting; records beyond
+        `max_records` (queue full, log side behind) are dropped and counted
+    '''
+
+    __slots__ = ("queue", "records", "max_records", "flush_size", "interval",
+            "loop", "timers", "scheduled", "dropped", "unreported")
+
+    def __init__(self, queue, max_records=8192, flush_size=512, interval=1):
+        self.queue = queue
+        self.records = []
+        self.max_records = max_records
+        self.flush_size = flush_size
+        self.interval = interval
+        self.loop = None
+        self.timers = None
+        self.scheduled = False
+        self.dropped = 0
+        self.unreported = 0 # dropped since last flush
+
+    def install(self, loop, timers):
+        ''' route `get_logger` loggers of this process through the buffer '''
+        global _buffer
+        self.loop = loop
+        self.timers = timers
+        _buffer = self
+        timers.call_later(self.interval, self._tick)
+
+    def uninstall(self):
+        global _buffer
+        if _buffer is self:
+            _buffer = None
+        self.flush()
+
+    def append(self, record):
+        records = self.records
+        if len(records) >= self.max_records:
+            self.dropped += 1
+            self.unreported += 1
+            return
+        records.append(record)
+        if len(records) >= self.flush_size and not self.scheduled:
+            self.scheduled = True
+            self.loop.call_soon(self.flush)
+
+    def access(self, response, remote_addr):
+        request = response.request
+        if request is None: # protocol error before a request was parsed
+            method, burl, us = None, None, 0
+        else:
+            method, burl = request.method, request.get_burl()
+            us = int((perf_counter() - request.start) * 1e6) if request.start else 0
+        self.append((ACCESS, remote_addr, time(), method, burl, response.code, response.sent, us))
+
+    def _tick(self):
+        self.flush()
+        if _buffer is self:
+            self.timers.call_later(self.interval, self._tick)
+
+    def flush(self):
+        self.scheduled = False
+        if self.unreported:
+            self.records.append((WARNING, "unlight2", time(),
+                    f"{self.unreported} log records dropped, buffer full", ()))
+            self.unreported = 0
+        records = self.records
+        if not records:
+            return
+        self.records = []
+        try:
+            self.queue.put_nowait(records)
+        except Full:
+            self.dropped += len(records)
+            self.unreported += len(records)
+
+    def stats(self):
+        return {"buffered": len(self.records), "dropped": self.dropped}
+
+
+class BufferedLogger:
+    ''' `lightlog` logger api: buffered once a `LogBuffer` is installed in
+        the process, straight to lightlog before (startup, master) '''
+
+    __slots__ = ("name", "logger")
+
+    def __init__(self, name):
+        self.name = name
+        self.logger = lightlog.get_logger(name)
+
+    def _log(self, level, msg, args):
+        buffer = _buffer
+        if buffer is None:
+            getattr(self.logger, _level_names[level])(msg, *args)
+            return
+        if args:
+            args = tuple(arg if isinstance(arg, _plain) else str(arg) for arg in args)
+        buffer.append((level, self.name, time(), msg, args))
+
+    def error(self, msg, *args):
+        self._log(ERROR, msg, args)
+
+    def warning(self, msg, *args):
+        self._log(WARNING, msg, args)
+
+    def info(self, msg, *args):
+        self._log(INFO, msg, args)
+
+
+def get_logger(name):
+    return BufferedLogger(name)
+
+
+class LogDrain:
+    ''' log side: takes batches off the queue, formats and hands them to lightlog.
+        multi-process: polled by the master loop, single process: own thread '''
+
+    __slots__ = ("queue", "loggers", "access_logger", "thread")
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.loggers = {}
+        self.access_logger = None
+        self.thread = None
+
+    def drain(self):
+        ''' write every batch waiting, without blocking '''
+        while True:
+            try:
+                batch = self.queue.get_nowait()
+            except (Empty, OSError, EOFError):
+                return
+            if batch is None:
+                return
+            self.write(batch)
+
+    def write(self, batch):
+        for record in batch:
+            level = record[0]
+            if level == ACCESS:
+                self._access(record)
+                continue
+            _, name, _, msg, args = record
+            logger = self.loggers.get(name)
+            if logger is None:
+                logger = self.loggers[name] = lightlog.get_logger(name)
+            getattr(logger, _level_names[level])(msg, *args)
+
+    def _access(self, record):
+        _, addr, at, method, burl, code, sent, us = record
+        if self.access_logger is None:
+            self.access_logger = lightlog.get_logger(fname="access_unlight2")
+        host = addr[0] if addr else "-"
+        url = burl.decode(errors="replace") if burl else "-"
+        self.access_logger.info(f'{host} [{strftime("%d/%b/%Y:%H:%M:%S", localtime(at))}] '
+                f'"{method or "-"} {url}" {code} {sent} {us / 1000:.3f}ms')
+
+    def start(self):
+        ''' single process: write batches from a thread '''
+        def run():
+            while True:
+                batch = self.queue.get()
+                if batch is None:
+                    return
+                self.write(batch)
+        self.thread = threading.Thread(target=run, name="unlight2-log", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        else:
+            self.drain()
@@ -0,0 +1,267 @@
+#
+# prefork master: supervises the worker processes of a `Server`
+#
+import gc
+import os
+import signal
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from time import monotonic
+
+from .metrics import Metrics
+from .logbuffer import LogDrain, QUEUE_SIZE
+from .lightlog import lightlog
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# workers inherit the built router, listening socket and closures: fork,
+# whatever the platform default start method is (spawn/forkserver pickle the target)
+fork_context = mp.get_context("fork")
+
+
+class Worker:
+    ''' one worker process, `served` is shared with it:
+            -1 while starting, then requests served (reported every second)
+    '''
+
+    __slots__ = ("slot", "region", "process", "served", "started", "replaces", "retiring")
+
+    def __init__(self, slot, region, target):
+        self.slot = slot
+        self.region = region # metrics region, one per live process
+        self.served = fork_context.RawValue("q", -1)
+        self.process = fork_context.Process(target=target, args=(slot, region, self.served))
+        self.started = monotonic()
+        self.replaces = None  # worker retired once this one listens
+        self.retiring = False # replacement on the way or SIGTERM sent
+        self.process.start()
+
+    @property
+    def ready(self):
+        return self.served.value >= 0
+
+    def rss(self):
+        ''' resident set size in bytes (linux), 0 if unknown '''
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            return 0
+
+
+class Master:
+    ''' prefork master:
+        1. respawns dead workers, backing off while they keep crashing at start
+        2. recycles a worker after `max_requests` requests or `max_rss` bytes
+        3. SIGHUP: rolling reload, an old worker is retired only after its
+           replacement listens, so capacity never drops
+        4. SIGINT/SIGTERM: graceful stop of all workers
+
+        listener: "reuse_port" -> every worker binds its own SO_REUSEPORT socket,
+                                  the kernel hashes connections across them
+                  "shared"     -> master binds one socket, workers inherit it and
+                                  accept from the same queue (always for unix sockets)
+                  None         -> "shared" when workers are recycled, else "reuse_port"
+
+        a retiring worker closes its SO_REUSEPORT socket and linux resets the
+        connections still queued on it: zero-downtime SIGHUP reloads need
+        listener="shared" (or sysctl net.ipv4.tcp_migrate_req=1, linux 5.14+)
+    '''
+
+    def __init__(self, server, n=0,
+            max_requests = 0,   # 0: never recycle by requests
+            max_rss = 0,        # bytes, 0: never recycle by memory
+            min_uptime = 5,     # a worker dying earlier counts as a crash
+            max_backoff = 30,   # seconds between respawns of a crashing worker
+            check_interval = 1,
+            listener = None,
+            cpu_affinity = False, # pin worker of slot i to the i-th allowed cpu
+            backlog = None):    # shared listener, None: `Server(backlog=)`
+        if listener is None: # recycling retires workers: their queued connections must survive
+            listener = "shared" if max_requests or max_rss else "reuse_port"
+        if listener not in ("reuse_port", "shared"):
+            raise ValueError(f"unknown listener: {listener}")
+        if server.listener.unix: # one socket file, can not be bound per worker
+            listener = "shared"
+        self.server = server
+        self.n = n or mp.cpu_count()
+        self.max_requests = max_requests
+        self.max_rss = max_rss
+        self.min_uptime = min_uptime
+        self.max_backoff = max_backoff
+        self.check_interval = check_interval
+        self.listener = listener
+        self.cpu_affinity = cpu_affinity
+        self.backlog = backlog
+        self.sock = None
+        self.workers = []
+        self.respawns = {} # slot -> respawn time
+        self.failures = {} # slot -> crashes in a row
+        self.reload_requested = False
+        self.stop_requested = False
+        self.stop_deadline = None
+        self.wakeup = None
+        self.logger = None
+        self.log_drain = None
+
+    def run(self):
+        log_worker, self.logger = lightlog.get_ready_log_worker(fname="info_unlight2")
+        log_worker.start()
+
+        # signals only set flags, the wakeup fd breaks `wait()`
+        rfd, wfd = self.wakeup = os.pipe()
+        os.set_blocking(rfd, False)
+        os.set_blocking(wfd, False)
+        signal.set_wakeup_fd(wfd)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        if self.server.profile_dir: # meant for a worker, must not kill the master
+            signal.signal(signal.SIGUSR2, signal.SIG_IGN)
+
+        server = self.server
+        if server.metrics_path: # one region per live worker, old + new while reloading
+            server.router.freeze()
+            server.metrics = Metrics(server.router.route_labels, regions=2 * self.n)
+
+        if server.log_buffer: # workers batch log records, formatted here
+            server.log_queue = fork_context.Queue(QUEUE_SIZE)
+            self.log_drain = LogDrain(server.log_queue)
+
+        if self.listener == "shared":
+            if self.backlog is not None:
+                server.listener.backlog = self.backlog
+            self.sock = server.listener.bind()
+
+        for slot in range(self.n):
+            self._spawn(slot)
+        self.logger.info(f"server starts {self.server.address} multi-process ..")
+
+        while self.workers or (self.respawns and not self.stop_requested):
+            wait([worker.process.sentinel for worker in self.workers] + [rfd],
+                    self.check_interval)
+            try:
+                while os.read(rfd, 512):
+                    pass
+            except BlockingIOError:
+                pass
+            if self.log_drain is not None:
+                self.log_drain.drain()
+            self._check()
+
+        signal.set_wakeup_fd(-1)
+        os.close(rfd)
+        os.close(wfd)
+        if self.sock is not None:
+            server.listener.close(self.sock)
+        if server.metrics is not None:
+            server.metrics.close(unlink=True)
+        if self.log_drain is not None:
+            self.log_drain.drain()
+        log_worker.terminate()
+        log_worker.join()
+
+    def _on_stop(self, sig, frame):
+        self.stop_requested = True
+
+    def _on_reload(self, sig, frame):
+        self.reload_requested = True
+
+    def _worker_main(self, slot, region, served):
+        # forked: drop the master's signal setup
+        signal.set_wakeup_fd(-1)
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        for fd in self.wakeup:
+            os.close(fd)
+        if self.cpu_affinity and hasattr(os, "sched_setaffinity"):
+            cpus = sorted(os.sched_getaffinity(0))
+            os.sched_setaffinity(0, {cpus[slot % len(cpus)]})
+        self.server.run(served=served, sock=self.sock, region=region)
+
+    def _spawn(self, slot):
+        used = {worker.region for worker in self.workers}
+        # quick reloads may stack more draining workers: share the slot's region then
+        region = next((region for region in range(2 * self.n) if region not in used), slot)
+        if self.server.gc_freeze: # keep the collector off pages shared with the worker
+            gc.freeze()
+        worker = Worker(slot, region, self._worker_main)
+        self.workers.append(worker)
+        return worker
+
+    def _replace(self, worker):
+        worker.retiring = True
+        self._spawn(worker.slot).replaces = worker
+
+    def _check(self):
+        now = monotonic()
+        for worker in [w for w in self.workers if not w.process.is_alive()]:
+            worker.process.join()
+            self.workers.remove(worker)
+            if self.server.metrics is not None:
+                self.server.metrics.detach(worker.region, worker.process.pid)
+            self._exited(worker, now)
+
+        if self.stop_requested:
+            self._stop(now)
+            return
+
+        if self.reload_requested:
+            self.reload_requested = False
+            self.logger.info("reloading workers ..")
+            for worker in list(self.workers):
+                if not worker.retiring and worker.replaces is None:
+                    self._replace(worker)
+
+        for worker in list(self.workers):
+            old = worker.replaces
+            if old is not None and worker.ready:
+                worker.replaces = None
+                old.process.terminate() # graceful drain in the worker
+            elif not worker.retiring and worker.ready and self._worn_out(worker):
+                self._replace(worker)
+
+        for slot, at in list(self.respawns.items()):
+            if at <= now:
+                del self.respawns[slot]
+                self._spawn(slot)
+
+    def _worn_out(self, worker):
+        if self.max_requests and worker.served.value >= self.max_requests:
+            self.logger.info(f"worker {worker.process.pid} served {worker.served.value} requests, recycling")
+            return True
+        if self.max_rss:
+            rss = worker.rss()
+            if rss > self.max_rss:
+                self.logger.info(f"worker {worker.process.pid} rss {rss} bytes, recycling")
+                return True
+        return False
+
+    def _exited(self, worker, now):
+        if worker.retiring or self.stop_requested:
+            return
+        code = worker.process.exitcode
+        if worker.replaces is not None: # replacement died, keep the old one
+            worker.replaces.retiring = False
+            self.logger.error(f"worker {worker.process.pid} exited ({code}) before listening")
+            return
+
+        slot = worker.slot
+        if now - worker.started < self.min_uptime:
+            failures = self.failures[slot] = self.failures.get(slot, 0) + 1
+            delay = min(self.max_backoff, 2 ** (failures - 1))
+        else:
+            self.failures[slot] = 0
+            delay = 0
+        self.respawns[slot] = now + delay
+        self.logger.error(f"worker {worker.process.pid} exited ({code}), respawn in {delay}s")
+
+    def _stop(self, now):
+        if self.stop_deadline is None:
+            self.respawns.clear()
+            self.stop_deadline = now + self.server.shutdown_timeout + 5
+            for worker in self.workers:
+                worker.process.terminate()
+        elif now > self.stop_deadline:
+            for worker in self.workers:
+                worker.process.kill()
@@ -0,0 +1,229 @@
+#
+# per-route request metrics of all workers, in one shared memory region
+#
+from multiprocessing import shared_memory
+from os import getpid
+from time import perf_counter
+
+from .executor import KINDS
+from .exception import STATUS_CODE_MSG
+
+# per worker region: header, then one record per route index (see `HttpRouter.freeze`)
+PID, IN_FLIGHT = 0, 1
+POOLS = 2 # executor.KINDS: size, in flight, rejected of each
+POOL_FIELDS = 3
+HEADER = POOLS + POOLS * POOL_FIELDS
+REQUESTS, BYTES_IN, BYTES_OUT, LATENCY_SUM = 0, 1, 2, 3 # latency in microseconds
+# status counts: one slot per known code, then 1xx..5xx for codes not listed
+STATUS = 4
+STATUS_CODES = tuple(sorted(STATUS_CODE_MSG))
+STATUS_SLOTS = {code: i for i, code in enumerate(STATUS_CODES)}
+BUCKETS = STATUS + len(STATUS_CODES) + 5 # latency histogram
+
+# power-of-two latency buckets (HDR style, O(1) index from bit length):
+# bucket i holds < 2**(i+7) us, i.e. 128us .. 67s, the last one is +Inf
+BUCKET_SHIFT = 7
+BUCKET_COUNT = 21
+FIELDS = BUCKETS + BUCKET_COUNT
+bucket_bounds = tuple((1 << (i + BUCKET_SHIFT)) / 1e6 for i in range(BUCKET_COUNT - 1))
+
+STATIC, UNMATCHED = 0, 1 # route indexes without a route
+
+
+class Metrics:
+    ''' request counters, recorded once a response is completely written.
+        every worker writes its own region (no locks), `render()` sums all of
+        them into prometheus text:
+            regions=1 -> single process, plain memory
+            regions>1 -> created by the master before forking, shared memory
+    '''
+
+    __slots__ = ("labels", "regions", "shm", "view", "base", "stride")
+
+    def __init__(self, labels, regions=1):
+        self.labels = labels # route index -> "METHOD /path"
+        self.regions = regions
+        self.stride = HEADER + len(labels) * FIELDS
+        size = regions * self.stride * 8
+        if regions > 1:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.view = self.shm.buf.cast("q")
+        else:
+            self.shm = None
+            self.view = memoryview(bytearray(size)).cast("q")
+        self.base = 0
+
+    def attach(self, region=0):
+        ''' called by the worker owning `region` '''
+        base = self.base = region * self.stride
+        self.view[base + PID] = getpid()
+        self.view[base + IN_FLIGHT] = 0 # previous owner is gone
+        for index in range(POOLS):
+            self.view[base + POOLS + index * POOL_FIELDS + 1] = 0
+
+    def detach(self, region, pid):
+        ''' called by the master once the worker `pid` exited: its region stops
+            being reported as a live worker (route counters are kept) '''
+        base = region * self.stride
+        view = self.view
+        if view is None or view[base + PID] != pid: # region taken over already
+            return
+        for i in range(HEADER):
+            view[base + i] = 0
+
+    def close(self, unlink=False):
+        ''' workers just detach, the master (creator) unlinks '''
+        if self.view is None:
+            return
+        self.view.release()
+        self.view = None
+        if self.shm is not None:
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+            self.shm = None
+
+    # hot path
+
+    def begin(self):
+        self.view[self.base + IN_FLIGHT] += 1
+
+    def abort(self, count):
+        ''' responses dropped with their connection '''
+        self.view[self.base + IN_FLIGHT] -= count
+
+    def pool(self, index, size, in_flight, rejected):
+        ''' state of the worker's handler pool `index` (see `executor.KINDS`) '''
+        view = self.view
+        start = self.base + POOLS + index * POOL_FIELDS
+        view[start] = size
+        view[start + 1] = in_flight
+        view[start + 2] = rejected
+
+    def record(self, response):
+        view = self.view
+        base = self.base
+        view[base + IN_FLIGHT] -= 1
+
+        request = response.request
+        index = UNMATCHED
+        if request is not None and request.match is not None:
+            route, _, static_path = request.match
+            if route is not None:
+                index = route.index
+            elif static_path:
+                index = STATIC
+        base += HEADER + index * FIELDS
+
+        view[base + REQUESTS] += 1
+        if request is not None:
+            view[base + BYTES_IN] += request.received
+        view[base + BYTES_OUT] += response.sent
+        code = response.code
+        slot = STATUS_SLOTS.get(code)
+        if slot is not None:
+            view[base + STATUS + slot] += 1
+        elif 1 <= code // 100 <= 5:
+            view[base + STATUS + len(STATUS_CODES) + code // 100 - 1] += 1
+        if request is not None and request.start:
+            us = int((perf_counter() - request.start) * 1e6)
+            view[base + LATENCY_SUM] += us
+            bucket = us.bit_length() - BUCKET_SHIFT
+            if bucket < 0:
+                bucket = 0
+            elif bucket >= BUCKET_COUNT:
+                bucket = BUCKET_COUNT - 1
+            view[base + BUCKETS + bucket] += 1
+
+    # aggregation
+
+    def snapshot(self):
+        ''' ([(region, pid, in_flight, requests, pools)] of worker regions,
+             [fields summed per route index]) '''
+        view = self.view
+        stride = self.stride
+        workers = []
+        totals = [[0] * FIELDS for _ in self.labels]
+        for region in range(self.regions):
+            base = region * stride
+            pid = view[base + PID]
+            if not pid:
+                continue
+            requests = 0
+            for index, total in enumerate(totals):
+                start = base + HEADER + index * FIELDS
+                record = view[start:start + FIELDS]
+                requests += record[REQUESTS]
+                for i, value in enumerate(record):
+                    total[i] += value
+            start = base + POOLS
+            pools = [view[start + index * POOL_FIELDS:start + (index + 1) * POOL_FIELDS].tolist()
+                    for index in range(POOLS)]
+            workers.append((region, pid, view[base + IN_FLIGHT], requests, pools))
+        return workers, totals
+
+    def render(self):
+        ''' prometheus text exposition format '''
+        workers, totals = self.snapshot()
+        lines = []
+        add = lines.append
+
+        add("# HELP unlight2_worker_in_flight_requests Requests not yet answered.")
+        add("# TYPE unlight2_worker_in_flight_requests gauge")
+        for region, pid, in_flight, _, _ in workers:
+            add(f'unlight2_worker_in_flight_requests{{worker="{region}",pid="{pid}"}} {in_flight}')
+        add("# HELP unlight2_worker_requests_total Requests answered per worker.")
+        add("# TYPE unlight2_worker_requests_total counter")
+        for region, pid, _, requests, _ in workers:
+            add(f'unlight2_worker_requests_total{{worker="{region}",pid="{pid}"}} {requests}')
+
+        pools = [(f'worker="{region}",pid="{pid}",pool="{KINDS[index]}"', pool)
+                for region, pid, _, _, worker_pools in workers
+                for index, pool in enumerate(worker_pools) if pool[0]]
+        for name, kind, help, value in (
+                ("workers", "gauge", "Size of the handler pool.", lambda pool: pool[0]),
+                ("in_flight", "gauge", "Offloaded handlers running or queued.", lambda pool: pool[1]),
+                ("queued", "gauge", "Offloaded handlers waiting for a pool worker.",
+                    lambda pool: max(0, pool[1] - pool[0])),
+                ("rejected_total", "counter", "Handlers refused (503), pool queue full.",
+                    lambda pool: pool[2])):
+            add(f"# HELP unlight2_pool_{name} {help}")
+            add(f"# TYPE unlight2_pool_{name} {kind}")
+            for labels, pool in pools:
+                add(f"unlight2_pool_{name}{{{labels}}} {value(pool)}")
+
+        routes = [(f'route="{_escape(label)}"', total)
+                for label, total in zip(self.labels, totals) if total[REQUESTS]]
+        add("# HELP unlight2_requests_total Requests answered, by route and status code.")
+        add("# TYPE unlight2_requests_total counter")
+        codes = [str(code) for code in STATUS_CODES] + [f"{i}xx" for i in range(1, 6)] # unlisted codes
+        for route, total in routes:
+            for i, code in enumerate(codes):
+                if total[STATUS + i]:
+                    add(f'unlight2_requests_total{{{route},code="{code}"}} {total[STATUS + i]}')
+        add("# HELP unlight2_request_bytes_total Bytes received.")
+        add("# TYPE unlight2_request_bytes_total counter")
+        for route, total in routes:
+            add(f"unlight2_request_bytes_total{{{route}}} {total[BYTES_IN]}")
+        add("# HELP unlight2_response_bytes_total Bytes sent.")
+        add("# TYPE unlight2_response_bytes_total counter")
+        for route, total in routes:
+            add(f"unlight2_response_bytes_total{{{route}}} {total[BYTES_OUT]}")
+
+        add("# HELP unlight2_request_duration_seconds From request line to last byte written.")
+        add("# TYPE unlight2_request_duration_seconds histogram")
+        for route, total in routes:
+            cumulative = 0
+            for i, bound in enumerate(bucket_bounds):
+                cumulative += total[BUCKETS + i]
+                add(f'unlight2_request_duration_seconds_bucket{{{route},le="{bound:g}"}} {cumulative}')
+            cumulative += total[BUCKETS + BUCKET_COUNT - 1]
+            add(f'unlight2_request_duration_seconds_bucket{{{route},le="+Inf"}} {cumulative}')
+            add(f"unlight2_request_duration_seconds_sum{{{route}}} {total[LATENCY_SUM] / 1e6}")
+            add(f"unlight2_request_duration_seconds_count{{{route}}} {cumulative}")
+        add("")
+        return "\n".join(lines)
+
+
+def _escape(label):
+    return label.replace("\\", "\\\\").replace('"', '\\"')
@@ -0,0 +1,194 @@
+import re
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+
+bparam_pattern = re.compile(rb';\s*([\w*-]+)=(?:"((?:[^"\\]|\\.)*)"|([^;]*))')
+
+
+class MultipartPart:
+    ''' one part of multipart/form-data body:
+            field -> `part.value` (str)
+            file  -> `part.read()` / `part.save(path)`, spooled to a temp file
+                     once it grows over `spool_size`
+    '''
+
+    __slots__ = ("name", "filename", "content_type", "headers", "size", "_data")
+
+    def __init__(self, name, filename, content_type, headers, spool_size):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.headers = headers
+        self.size = 0
+        if filename is None:
+            self._data = bytearray()
+        else:
+            self._data = SpooledTemporaryFile(max_size=spool_size)
+
+    @property
+    def is_file(self):
+        return self.filename is not None
+
+    @property
+    def value(self):
+        if self.filename is None:
+            return self._data.decode()
+        return self.read()
+
+    @property
+    def file(self):
+        ''' file object of file part (rewound) '''
+        self._data.seek(0)
+        return self._data
+
+    def write(self, data):
+        self.size += len(data)
+        if self.filename is None:
+            self._data += data
+        else:
+            self._data.write(data)
+
+    def read(self):
+        if self.filename is None:
+            return bytes(self._data)
+        return self.file.read()
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            copyfileobj(self.file, f)
+
+    def close(self):
+        if self.filename is not None:
+            self._data.close()
+
+
+_PREAMBLE, _DELIMITER, _HEADERS, _BODY, _DONE = range(5)
+
+class MultipartParser:
+    ''' incremental multipart/form-data parser, body chunks are scanned once
+        as they arrive:
+            parser = MultipartParser(bboundary)
+            for part in parser.feed(chunk):  # completed parts
+                ...
+            form = parser.close()
+    '''
+
+    __slots__ = (
+        "bdelimiter",
+        "spool_size",
+        "max_field_size",
+        "max_header_size",
+        "state",
+        "buf",
+        "part",
+        "parts"
+    )
+
+    def __init__(self, bboundary,
+            spool_size = 1024*1024*1, # 1M
+            max_field_size = 1024*1024*1,
+            max_header_size = 16*1024):
+        self.bdelimiter = b"\r\n--" + bboundary
+        self.spool_size = spool_size
+        self.max_field_size = max_field_size
+        self.max_header_size = max_header_size
+        self.state = _PREAMBLE
+        self.buf = bytearray(b"\r\n") # first delimiter has no leading CRLF
+        self.part = None
+        self.parts = []
+
+    def feed(self, data):
+        ''' returns parts completed by this chunk, raises ValueError on bad body '''
+        buf = self.buf
+        buf += data
+        done = []
+        bdelimiter = self.bdelimiter
+        while True:
+            state = self.state
+            if state == _BODY:
+                idx = buf.find(bdelimiter)
+                if idx < 0: # keep a possible partial delimiter
+                    safe = len(buf) - len(bdelimiter) + 1
+                    if safe > 0:
+                        self._write(buf, safe)
+                        del buf[:safe]
+                    break
+                self._write(buf, idx)
+                del buf[:idx + len(bdelimiter)]
+                done.append(self.part)
+                self.part = None
+                self.state = _DELIMITER
+            elif state == _PREAMBLE:
+                idx = buf.find(bdelimiter)
+                if idx < 0:
+                    del buf[:max(0, len(buf) - len(bdelimiter) + 1)]
+                    break
+                del buf[:idx + len(bdelimiter)]
+                self.state = _DELIMITER
+            elif state == _DELIMITER:
+                if len(buf) < 2:
+                    break
+                if buf[:2] == b"--":
+                    del buf[:]
+                    self.state = _DONE
+                    break
+                if buf[:2] != b"\r\n":
+                    raise ValueError("bad multipart delimiter")
+                del buf[:2]
+                self.state = _HEADERS
+            elif state == _HEADERS:
+                idx = buf.find(b"\r\n\r\n")
+                if idx < 0:
+                    if len(buf) > self.max_header_size:
+                        raise ValueError("multipart part header too large")
+                    break
+                self.part = self._new_part(bytes(buf[:idx]))
+                self.parts.append(self.part)
+                del buf[:idx + 4]
+                self.state = _BODY
+            else: # _DONE, epilogue is ignored
+                del buf[:]
+                break
+        return done
+
+    def _write(self, buf, size):
+        part = self.part
+        if part.filename is None and part.size + size > self.max_field_size:
+            raise ValueError("multipart field too large")
+        with memoryview(buf) as view, view[:size] as data: # no slice copy
+            part.write(data)
+
+    def _new_part(self, bheaders):
+        headers = {}
+        for bline in bheaders.split(b"\r\n"):
+            bname, sep, bvalue = bline.partition(b":")
+            if not sep:
+                raise ValueError("bad multipart part header")
+            headers[bname.strip().lower().decode()] = bvalue.strip().decode("utf-8", "replace")
+
+        name = filename = None
+        disposition = headers.get("content-disposition", "").encode()
+        for bkey, bquoted, bplain in bparam_pattern.findall(disposition):
+            bvalue = bquoted.replace(b'\\"', b'"') if bquoted or not bplain else bplain.strip()
+            if bkey == b"name":
+                name = bvalue.decode()
+            elif bkey == b"filename":
+                filename = bvalue.decode("utf-8", "replace")
+        if name is None:
+            raise ValueError("multipart part without name")
+        return MultipartPart(name, filename, headers.get("content-type"),
+                headers, self.spool_size)
+
+    def close(self):
+        ''' body is complete: {name: str | MultipartPart(file)} '''
+        if self.state != _DONE:
+            raise ValueError("multipart body is incomplete")
+        form = {}
+        for part in self.parts:
+            form[part.name] = part if part.filename is not None else part.value
+        return form
+
+    def cleanup(self):
+        for part in self.parts:
+            part.close()
+        self.parts = []
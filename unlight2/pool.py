@@ -0,0 +1,78 @@
+#
+# free lists of connection objects of one worker
+#
+from .simple_http import Request, Response
+
+
+class ObjectPool:
+    ''' recycles protocols (with their parser) of closed connections and the
+        Request/Response pairs of answered requests, at most `size` of each.
+        objects come back only when nothing refers to them any more:
+        handler returned, response written, connection closed at a message
+        boundary. a handler must not keep `request`/`response` around after
+        it returned (background tasks: copy what they need)
+    '''
+
+    __slots__ = ("size", "protocols", "requests", "responses", "created", "reused")
+
+    def __init__(self, size=256):
+        self.size = size
+        self.protocols = []
+        self.requests = []
+        self.responses = []
+        self.created = 0
+        self.reused = 0
+
+    def protocol_factory(self, factory):
+        ''' wraps the protocol factory of `loop.create_server` '''
+        protocols = self.protocols
+        def make():
+            if protocols:
+                self.reused += 1
+                protocol = protocols.pop()
+                protocol.reset()
+                return protocol
+            self.created += 1
+            return factory()
+        return make
+
+    def release_protocol(self, protocol):
+        if len(self.protocols) < self.size:
+            self.protocols.append(protocol)
+
+    def request(self, protocol):
+        if self.requests:
+            request = self.requests.pop()
+            request.rebind(protocol)
+            return request
+        return Request(protocol)
+
+    def response(self, protocol, request):
+        if self.responses:
+            response = self.responses.pop()
+            response.rebind(protocol, request)
+            return response
+        return Response(protocol, request)
+
+    def release(self, request, response):
+        if len(self.requests) < self.size:
+            request.reset()
+            self.requests.append(request)
+        if len(self.responses) < self.size:
+            response.reset()
+            response.pending.clear() # connection lost before they went out
+            response.request = None
+            self.responses.append(response)
+
+    def clear(self):
+        self.protocols.clear()
+        self.requests.clear()
+        self.responses.clear()
+
+    def stats(self):
+        return {
+            "protocols": len(self.protocols),
+            "requests": len(self.requests),
+            "responses": len(self.responses),
+            "created": self.created,
+            "reused": self.reused}
@@ -0,0 +1,338 @@
+#
+# route body schemas: compiled once into converters of decoded json
+#
+import dataclasses
+import enum
+import types
+import typing
+
+_MISSING = object()
+
+
+class SchemaError(ValueError):
+    ''' body does not match the schema, `loc`: keys/indexes from the leaf up '''
+
+    def __init__(self, msg):
+        super().__init__(msg)
+        self.msg = msg
+        self.loc = []
+
+    def __str__(self):
+        path = ""
+        for key in reversed(self.loc):
+            path += f"[{key}]" if type(key) is int else (f".{key}" if path else key)
+        return f"{path}: {self.msg}" if path else self.msg
+
+    def __reduce__(self): # picklable with its location
+        return _rebuild_error, (self.msg, self.loc)
+
+
+def _rebuild_error(msg, loc):
+    exc = SchemaError(msg)
+    exc.loc = loc
+    return exc
+
+def _mismatch(expected, value):
+    return SchemaError(f"expected {expected}, got {_json_type(value)}")
+
+def _json_type(value):
+    if value is None:
+        return "null"
+    if type(value) is bool:
+        return "bool"
+    if type(value) is dict:
+        return "object"
+    if type(value) is list:
+        return "array"
+    return type(value).__name__
+
+
+def compile_schema(schema):
+    ''' converter of decoded json: converter(data) -> value, raises `SchemaError`.
+        schema types:
+            str, int, float (ints accepted), bool, None, typing.Any
+            list[T], tuple[T, ...], dict[str, T]
+            Optional[T], Union[..], T | None, Literal[..], Enum subclasses
+            dataclasses -> instances (fields with defaults are optional)
+            TypedDict   -> dicts of the declared keys
+        unknown keys of objects are ignored, unsupported types raise TypeError here
+    '''
+    return _compile(schema, {})[1]
+
+def _compile(tp, seen):
+    ''' (exact, convert): values whose type is `exact` pass unchanged,
+        everything else goes through `convert` '''
+    if tp is typing.Any or tp is object:
+        return None, _identity
+    if tp is None or tp is type(None):
+        return type(None), _expect_null
+    if tp is bool:
+        return bool, _expect_bool
+    if tp is int:
+        return int, _expect_int
+    if tp is float:
+        return float, _to_float
+    if tp is str:
+        return str, _expect_str
+
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+    if origin is list:
+        return None, _list(*_compile(args[0] if args else typing.Any, seen))
+    if origin is tuple:
+        if len(args) != 2 or args[1] is not Ellipsis:
+            raise TypeError(f"only tuple[T, ...] is supported: {tp}")
+        return None, _tuple(*_compile(args[0], seen))
+    if origin is dict:
+        if args and args[0] is not str:
+            raise TypeError(f"json object keys are str: {tp}")
+        return None, _dict(*_compile(args[1] if args else typing.Any, seen))
+    if origin is typing.Union or origin is types.UnionType:
+        return None, _union([_compile(arg, seen) for arg in args],
+                " | ".join(_describe(arg) for arg in args))
+    if origin is typing.Literal:
+        return None, _literal(args)
+
+    if isinstance(tp, type):
+        if issubclass(tp, enum.Enum):
+            return None, _enum(tp)
+        if dataclasses.is_dataclass(tp) or typing.is_typeddict(tp):
+            convert = seen.get(tp)
+            if convert is None: # recursive schemas: resolved once compiled
+                cell = []
+                seen[tp] = lambda value: cell[0](value)
+                convert = _dataclass(tp, seen) if dataclasses.is_dataclass(tp) \
+                    else _typeddict(tp, seen)
+                cell.append(convert)
+                seen[tp] = convert
+            return None, convert
+    raise TypeError(f"unsupported schema type: {tp!r}")
+
+
+def _identity(value):
+    return value
+
+def _expect_null(value):
+    if value is not None:
+        raise _mismatch("null", value)
+    return value
+
+def _expect_bool(value):
+    if type(value) is not bool:
+        raise _mismatch("bool", value)
+    return value
+
+def _expect_int(value):
+    if type(value) is not int:
+        raise _mismatch("int", value)
+    return value
+
+def _to_float(value):
+    if type(value) is float:
+        return value
+    if type(value) is int:
+        return float(value)
+    raise _mismatch("float", value)
+
+def _expect_str(value):
+    if type(value) is not str:
+        raise _mismatch("str", value)
+    return value
+
+def _convert_items(value, exact, convert):
+    ''' new list, only when some item needs converting '''
+    if exact is not None:
+        for item in value:
+            if type(item) is not exact:
+                break
+        else:
+            return value
+    out = []
+    for i, item in enumerate(value):
+        try:
+            out.append(item if type(item) is exact else convert(item))
+        except SchemaError as e:
+            e.loc.append(i)
+            raise
+    return out
+
+def _list(exact, convert):
+    def convert_list(value):
+        if type(value) is not list:
+            raise _mismatch("array", value)
+        return _convert_items(value, exact, convert)
+    return convert_list
+
+def _tuple(exact, convert):
+    def convert_tuple(value):
+        if type(value) is not list:
+            raise _mismatch("array", value)
+        return tuple(_convert_items(value, exact, convert))
+    return convert_tuple
+
+def _dict(exact, convert):
+    def convert_dict(value):
+        if type(value) is not dict:
+            raise _mismatch("object", value)
+        if exact is not None:
+            for item in value.values():
+                if type(item) is not exact:
+                    break
+            else:
+                return value
+        out = {}
+        for key, item in value.items():
+            try:
+                out[key] = item if type(item) is exact else convert(item)
+            except SchemaError as e:
+                e.loc.append(key)
+                raise
+        return out
+    return convert_dict
+
+def _union(options, expected):
+    exacts = tuple(exact for exact, _ in options if exact is not None)
+    converts = [convert for exact, convert in options if exact is None]
+    def convert_union(value):
+        if type(value) in exacts:
+            return value
+        deepest = None
+        for convert in converts:
+            try:
+                return convert(value)
+            except SchemaError as e: # matched the shape, failed inside
+                if e.loc and (deepest is None or len(e.loc) > len(deepest.loc)):
+                    deepest = e
+        if type(value) is int and float in exacts: # float | ..
+            return float(value)
+        if deepest is not None:
+            raise deepest
+        raise _mismatch(expected, value)
+    return convert_union
+
+def _describe(tp):
+    if tp is None or tp is type(None):
+        return "null"
+    origin = typing.get_origin(tp)
+    if origin in (list, tuple):
+        return "array"
+    if origin is dict:
+        return "object"
+    if origin is typing.Literal:
+        return " | ".join(repr(value) for value in typing.get_args(tp))
+    return getattr(tp, "__name__", repr(tp))
+
+def _literal(values):
+    allowed = {(type(value), value) for value in values}
+    expected = " | ".join(repr(value) for value in values)
+    def convert_literal(value):
+        if type(value) in (list, dict) or (type(value), value) not in allowed: # unhashable
+            raise SchemaError(f"expected {expected}, got {value!r}")
+        return value
+    return convert_literal
+
+def _enum(cls):
+    expected = " | ".join(repr(member.value) for member in cls)
+    def convert_enum(value):
+        try:
+            return cls(value)
+        except ValueError:
+            raise SchemaError(f"expected {expected}, got {value!r}") from None
+    return convert_enum
+
+def _field(convert, value, key):
+    try:
+        return convert(value)
+    except SchemaError as e:
+        e.loc.append(key)
+        raise
+
+def _required(key):
+    exc = SchemaError("field required")
+    exc.loc.append(key)
+    return exc
+
+def _object(cls, seen, names, required, build):
+    ''' converter of one object schema, generated like `dataclasses` does
+        `__init__`: one straight-line function, field checks inlined '''
+    hints = typing.get_type_hints(cls)
+    namespace = {"_MISSING": _MISSING, "_field": _field, "_required": _required,
+        "_mismatch": _mismatch, "cls": cls, "expected": f"object ({cls.__name__})"}
+    lines = ["def convert(value):",
+        "    if type(value) is not dict:",
+        "        raise _mismatch(expected, value)",
+        "    get = value.get"] + build.start()
+    for i, name in enumerate(names):
+        exact, convert = _compile(hints[name], seen)
+        namespace[f"t{i}"], namespace[f"c{i}"] = exact, convert
+        key = repr(name)
+        lines.append(f"    v{i} = get({key}, _MISSING)")
+        lines.append(f"    if v{i} is _MISSING:")
+        if name in required:
+            lines.append(f"        raise _required({key})")
+        else:
+            lines.extend(build.missing(i, name, namespace) or ["        pass"])
+        lines.append("    else:")
+        if exact is not None:
+            lines.append(f"        if type(v{i}) is not t{i}:")
+            lines.append(f"            v{i} = _field(c{i}, v{i}, {key})")
+        else:
+            lines.append(f"        v{i} = _field(c{i}, v{i}, {key})")
+        lines.extend(build.present(i, name))
+    lines.extend(build.result(names))
+    exec("\n".join(lines), namespace)
+    return namespace["convert"]
+
+
+class _DataclassBuild:
+    ''' missing optional fields take their default, result: `cls(..)` '''
+
+    def __init__(self, cls):
+        self.fields = {f.name: f for f in dataclasses.fields(cls)}
+
+    def start(self):
+        return []
+
+    def missing(self, i, name, namespace):
+        f = self.fields[name]
+        if f.default is not dataclasses.MISSING:
+            namespace[f"d{i}"] = f.default
+            return [f"        v{i} = d{i}"]
+        if f.default_factory is not dataclasses.MISSING:
+            namespace[f"d{i}"] = f.default_factory
+            return [f"        v{i} = d{i}()"]
+        return []
+
+    def present(self, i, name):
+        return []
+
+    def result(self, names):
+        # by keyword: kw_only fields may sit between positional ones
+        args = ", ".join(f"{name}=v{i}" for i, name in enumerate(names))
+        return [f"    return cls({args})"]
+
+
+class _TypedDictBuild:
+    ''' missing optional keys stay missing, result: a new dict '''
+
+    def start(self):
+        return ["    out = {}"]
+
+    def missing(self, i, name, namespace):
+        return []
+
+    def present(self, i, name):
+        return [f"        out[{name!r}] = v{i}"]
+
+    def result(self, names):
+        return ["    return out"]
+
+def _dataclass(cls, seen):
+    names = [f.name for f in dataclasses.fields(cls) if f.init]
+    required = {f.name for f in dataclasses.fields(cls) if f.init
+        and f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING}
+    return _object(cls, seen, names, required, _DataclassBuild(cls))
+
+def _typeddict(cls, seen):
+    return _object(cls, seen, list(typing.get_type_hints(cls)), cls.__required_keys__,
+            _TypedDictBuild())
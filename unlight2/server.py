@@ -3,84 +3,202 @@ import uvloop
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 from functools import partial
-import multiprocessing as mp
+import gc
 import signal
-from os import kill
+from os import getppid
+from queue import Queue
 
 from .simple_http import SimpleHttp
 from .httproute import HttpRouter
+from .timer import TimerWheel
+from .connections import ConnectionManager
+from .master import Master
+from .metrics import Metrics
+from .pool import ObjectPool
+from .logbuffer import LogBuffer, LogDrain, QUEUE_SIZE
+from .trace import Tracer, Profiler
+from .listener import Listener
 from .lightlog import lightlog
 
 class Server:
     ''' environment of service
         1. uvloop for asynchronous tasks
         2. support multi-process
-        3. slots for middlewares(protocol, db, cache, message..)
+        3. `address`: (host, port) or the path of a unix domain socket
+           (behind a local proxy: no tcp/ip stack on the loopback)
+        4. slots for middlewares(protocol, db, cache, message..):
+           `env` is `request.env` of every handler, fill it before `run`
+               server.env["kv"] = SharedCache() # shared by the workers
     '''
 
-    def __init__(self, address, protocol_cls=SimpleHttp):
+    def __init__(self, address, protocol_cls=SimpleHttp,
+            max_conns = 10000,      # per worker, then idle eviction / 503
+            shutdown_timeout = 30,  # seconds in-flight requests get on shutdown
+            metrics_path = None,    # e.g. "/metrics": record requests, serve prometheus text
+            pool_size = 256,        # per worker free list of protocols/requests/responses, 0: off
+            gc_freeze = True,       # move startup objects out of the collector's reach
+            gc_threshold = None,    # e.g. (50000, 20, 100), see `gc.set_threshold`
+            log_buffer = 8192,      # records a worker buffers for the log side, 0: log inline
+            access_log = False,     # one log record per response (needs `log_buffer`)
+            trace_slow = None,      # seconds: trace request phases, log slower ones, None: off
+            profile_path = None,    # e.g. "/_profile": stack samples of the worker, collapsed
+            profile_dir = None,     # SIGUSR2 to a worker writes its stack samples here
+            profile_seconds = 10,   # default sampling time of both
+            backlog = 1024,         # listen() queue
+            tcp_nodelay = True,     # False: Nagle, small writes may be delayed
+            tcp_defer_accept = 0,   # seconds: accept once the request arrived, 0: off
+            tcp_fastopen = 0,       # pending TFO connections, 0: off
+            tcp_keepalive = None,   # True or (idle, interval, count): dead peer detection
+            rcvbuf = None,          # SO_RCVBUF bytes, None: kernel default
+            sndbuf = None,          # SO_SNDBUF bytes
+            unix_mode = None):      # e.g. 0o660: permissions of the unix socket file
+        if access_log and not log_buffer:
+            raise ValueError("access_log needs log_buffer")
         self.address = address
+        self.listener = Listener(address, backlog, tcp_nodelay, tcp_defer_accept,
+                tcp_fastopen, tcp_keepalive, rcvbuf, sndbuf, unix_mode)
         self.protocol_cls = protocol_cls
+        self.max_conns = max_conns
+        self.shutdown_timeout = shutdown_timeout
         self.router = HttpRouter.get_router() # read_only
+        self.metrics_path = metrics_path
+        self.pool_size = pool_size
+        self.gc_freeze = gc_freeze
+        self.gc_threshold = gc_threshold
+        self.log_buffer = log_buffer
+        self.access_log = access_log
+        self.trace_slow = trace_slow
+        self.profile_path = profile_path
+        self.profile_dir = profile_dir
+        self.profiler = None
+        if profile_path or profile_dir:
+            self.profiler = Profiler(profile_seconds, profile_dir)
+        self.log_queue = None # batches of all workers, drained by `Master`
+        self.metrics = None # shared by all workers when created by `Master`
+        self.env = {}
+        if metrics_path:
+            self.router.get(metrics_path)(self.metrics_handler)
+        if profile_path:
+            self.router.get(profile_path)(self.profiler.handler)
 
-    def run(self):
-        conns = set()
-        loop = asyncio.get_event_loop()
+    async def metrics_handler(self, request, response):
+        response.content_type = "text/plain; version=0.0.4; charset=utf-8"
+        response.text(self.metrics.render())
+
+    def run(self, served=None, sock=None, region=0):
+        ''' `served`: shared counter of a prefork worker, see `Master`
+            `sock`: listening socket inherited from master, else bind with reuse_port
+            `region`: metrics region of the worker '''
+        self.router.freeze()
+        if self.metrics_path:
+            if self.metrics is None: # single process
+                self.metrics = Metrics(self.router.route_labels)
+            self.metrics.attach(region)
+            for executor in self.router.executors.values():
+                executor.metrics = self.metrics
+        conns = ConnectionManager(self.max_conns)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        timers = TimerWheel(loop) # connection timeouts of this worker
+        timers.start()
+        log_buffer = log_drain = None
+        if self.log_buffer:
+            queue = self.log_queue
+            if queue is None: # single process: formatted by a thread
+                queue = Queue(QUEUE_SIZE)
+                log_drain = LogDrain(queue)
+                log_drain.start()
+            log_buffer = LogBuffer(queue, self.log_buffer)
+            log_buffer.install(loop, timers)
+        pool = ObjectPool(self.pool_size) if self.pool_size else None
         prot_dict = {
                 "conns": conns,
                 "router": self.router,
+                "timers": timers,
+                "metrics": self.metrics,
+                "env": self.env,
+                "pool": pool,
+                "access_log": log_buffer if self.access_log else None,
+                "tracer": Tracer(self.trace_slow) if self.trace_slow is not None else None,
+                "tcp_nodelay": self.listener.tcp_nodelay,
                 "loop": loop}
         prot_factory = partial(self.protocol_cls, **prot_dict)
-        server_task = loop.create_server(prot_factory, *self.address, reuse_port=True)
+        if pool is not None:
+            prot_factory = pool.protocol_factory(prot_factory)
+        own_sock = sock is None
+        if own_sock:
+            sock = self.listener.bind(reuse_port=True)
+        # the loop listen()s again: pass the backlog on
+        if self.listener.unix:
+            server_task = loop.create_unix_server(prot_factory, sock=sock,
+                    backlog=self.listener.backlog)
+        else:
+            server_task = loop.create_server(prot_factory, sock=sock,
+                    backlog=self.listener.backlog)
         server = loop.run_until_complete(server_task)
 
         # loop signal handler
-        def shutdown_handler():
-            # close conns
-            for conn in conns:
-                conn.disconnect()
-            # event stop
+        async def drain():
+            await conns.shutdown(self.shutdown_timeout)
+            timers.stop()
             loop.stop()
+
+        def shutdown_handler():
+            if conns.closed: # second signal: stop now
+                loop.stop()
+                return
+            # stop accepting, let conns finish in-flight requests
+            server.close()
+            loop.create_task(drain())
+
+        if served is not None: # tell master we listen, then report every second
+            ppid = getppid()
+            def report():
+                if getppid() != ppid: # master is gone
+                    shutdown_handler()
+                    return
+                served.value = conns.requests
+                timers.call_later(1, report)
+            report()
+
         loop.add_signal_handler(signal.SIGINT, shutdown_handler)
         loop.add_signal_handler(signal.SIGTERM, shutdown_handler)
-            
+        if self.profile_dir:
+            loop.add_signal_handler(signal.SIGUSR2, self.profiler.signal_handler)
+        self.tune_gc()
+
         try:
             loop.run_forever()
         finally:
+            self.router.shutdown_executors()
             loop.close()
+            if own_sock:
+                self.listener.close(sock)
+            if self.metrics is not None:
+                self.metrics.close()
+            if log_buffer is not None:
+                log_buffer.uninstall()
+            if log_drain is not None:
+                log_drain.stop()
+
+    def tune_gc(self):
+        ''' startup done: router, caches.. live as long as the worker,
+            frozen they are never scanned again (nor copied, after fork) '''
+        if self.gc_threshold:
+            gc.set_threshold(*self.gc_threshold)
+        if self.gc_freeze:
+            gc.freeze()
 
-    def run_multi_process(self, n=0):
-        ''' default use num of cpus as worker-process '''
+    def run_multi_process(self, n=0, **options):
+        ''' default use num of cpus as worker-process,
+            `options` of the prefork `Master` (max_requests, max_rss..) '''
 
         if n == 1:
             self.run()
             unlight_logger = lightlog.get_logger(fname="info_unlight2")
             unlight_logger.info(f"server starts {self.address} single-process ..")
         else:
-            if not n:
-                n = mp.cpu_count()
-
-            workers = []
-            # starts worker for log
-            log_worker, unlight_logger = lightlog.get_ready_log_worker(fname="info_unlight2")
-            workers.append(log_worker)
-            log_worker.start()
-
-            # register signals
-            def singal_handler(sig, frame):
-                for worker in workers:
-                    kill(worker.pid, signal.SIGTERM)
-            signal.signal(signal.SIGINT, singal_handler)
-            signal.signal(signal.SIGTERM, singal_handler)
-            
-            # starts request workers
-            for _ in range(n):
-                worker = mp.Process(target=self.run)
-                workers.append(worker)
-                worker.start()
-                
-            unlight_logger.info(f"server starts {self.address} multi-process ..")
-            # wait
-            for worker in workers:
-                worker.join()
+            master = Master(self, n, **options)
+            master.run()
+            unlight_logger = master.logger
         unlight_logger.info(f"server shut down. good bye~")
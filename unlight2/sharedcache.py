@@ -0,0 +1,202 @@
+#
+# key/value store shared by the worker processes of one node
+#
+import mmap
+import pickle
+import struct
+import multiprocessing as mp
+from hashlib import blake2b
+from time import time
+
+# slot: state, value type, key length, value length, key hash, expires (0: never)
+_slot_head = struct.Struct("<BBHIQd")
+_int64 = struct.Struct("<q")
+
+EMPTY, USED, DELETED = 0, 1, 2
+BYTES, STR, INT, PICKLE = 0, 1, 2, 3
+
+MAX_PROBE = 32 # slots looked at per key
+
+
+class SharedCache:
+    ''' fixed-size hash table in an anonymous shared mmap, create it before
+        the workers are forked (module level, or `Server.env`):
+            server.env["kv"] = SharedCache(capacity=65536)
+            ...
+            kv = request.env["kv"]
+            kv.set("user:1", {"name": "u2"}, ttl=60)
+            kv.get("user:1")
+            kv.incr(f"rate:{ip}", ttl=1) # counter, ttl starts with the first hit
+
+        the table is split into `segments`, each with its own process lock,
+        a key only probes the slots of its segment (open addressing).
+        when a key finds no free slot, the one expiring first is evicted
+    '''
+
+    __slots__ = ("capacity", "segments", "segment_slots", "max_key", "max_value",
+            "slot_size", "mm", "locks")
+
+    def __init__(self, capacity=16384, max_key=64, max_value=256, segments=64):
+        segments = min(segments, capacity)
+        self.segments = segments
+        self.segment_slots = -(-capacity // segments)
+        self.capacity = self.segment_slots * segments
+        self.max_key = max_key
+        self.max_value = max_value
+        self.slot_size = (_slot_head.size + max_key + max_value + 7) & ~7
+        self.mm = mmap.mmap(-1, self.capacity * self.slot_size) # MAP_SHARED
+        self.locks = [mp.Lock() for _ in range(segments)]
+
+    # public api
+
+    def get(self, key, default=None):
+        bkey, h = self._key(key)
+        with self.locks[h % self.segments]:
+            offset = self._find(bkey, h, time())
+            if offset is None:
+                return default
+            return self._read(offset)
+
+    def set(self, key, value, ttl=None):
+        bkey, h = self._key(key)
+        vtype, bvalue = self._encode(value)
+        with self.locks[h % self.segments]:
+            now = time()
+            offset = self._find(bkey, h, now)
+            if offset is None:
+                offset = self._free(h, now)
+            self._write(offset, bkey, h, vtype, bvalue, now + ttl if ttl else 0.0)
+
+    def delete(self, key):
+        ''' True if the key was there '''
+        bkey, h = self._key(key)
+        with self.locks[h % self.segments]:
+            offset = self._find(bkey, h, time())
+            if offset is None:
+                return False
+            self.mm[offset] = DELETED
+            return True
+
+    def incr(self, key, delta=1, ttl=None):
+        ''' atomic add, a missing key starts at 0 (with `ttl`), returns the new value '''
+        bkey, h = self._key(key)
+        with self.locks[h % self.segments]:
+            now = time()
+            offset = self._find(bkey, h, now)
+            if offset is not None:
+                state, vtype, klen, vlen, _, expires = _slot_head.unpack_from(self.mm, offset)
+                if vtype != INT:
+                    raise TypeError(f"not a counter: {key!r}")
+                start = offset + _slot_head.size + self.max_key
+                value = _int64.unpack_from(self.mm, start)[0] + delta
+                _int64.pack_into(self.mm, start, value)
+                return value
+            self._write(self._free(h, now), bkey, h, INT, _int64.pack(delta),
+                    now + ttl if ttl else 0.0)
+            return delta
+
+    def decr(self, key, delta=1, ttl=None):
+        return self.incr(key, -delta, ttl)
+
+    def clear(self):
+        for lock in self.locks:
+            lock.acquire()
+        try:
+            for offset in range(0, len(self.mm), self.slot_size):
+                self.mm[offset] = EMPTY
+        finally:
+            for lock in self.locks:
+                lock.release()
+
+    def stats(self):
+        ''' slot usage, scanned without locks (approximate) '''
+        now = time()
+        used = expired = 0
+        for offset in range(0, len(self.mm), self.slot_size):
+            if self.mm[offset] == USED:
+                expires = _slot_head.unpack_from(self.mm, offset)[5]
+                if expires and expires <= now:
+                    expired += 1
+                else:
+                    used += 1
+        return {"capacity": self.capacity, "used": used, "expired": expired}
+
+    # slots, segment lock held
+
+    def _key(self, key):
+        bkey = key.encode() if isinstance(key, str) else key
+        if len(bkey) > self.max_key:
+            raise ValueError(f"key longer than {self.max_key} bytes")
+        return bkey, int.from_bytes(blake2b(bkey, digest_size=8).digest(), "little") or 1
+
+    def _encode(self, value):
+        if isinstance(value, bytes):
+            vtype, bvalue = BYTES, value
+        elif isinstance(value, str):
+            vtype, bvalue = STR, value.encode()
+        elif type(value) is int and -2**63 <= value < 2**63:
+            vtype, bvalue = INT, _int64.pack(value)
+        else:
+            vtype, bvalue = PICKLE, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(bvalue) > self.max_value:
+            raise ValueError(f"value longer than {self.max_value} bytes")
+        return vtype, bvalue
+
+    def _probe(self, h):
+        ''' slot offsets of key hash `h`, within its segment '''
+        slots = self.segment_slots
+        first = (h % self.segments) * slots
+        index = (h // self.segments) % slots
+        size = self.slot_size
+        for i in range(min(MAX_PROBE, slots)):
+            yield (first + (index + i) % slots) * size
+
+    def _find(self, bkey, h, now):
+        mm = self.mm
+        klen = len(bkey)
+        for offset in self._probe(h):
+            state, _, slot_klen, _, slot_h, expires = _slot_head.unpack_from(mm, offset)
+            if state == EMPTY:
+                return None
+            if state == USED and slot_h == h and slot_klen == klen:
+                start = offset + _slot_head.size
+                if mm[start:start + klen] == bkey:
+                    if expires and expires <= now:
+                        mm[offset] = DELETED
+                        return None
+                    return offset
+        return None
+
+    def _free(self, h, now):
+        ''' first free (empty, deleted, expired) slot or the one expiring first '''
+        mm = self.mm
+        victim = victim_expires = None
+        for offset in self._probe(h):
+            state, _, _, _, _, expires = _slot_head.unpack_from(mm, offset)
+            if state != USED or (expires and expires <= now):
+                return offset
+            expires = expires or float("inf")
+            if victim is None or expires < victim_expires:
+                victim, victim_expires = offset, expires
+        return victim
+
+    def _write(self, offset, bkey, h, vtype, bvalue, expires):
+        mm = self.mm
+        start = offset + _slot_head.size
+        mm[start:start + len(bkey)] = bkey
+        start += self.max_key
+        mm[start:start + len(bvalue)] = bvalue
+        _slot_head.pack_into(mm, offset, USED, vtype, len(bkey), len(bvalue), h, expires)
+
+    def _read(self, offset):
+        mm = self.mm
+        _, vtype, _, vlen, _, _ = _slot_head.unpack_from(mm, offset)
+        start = offset + _slot_head.size + self.max_key
+        bvalue = mm[start:start + vlen]
+        if vtype == BYTES:
+            return bvalue
+        if vtype == STR:
+            return bvalue.decode()
+        if vtype == INT:
+            return _int64.unpack(bvalue)[0]
+        return pickle.loads(bvalue)
@@ -1,31 +1,58 @@
 import re
+import mmap
+import socket
 from asyncio import Protocol
-from time import time
-from httptools import HttpRequestParser, HttpParserError, parse_url
+from functools import partial
+from collections import deque
+import os
+from os import fstat
+from time import time, gmtime, strftime, perf_counter
+from httptools import HttpRequestParser, HttpParserError, HttpParserInvalidURLError, parse_url
 import traceback
+from urllib.parse import parse_qsl, unquote_plus
 import orjson as json
 from datetime import datetime
 
-from .exception import UnlightException
-from .lightlog import lightlog
-unlight_logger = lightlog.get_logger("unlight2")
+from .exception import UnlightException, STATUS_CODE_MSG
+from .multipart import MultipartParser
+from . import compress
+from .trace import HEADERS, BODY, HANDLER_START, HANDLER_END, WRITE
+from . import logbuffer
+unlight_logger = logbuffer.get_logger("unlight2")
+
+
+PAUSE_BODY = 1     # unconsumed `BodyStream` chunks
+PAUSE_PIPELINE = 2 # too many pipelined requests in flight
+BODYLESS_METHODS = frozenset(("GET", "HEAD"))
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
 
 
 class SimpleHttp(Protocol):
     ''' 
     simple-http protocol is a light http protocol,
     you can set proxy or gateway for it 
+
+    pipelined requests each get their own Request/Response, handlers run
+    concurrently (up to `pipeline_concurrency`) and responses are written
+    back strictly in request order
     '''
 
     __slots__ = (
         "loop",
+        "timers",
         "conns",
         "router",
         "transport",
-        "request",
+        "request",  # request being parsed
         "response",
         "parser",
+        "parser_spent", # takes no more messages (error, last one was not keep-alive)
+        "recyclable",   # connection lost cleanly, pooled once handlers returned
         "request_limit_size",
+        "request_max_size", # limit of current request (route `max_body_size`)
         "request_cur_size",
         "request_timeout",
         "response_timeout",
@@ -34,32 +61,82 @@ class SimpleHttp(Protocol):
         "remote_addr",
         "request_timeout_task",
         "response_timeout_task",
-        "conn_timeout_task"
+        "conn_timeout_task",
+        "pipeline",  # responses in request order, head is being written
+        "waiting",   # parsed requests waiting for a handler slot
+        "running",   # handlers running
+        "max_pipeline",
+        "pipeline_concurrency",
+        "read_pauses",
+        "closing",
+        "draining",  # server shutdown: close once in-flight requests are answered
+        "write_high_water",
+        "write_low_water",
+        "write_paused",
+        "drain_waiter",
+        "metrics",
+        "env",  # server.env, shared by the worker's requests
+        "pool",
+        "access_log",
+        "tracer", # `Tracer` of the worker, None: requests are not traced
+        "tcp_nodelay"
     )
 
+    sendfile_chunk_size = 256*1024 # mmap fallback write size
+
     def __init__(self, *,
             loop,
-            conns,  # server.conns
+            conns,  # server.conns, `ConnectionManager`
+            timers = None, # `TimerWheel` shared by the worker, default: loop.call_later
             router, # path handler mgr
             request_limit_size = 1024*1024*1, # 1M
             request_timeout = 60,
             response_timeout = 60,
-            keep_alive = 10):
+            keep_alive = 10,
+            max_pipeline = 16,        # stop reading when more requests are in flight
+            pipeline_concurrency = 4, # 1: handlers of one connection run serially
+            write_high_water = 256*1024, # `drain()` waits above it..
+            write_low_water = 64*1024,   # ..until transport buffer gets below it
+            metrics = None, # `Metrics` of the worker
+            env = None,     # server.env
+            pool = None,    # `ObjectPool` of the worker, recycles connection objects
+            access_log = None,  # `LogBuffer` of the worker: one record per response
+            tracer = None,      # `Tracer` of the worker: phase times, slow-request records
+            tcp_nodelay = True): # False: let the kernel coalesce small writes (Nagle)
 
         self.loop = loop
+        self.timers = loop if timers is None else timers
         self.conns = conns
         self.router = router
-        self.transport = None
-        self.request = Request(self)
-        self.response = Response(self)
-        self.response.set_keep_alive()
-        self.parser = HttpRequestParser(self)
-
+        self.parser = None
         self.request_limit_size = request_limit_size
-        self.request_cur_size = 0
         self.request_timeout = request_timeout
         self.response_timeout = response_timeout
         self.keep_alive = keep_alive
+        self.pipeline = deque()
+        self.waiting = deque()
+        self.max_pipeline = max_pipeline
+        self.pipeline_concurrency = pipeline_concurrency
+        self.write_high_water = write_high_water
+        self.write_low_water = write_low_water
+        self.metrics = metrics
+        self.env = {} if env is None else env
+        self.pool = pool
+        self.access_log = access_log
+        self.tracer = tracer
+        self.tcp_nodelay = tcp_nodelay
+        self.reset()
+
+    def reset(self):
+        ''' connection state, also when reused from `ObjectPool` '''
+        if self.parser is None or self.parser_spent: # httptools has no parser reset
+            self.parser = HttpRequestParser(self)
+            self.parser_spent = False
+        self.transport = None
+        self.request = None
+        self.response = None
+        self.request_max_size = self.request_limit_size
+        self.request_cur_size = 0
         self.last_request_time = 0
 
         self.remote_addr = None
@@ -67,85 +144,368 @@ class SimpleHttp(Protocol):
         self.response_timeout_task = None
         self.conn_timeout_task = None
 
-        self.route_mgr = None
+        self.pipeline.clear()
+        self.waiting.clear()
+        self.running = 0
+        self.read_pauses = 0
+        self.closing = False
+        self.draining = False
+        self.write_paused = False
+        self.drain_waiter = None
+        self.recyclable = False
 
     def connection_made(self, transport):
         self.transport = transport
+        transport.set_write_buffer_limits(high=self.write_high_water, low=self.write_low_water)
         self.remote_addr = transport.get_extra_info("peername")
-        self.conns.add(self)
+        if not self.tcp_nodelay: # the loop turns it on for every tcp connection
+            sock = transport.get_extra_info("socket")
+            if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 0)
+        if not self.conns.add(self): # worker is full, shed without parsing
+            transport.write(shed_response())
+            self.close()
+            return
 
         self.last_request_time = time()
-        self.request_timeout_task = self.loop.call_later(self.request_timeout, self.request_timeout_handler)
+        self.request_timeout_task = self.timers.call_later(self.request_timeout, self.request_timeout_handler)
 
     def data_received(self, data):
+        if self.closing:
+            return
         self.request_cur_size += len(data)
-        if self.request_cur_size > self.request_limit_size:
-            self.response.error(UnlightException(413))
+        if self.request_max_size and self.request_cur_size > self.request_max_size:
+            self.error(UnlightException(413))
+            return
 
         try:
             self.parser.feed_data(data)
         except HttpParserError:
-            self.response.error(UnlightException(401))
+            self.parser_spent = True
+            self.error(UnlightException(401))
             traceback.print_exc()
 
     def connection_lost(self, err):
+        # no unanswered request left: can serve another connection
+        # once its handlers returned
+        self.recyclable = self.pool is not None and self.request is None and not self.pipeline
         self.conns.discard(self)
         self._cancel_request_timeout_task()
         self._cancel_response_timeout_task()
         self._cancel_conn_timeout_task()
+        self.transport = None
+        self.closing = True
+        self.waiting.clear()
+        if self.metrics is not None and self.pipeline:
+            self.metrics.abort(len(self.pipeline))
+        for response in self.pipeline: # wake up pending writers
+            response.wakeup()
+        self.pipeline.clear()
+        self.resume_writing()
+        self._release()
 
-    @property
-    def is_keep_alive(self):
-        return self.keep_alive and self.parser.should_keep_alive
+    def pause_reading(self, reason):
+        if not self.read_pauses and self.transport:
+            self.transport.pause_reading()
+        self.read_pauses |= reason
+
+    def resume_reading(self, reason):
+        if self.read_pauses & reason:
+            self.read_pauses &= ~reason
+            if not self.read_pauses and self.transport:
+                self.transport.resume_reading()
+
+    def pause_writing(self):
+        ''' transport buffer is over `write_high_water` '''
+        self.write_paused = True
+
+    def resume_writing(self):
+        ''' transport buffer is below `write_low_water` (or connection lost) '''
+        self.write_paused = False
+        waiter = self.drain_waiter
+        if waiter:
+            self.drain_waiter = None
+            if not waiter.done():
+                waiter.set_result(None)
 
-    def write(self, enc_data):
-        ''' write and try keep alive '''
+    async def drain(self):
+        ''' wait until the client has taken enough of the written data,
+            raises ConnectionResetError if the connection is gone '''
+        if self.write_paused and self.transport:
+            waiter = self.drain_waiter
+            if not waiter:
+                waiter = self.drain_waiter = self.loop.create_future()
+            await waiter
+        if not self.transport:
+            raise ConnectionResetError("Connection lost")
+
+    def error(self, unlight_exc):
+        ''' protocol level error: answer (in order) and close '''
+        response = self.response
+        if response is None or response.done:
+            response = Response(self, None)
+        if response not in self.pipeline:
+            self.pipeline.append(response)
+            if self.metrics is not None:
+                self.metrics.begin()
+        response.error(unlight_exc, close=True)
+
+    async def wait_turn(self, response):
+        ''' wait until all earlier responses are written '''
+        while self.pipeline and self.pipeline[0] is not response:
+            response.turn = self.loop.create_future()
+            await response.turn
+        return self.transport is not None
+
+    def write(self, enc_data, response):
+        ''' write whole response in request order, then keep alive or close '''
+        response.done = True
+        response.sent += len(enc_data)
+        if self.tracer is not None:
+            self._trace_write(response)
+        pipeline = self.pipeline
+        if pipeline and pipeline[0] is response:
+            self._transport_write(enc_data)
+            self._next()
+        elif self.transport:
+            response.pending.append(enc_data)
+
+    def fatal(self, enc_err, response):
+        ''' write (in order) and close '''
+        self.closing = True
+        self.waiting.clear()
+        self.pause_reading(PAUSE_PIPELINE)
+        response.close_after = True
+        self.write(enc_err, response)
+
+    def end(self, response):
+        ''' response written by itself (sendfile, stream..) '''
+        response.done = True
+        if self.tracer is not None:
+            self._trace_write(response)
+        pipeline = self.pipeline
+        if pipeline and pipeline[0] is response:
+            self._next()
+
+    def _trace_write(self, response):
+        request = response.request
+        if request is not None and request.trace is not None and not request.trace[WRITE]:
+            request.trace[WRITE] = perf_counter()
+
+    def _trace_finish(self, response, handler_done):
+        ''' once written and popped and its handler returned (or never ran) '''
+        request = response.request
+        if request is None or request.trace is None:
+            return
+        if handler_done:
+            if not response.done or response in self.pipeline:
+                return
+        elif not response.handled and request.trace[HANDLER_START]:
+            return
+        self.tracer.finish(response, self.remote_addr)
+
+    def _transport_write(self, enc_data):
         try:
             self.transport.write(enc_data)
-        except RuntimeError:
+        except (RuntimeError, AttributeError):
             unlight_logger.error("Connection lost before response written @ %s",
                     self.remote_addr if self.remote_addr else "Unknown")
-        finally:
-            if self.is_keep_alive:
-                self._cancel_conn_timeout_task()
-                self.conn_timeout_task = self.loop.call_later(self.keep_alive, self.keep_alive_timeout_handler)
-                self.reset()
-            else:
-                self.transport.close()
-                self.transport = None
 
-    def fatal(self, enc_err):
-        ''' wirte and close '''
+    def _next(self):
+        ''' pop written responses, flush the ones buffered behind them '''
+        pipeline = self.pipeline
+        while pipeline and pipeline[0].done:
+            response = pipeline.popleft()
+            if response.pending:
+                self._transport_write(b"".join(response.pending))
+                response.pending.clear()
+            if self.metrics is not None:
+                self.metrics.record(response)
+            if self.access_log is not None:
+                self.access_log.access(response, self.remote_addr)
+            if self.tracer is not None:
+                self._trace_finish(response, False)
+            last = response.close_after or not response.keep_alive
+            if response.handled: # resets the response
+                self._recycle(response)
+            if last:
+                self.close()
+                return
+
+        self._cancel_response_timeout_task()
+        if pipeline:
+            pipeline[0].wakeup()
+            self.response_timeout_task = self.timers.call_later(self.response_timeout, self.response_timeout_handler)
+        elif self.transport and self.response is None: # idle
+            self._cancel_conn_timeout_task()
+            self.conn_timeout_task = self.timers.call_later(self.keep_alive, self.keep_alive_timeout_handler)
+        if len(pipeline) <= self.max_pipeline // 2:
+            self.resume_reading(PAUSE_PIPELINE)
+
+    def close(self):
+        transport = self.transport
+        if transport:
+            self.transport = None
+            self.closing = True
+            transport.close()
+
+    def is_idle(self):
+        return self.transport is not None and self.response is None and not self.pipeline
+
+    def shutdown(self):
+        ''' graceful close: answer requests in flight, then close '''
+        self.draining = True
+        if self.response is not None: # being parsed: closes after its response
+            return
+        if self.pipeline:
+            self.pipeline[-1].keep_alive = False
+        else:
+            self.close()
+
+    def _dispatch(self):
+        ''' run waiting handlers in order, at most `pipeline_concurrency` at once '''
+        waiting = self.waiting
+        while waiting and self.running < self.pipeline_concurrency:
+            request, response = waiting.popleft()
+            self.running += 1
+            task = self.loop.create_task(
+                        self.router.handle_request(request, response))
+            task.add_done_callback(partial(self._handler_done, request, response))
+
+    def _handler_done(self, request, response, task):
+        self.running -= 1
+        if request.multipart is not None: # remove spooled files
+            request.multipart.cleanup()
+        response.handled = True
+        if request.trace is not None:
+            request.trace[HANDLER_END] = perf_counter()
+            self._trace_finish(response, True)
+        if response.done and response not in self.pipeline: # written and popped
+            self._recycle(response)
+        self._dispatch()
+        self._release()
+
+    def _release(self):
+        ''' connection lost, nothing in flight: protocol back to the pool '''
+        if self.recyclable and not self.running:
+            self.recyclable = False
+            self.pool.release_protocol(self)
+
+    def _recycle(self, response):
+        ''' handler returned and response written: back to the pool '''
+        request = response.request
+        if self.pool is not None and request is not None and request is not self.request:
+            self.pool.release(request, response)
+
+    async def sendfile(self, enc_headers, f, size, response):
+        ''' write headers and a file opened in binary mode:
+            1. `os.sendfile` on the connection's socket (no user-space copy),
+               uvloop has no `loop.sendfile`
+            2. mmap chunks with write flow control (ssl, no socket fd..)
+        '''
         try:
-            self.transport.write(enc_err)
-        except RuntimeError:
-            unlight_logger.error("Connection lost before error written @ %s",
+            if await self.wait_turn(response):
+                response.started = True
+                if self.tracer is not None:
+                    self._trace_write(response)
+                self.transport.write(enc_headers)
+                response.sent += len(enc_headers) + size
+                if size:
+                    fd = self._sendfile_fd()
+                    if fd is not None:
+                        await self._write_sendfile(fd, f, size)
+                    else:
+                        await self._write_mmap(f, size)
+        except (RuntimeError, ConnectionError, AttributeError):
+            unlight_logger.error("Connection lost before file written @ %s",
                     self.remote_addr if self.remote_addr else "Unknown")
         finally:
+            f.close()
+            self.end(response)
+
+    def _sendfile_fd(self):
+        ''' fd of the plain socket under the transport, None if there is none '''
+        transport = self.transport
+        if not hasattr(os, "sendfile") or transport.get_extra_info("sslcontext") is not None:
+            return None
+        sock = transport.get_extra_info("socket")
+        try:
+            return sock.fileno() if sock is not None else None
+        except (OSError, ValueError):
+            return None
+
+    async def _flush(self):
+        ''' wait until the transport has written out everything it buffered '''
+        transport = self.transport
+        if transport.get_write_buffer_size():
+            transport.set_write_buffer_limits(high=0, low=0)
             try:
-                self.transport.close()
-                self.transport = None
-            except AttributeError:
-                unlight_logger.error("Connection lost before server could close it.")
+                await self.drain()
+            finally:
+                if self.transport:
+                    transport.set_write_buffer_limits(high=self.write_high_water,
+                            low=self.write_low_water)
 
-    def reset(self):
-        self.request_cur_size = 0
-        self.request.reset()
-        self.response.reset()
-        self._cancel_response_timeout_task()
+    async def _write_sendfile(self, fd, f, size):
+        ''' kernel copies file -> socket. the loop does not let a transport's fd
+            be watched, a dup of it is: written to directly once the
+            transport's own buffer is empty '''
+        await self._flush()
+        loop = self.loop
+        out = os.dup(fd)
+        try:
+            offset = 0
+            while offset < size:
+                if not self.transport:
+                    raise ConnectionResetError("Connection lost")
+                try:
+                    sent = os.sendfile(out, f.fileno(), offset, size - offset)
+                except BlockingIOError: # socket buffer full
+                    # as `drain_waiter`: connection_lost wakes it too, the dup
+                    # keeps the socket open after the transport closed
+                    writable = self.drain_waiter = loop.create_future()
+                    loop.add_writer(out, _wake, writable)
+                    try:
+                        await writable
+                    finally:
+                        loop.remove_writer(out)
+                        if self.drain_waiter is writable:
+                            self.drain_waiter = None
+                    continue
+                if not sent: # file shrank: Content-Length can not be met
+                    unlight_logger.error("File truncated while sent @ %s",
+                            self.remote_addr if self.remote_addr else "Unknown")
+                    self.close()
+                    return
+                offset += sent
+        finally:
+            os.close(out)
+
+    async def _write_mmap(self, f, size):
+        chunk_size = self.sendfile_chunk_size
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+            for offset in range(0, size, chunk_size):
+                if not self.transport:
+                    break
+                self.transport.write(mm[offset:offset+chunk_size])
+                await self.drain()
 
     def request_timeout_handler(self):
         self._cancel_request_timeout_task()
-        self.response.error(UnlightException(408))
+        self.error(UnlightException(408))
 
     def response_timeout_handler(self):
         self._cancel_response_timeout_task();
-        self.response.error(UnlightException(502))
+        if self.pipeline:
+            head = self.pipeline[0]
+            if head.started: # partly written, can only cut it off
+                self.close()
+            else:
+                head.error(UnlightException(502), close=True)
 
     def keep_alive_timeout_handler(self):
         self._cancel_request_timeout_task()
-        self.transport.close()
-        self.transport = None
+        self.close()
 
     def _cancel_request_timeout_task(self):
         if self.request_timeout_task:
@@ -162,258 +522,593 @@ class SimpleHttp(Protocol):
             self.conn_timeout_task.cancel()
             self.conn_timeout_task = None
 
+    def on_message_begin(self):
+        self._cancel_conn_timeout_task()
+        if not self.request_timeout_task: # first one armed at connect: headers + body in time
+            self.request_timeout_task = self.timers.call_later(self.request_timeout, self.request_timeout_handler)
+        self.conns.touch(self)
+        self.request_cur_size = 0
+        self.request_max_size = self.request_limit_size
+        pool = self.pool
+        if pool is None:
+            self.request = Request(self)
+            self.response = Response(self, self.request)
+        else:
+            self.request = pool.request(self)
+            self.response = pool.response(self, self.request)
+        self.response.set_keep_alive(self.keep_alive)
+
     def on_url(self, burl):
-        self.request.add_burl(burl)
+        request = self.request
+        if not request.start:
+            request.start = perf_counter()
+            if self.tracer is not None:
+                request.trace = [0.0] * 5
+        request.received += len(burl)
+        request.add_burl(burl)
 
     def on_header(self, bname, bvalue):
-        self.request.add_bheader(bname, bvalue)
-        if bname.lower() == b"content-length" and int(bvalue) > self.request_limit_size:
-            self.response.error(UnlightException(413))
-        if bname.lower() == b"expect" and bvalue.lower() == b"100-continue":
-            self.response.error(UnlightException(100))
-
-    def on_header_complete(self):
-        self.response_timeout_task = self.loop.call_later(self.response_timeout, self.response_timeout_handler)
-        self._cancel_request_timeout_task()
+        request = self.request
+        request.received += len(bname) + len(bvalue) + 4
+        request.add_bheader(bname, bvalue)
+
+    def on_headers_complete(self):
+        request = self.request
+        if request.trace is not None:
+            request.trace[HEADERS] = perf_counter()
+        response = self.response
+        if self.parser.get_http_version() == "1.0":
+            response.http10 = True
+        pipeline = self.pipeline
+        pipeline.append(response)
+        if self.metrics is not None:
+            self.metrics.begin()
+        if len(pipeline) >= self.max_pipeline:
+            self.pause_reading(PAUSE_PIPELINE)
+
+        request.set_method(self.parser.get_method().decode())
+        route = self.router.match_request(request)
+        if route:
+            if route.max_body_size is not None: # 0: unlimited
+                self.request_max_size = route.max_body_size
+            elif route.stream:
+                self.request_max_size = 0
+        if route and route.stream: # handler consumes body chunks as they come,
+            request.stream = BodyStream(self) # bounded by the response timeout
+            self._cancel_request_timeout_task()
+            if not self.response_timeout_task:
+                self.response_timeout_task = self.timers.call_later(self.response_timeout, self.response_timeout_handler)
+        if request.method in BODYLESS_METHODS: # headers untouched, body size still checked by data_received
+            if request.stream is not None:
+                self.waiting.append((request, response))
+                self._dispatch()
+            return
+
+        if self.request_max_size and int(request.get_bheader(b"content-length") or 0) > self.request_max_size:
+            response.error(UnlightException(413), close=True)
+            return
+        bexpect = request.get_bheader(b"expect")
+        if bexpect and bexpect.lower() == b"100-continue" and pipeline[0] is response:
+            self.transport.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+        if request.stream is not None:
+            self.waiting.append((request, response))
+            self._dispatch()
+        else:
+            bboundary = request.get_boundary()
+            if bboundary: # form-data is parsed as it comes
+                request.multipart = MultipartParser(bboundary)
 
     def on_body(self, bbody):
-        if self.request.add_bbody(bbody) == 2:
-            self.response.error(UnlightException(400)) # parse err
+        request = self.request
+        request.received += len(bbody)
+        if self.closing:
+            return
+        if request.stream is not None:
+            request.stream.feed(bbody)
+        elif request.multipart is not None:
+            try:
+                request.multipart.feed(bbody)
+            except ValueError:
+                self.response.error(UnlightException(400), close=True)
+        else:
+            request.add_bbody(bbody)
 
     def on_message_complete(self):
-        self.request.set_method(self.parser.get_method().decode())
-        self.loop.create_task(
-                    self.router.handle_request(self.request, self.response))
+        # parser state is reset once the message is done
+        request, response = self.request, self.response
+        self.request = self.response = None
+        self._cancel_request_timeout_task()
+        if request.trace is not None:
+            request.trace[BODY] = perf_counter()
+        keep_alive = self.parser.should_keep_alive()
+        if not keep_alive: # llhttp refuses any further message
+            self.parser_spent = True
+        response.keep_alive = bool(self.keep_alive) and not self.draining and keep_alive
+        if not self.response_timeout_task:
+            self.response_timeout_task = self.timers.call_later(self.response_timeout, self.response_timeout_handler)
+        if request.stream is not None:
+            request.stream.feed_eof()
+            return
+        if self.closing: # already answered (413..)
+            return
+        if not request.parse_body():
+            response.error(UnlightException(400), close=True) # parse err
+            return
+        self.waiting.append((request, response))
+        self._dispatch()
+
+
+class BodyStream:
+    ''' request body as async iterator of chunks (routes registered with `stream=True`):
+            async for chunk in request.stream:
+                ...
+        reading from the socket pauses while `max_buffer` bytes are unconsumed
+    '''
+
+    __slots__ = ("protocol", "chunks", "size", "eof", "waiter", "paused", "max_buffer")
+
+    def __init__(self, protocol, max_buffer=256*1024):
+        self.protocol = protocol
+        self.chunks = deque()
+        self.size = 0
+        self.eof = False
+        self.waiter = None
+        self.paused = False
+        self.max_buffer = max_buffer
+
+    def feed(self, chunk):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.size > self.max_buffer and not self.paused:
+            self.paused = True
+            self.protocol.pause_reading(PAUSE_BODY)
+        self._wakeup()
+
+    def feed_eof(self):
+        self.eof = True
+        self._wakeup()
 
+    def _wakeup(self):
+        waiter = self.waiter
+        if waiter:
+            self.waiter = None
+            if not waiter.done():
+                waiter.set_result(None)
 
-bkey_pattern = re.compile(rb'name="(.*)"$')
-bfile_pattern = re.compile(rb'name="(.*)";')     # as file rename
-bfile_pattern2 = re.compile(rb'filename="(.*)"') # file real name
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunks = self.chunks
+        while not chunks:
+            if self.eof or not self.protocol.transport:
+                raise StopAsyncIteration
+            self.waiter = self.protocol.loop.create_future()
+            await self.waiter
+        chunk = chunks.popleft()
+        self.size -= len(chunk)
+        if self.paused and self.size <= self.max_buffer // 2:
+            self.paused = False
+            self.protocol.resume_reading(PAUSE_BODY)
+        return chunk
+
+    async def read(self):
+        ''' whole (rest of) body '''
+        buf = bytearray()
+        async for chunk in self:
+            buf += chunk
+        return bytes(buf)
+
+
+bboundary_pattern = re.compile(rb'boundary="?([^";,]+)"?', re.I)
 class Request:
+    ''' parsed lazily: the protocol only stores the raw url and header
+        bytes, url parts, headers, query, cookies and body are decoded on
+        first access and memoized '''
+
     __slots__ = (
         "__protocol",
         "__burl",
-        "__bheaders",
+        "__bpath",    # on demand, from __burl
+        "__bquery",
+        "__bheaders", # [(bname, bvalue)] as received
+        "__lheaders", # on demand: lower case name -> value
+        "__headers",
+        "__query",    # on demand: name -> [values]
+        "__cookies",
         "__bbody",
+        "__decoded",  # body decoded into raw/form/json/file
         "method",
-        "_bschema",
-        "_bhost",
-        "_port",
-        "_bpath",
-        "_bfragment",
-        "_buserinfo",
-        "_bquery_params",
-        "_bconnection",
-        "_bcontent_type",
-        "_bagent",
-        "_baccept",
-        "_baccept_encoding",
-        "_bcookies",
-        "_bcache_control",
-        "_bcontent_length",
-        "_bboundary",
-        "raw",
-        "form",
-        "json",
-        "file",
-        "env" # stash
+        "_raw",
+        "_form",
+        "_json",
+        "_file",
+        "match",  # (route, params, static_path) of router lookup
+        "params", # path params of `{name}` route segments
+        "stream", # BodyStream of `stream=True` routes
+        "multipart", # MultipartParser of form-data body
+        "start",    # perf_counter() at request line
+        "received", # url, header and body bytes of this request
+        "trace",    # phase times when the protocol has a `Tracer`, see trace.py
+        "data",     # json body converted by the route's `body` schema
+        "env" # stash: `Server.env` (shared cache, db pools..)
     )
 
     def __init__(self, protocol):
         ''' 1. utf-8 (default) '''
         self.__protocol = protocol
+        self.env = protocol.env
         self.reset()
+
+    def rebind(self, protocol):
+        ''' reused from `ObjectPool` (already reset) '''
+        self.__protocol = protocol
+        self.env = protocol.env
     
     def reset(self):
+        multipart = getattr(self, "multipart", None)
+        if multipart is not None: # remove spooled files
+            multipart.cleanup()
         # bytes
         self.__burl = None
-        self.__bheaders = {}
+        self.__bpath = None
+        self.__bquery = None
+        self.__bheaders = []
+        self.__lheaders = None
+        self.__headers = None
+        self.__query = None
+        self.__cookies = None
         self.__bbody = None
-        # detail byte fields
-        self._bschema = None # from url
-        self._bhost = None
-        self._port = None
-        self._bpath = None
-        self._bfragment = None
-        self._buserinfo = None
-        self._bquery_params = None
-        self._bconnection = None # from header
-        self._bcontent_type = None
-        self._bagent = None
-        self._baccept = None
-        self._baccept_encoding = None
-        self._bcookies = None
-        self._bcache_control = None
-        self._bcontent_length = None
-        self._bboundary = None
+        self.__decoded = False
         # basic data
         self.method = None
-        self.raw = None
-        self.form = None
-        self.json = None
-        self.file = None
+        self._raw = None
+        self._form = None
+        self._json = None
+        self._file = None
+        self.match = None
+        self.params = None
+        self.stream = None
+        self.multipart = None
+        self.start = 0
+        self.received = 0
+        self.trace = None
+        self.data = None
 
     def add_burl(self, burl):
-        self.__burl = burl
-        url = parse_url(burl)
-        self._bschema= url.schema
-        self._bhost = url.host
-        self._port = 443 if self._bschema == b"https" else 80
-        self._bpath = url.path
-        self._bfragment = url.fragment
-        self._buserinfo = url.userinfo
-        bquery_params = {}
-        if url.query:
-            qs = url.query.split(b"&")
-            for q in qs:
-                p, v = q.split(b"=")
-                bquery_params[p] = v
-        self._bquery_params = bquery_params
+        ''' the parser may hand the url over in pieces '''
+        if self.__burl is None:
+            self.__burl = burl
+        else:
+            self.__burl += burl
 
     def add_bheader(self, bname, bvalue):
-        ''' 1. agent阻止指定agent访问
-            2. cache-control缓存控制
-            3. host跨域
-        '''
-        bname = bname.strip()
-        self.__bheaders[bname] = bvalue
-        l_bname = bname.lower()
-
-        if l_bname == b"host":
-            self._bhost = bvalue
-        elif l_bname == b"connection":
-            pass
-        elif l_bname == b"content-type":
-            self._bcontent_type = bvalue
-            if bvalue.find(b"form-data") > -1:
-                _, bb = bvalue.split(b";")
-                bboundary = bb.split(b"=")[1].strip()
-                bboundary = b"--" + bboundary
-                self._bboundary = bboundary
-        elif l_bname == b"content-length":
-            self._bcontent_length = bvalue
-        elif l_bname == b"user-agent":
-            self._bagent = bvalue
-        elif l_bname == b"accept":
-            self._baccept = bvalue
-        elif l_bname == b"accept-encoding":
-            self._baccept_encoding = bvalue
-        elif l_bname == b"cookie":
-            self._bcookies = bvalue.split(b";")
-        elif l_bname == b"cache-control":
-            self._bcache_control = bvalue
+        self.__bheaders.append((bname, bvalue))
 
     def add_bbody(self, bbody):
+        ''' collect body chunks, decoded on first access of raw/form/json/file '''
+        buf = self.__bbody
+        if buf is None:
+            self.__bbody = bbody
+        elif type(buf) is bytearray:
+            buf += bbody
+        else:
+            buf = self.__bbody = bytearray(buf)
+            buf += bbody
+
+    def parse_body(self):
+        ''' end of body: finish form-data parsing,
+            return False if body is malformed '''
+        multipart = self.multipart
+        if multipart is not None:
+            try:
+                self._form = multipart.close()
+            except ValueError:
+                return False
+            self.__decoded = True
+        return True
+
+    def _decode_body(self):
         ''' 
             1. x-www-form-urlencoded -> self.form + self.raw
-            2. form-data             -> self.form
+            2. form-data             -> self.form (files: MultipartPart)
             3. raw(text)             -> self.raw
             4. raw(json)             -> self.raw + self.json
             5. binary(text)          -> self.file
             6. binary(octect-stream) -> self.file
             7. binary(o-MIME)        -> self.file
+            malformed body -> 400
         '''
-        self.__bbody = bbody
-        
-        bcontent_type = self._bcontent_type.lower()
+        self.__decoded = True
+        bbody = self.__bbody
+        if bbody is None:
+            return
+        if type(bbody) is bytearray:
+            bbody = self.__bbody = bytes(bbody)
+        try:
+            self._parse_body(bbody)
+        except (ValueError, IndexError):
+            raise UnlightException(400)
+
+    def _parse_body(self, bbody):
+        bcontent_type = (self.get_bheader(b"content-type") or b"").lower()
         if bcontent_type.find(b"x-www-form-urlencoded") > -1:
-            data = bbody.split(b"\r\n\r\n")[1].decode()
-            self.raw = data
-
-            items = data.split("&")
-            form = {}
-            for item in items:
-                name, value = item.split("=")
-                form[name] = value
-            self.form = form
-        elif bcontent_type.find(b"form-data") > -1:
-            bboundary = self._bboundary
-            bdata_list = bbody.split(bboundary)
-            form = {}
-            for bitem in bdata_list:
-                bitem = bitem.strip()
-                if bitem and bitem != b"--":
-                    if bitem.find(b"\r\n\r\n") > -1:
-                        bfdes, bf = bitem.split(b"\r\n\r\n")
-                        field_keys = bkey_pattern.findall(bfdes)
-                        if field_keys: # field
-                            form[field_keys[0].decode()] = bf.decode()
-                            continue
-                        file_keys = bfile_pattern.findall(bfdes)
-                        if file_keys: # file (binary value)
-                            file_key = file_keys[0]
-                            if file_key:
-                                form[file_key.decode()] = bf
-                                continue
-                            else:
-                                file_keys = bfile_pattern2.findall(bfdes)
-                                form[file_keys[0].decode()] = bf
-            self.form = form
+            data = bbody.decode()
+            self._raw = data
+            self._form = dict(parse_qsl(data, keep_blank_values=True))
         elif bcontent_type.find(b"text/plain") > -1:
-            self.raw = bbody.decode()
+            self._raw = bbody.decode()
         elif bcontent_type.find(b"json") > -1:
-            body = bbody.decode()
-            self.json = json.loads(body)
+            self._json = json.loads(bbody)
         elif bcontent_type.find(b"octet-stream") > -1:
-            self.file = bbody
+            self._file = bbody
         else: # other MIME(no name tag.)
-            self.file = bbody
-        
+            self._file = bbody
+
+    @property
+    def raw(self):
+        if not self.__decoded:
+            self._decode_body()
+        return self._raw
+
+    @property
+    def form(self):
+        if not self.__decoded:
+            self._decode_body()
+        return self._form
+
+    @property
+    def json(self):
+        if not self.__decoded:
+            self._decode_body()
+        return self._json
+
+    @property
+    def file(self):
+        if not self.__decoded:
+            self._decode_body()
+        return self._file
+
     def set_method(self, method):
         self.method = method
 
     def get_method(self):
         return self.method
 
+    def get_burl(self):
+        return self.__burl
+
     def get_url(self):
         burl = self.__burl
         if burl.endswith(b"/"):
             burl = burl[:-1]
         return burl.decode()
 
+    def _split_url(self):
+        burl = self.__burl or b""
+        if burl.startswith(b"/"): # origin form, no need for a full parse
+            bpath, _, bquery = burl.partition(b"#")[0].partition(b"?")
+        else:
+            try:
+                url = parse_url(burl)
+                bpath, bquery = url.path or b"/", url.query or b""
+            except HttpParserInvalidURLError: # `*` of OPTIONS..
+                bpath, bquery = burl, b""
+        self.__bpath = bpath
+        self.__bquery = bquery
+
+    @property
+    def _bpath(self):
+        if self.__bpath is None:
+            self._split_url()
+        return self.__bpath
+
+    def get_path(self):
+        ''' url path without query and fragment '''
+        return self._bpath.decode()
+
+    def get_queries(self):
+        ''' percent-decoded query params, name -> [values] '''
+        query = self.__query
+        if query is None:
+            query = self.__query = {}
+            if self.__bpath is None:
+                self._split_url()
+            if self.__bquery:
+                for pair in self.__bquery.decode(errors="replace").split("&"):
+                    if not pair:
+                        continue
+                    name, _, value = pair.partition("=")
+                    if "%" in pair or "+" in pair:
+                        name, value = unquote_plus(name), unquote_plus(value)
+                    values = query.get(name)
+                    if values is None:
+                        query[name] = [value]
+                    else:
+                        values.append(value)
+        return query
+
+    def get_query(self, name, default=None):
+        ''' first value of query param `name` '''
+        values = self.get_queries().get(name)
+        return values[0] if values else default
+
+    def get_query_list(self, name):
+        return self.get_queries().get(name, [])
+
+    def get_bheader(self, bname):
+        ''' raw value of header `bname` (lower case bytes) or None,
+            repeated headers are joined '''
+        lheaders = self.__lheaders
+        if lheaders is None:
+            lheaders = self.__lheaders = {}
+            for name, bvalue in self.__bheaders:
+                name = name.lower()
+                prev = lheaders.get(name)
+                if prev is None:
+                    lheaders[name] = bvalue
+                else:
+                    lheaders[name] = prev + (b"; " if name == b"cookie" else b", ") + bvalue
+        return lheaders.get(bname)
+
+    def get_header(self, name, default=None):
+        bvalue = self.get_bheader(name.lower().encode())
+        return default if bvalue is None else bvalue.decode(errors="replace")
+
     def get_headers(self):
-        headers = {}
-        bheaders = self.__bheaders
-        for bname, bvalue in bheaders.items():
-            name = bname.decode()
-            value = bvalue.decode()
-            headers[name] = value
+        headers = self.__headers
+        if headers is None:
+            headers = self.__headers = {}
+            for bname, bvalue in self.__bheaders:
+                headers[bname.decode()] = bvalue.decode(errors="replace")
         return headers
 
+    def get_cookies(self):
+        cookies = self.__cookies
+        if cookies is None:
+            cookies = self.__cookies = {}
+            bcookies = self.get_bheader(b"cookie")
+            if bcookies:
+                for pair in bcookies.decode(errors="replace").split(";"):
+                    name, eq, value = pair.partition("=")
+                    name = name.strip()
+                    if eq and name:
+                        cookies.setdefault(name, value.strip().strip('"'))
+        return cookies
+
+    def get_cookie(self, name, default=None):
+        return self.get_cookies().get(name, default)
+
+    def get_boundary(self):
+        ''' boundary of a form-data body or None '''
+        bcontent_type = self.get_bheader(b"content-type")
+        if bcontent_type and bcontent_type.find(b"form-data") > -1:
+            bboundary = bboundary_pattern.search(bcontent_type)
+            if bboundary:
+                return bboundary.group(1)
+        return None
+
     @property
     def body(self):
         bbody = self.__bbody
-        return bbody.decode()
+        return bbody.decode() if bbody is not None else ""
 
 gmt_format = "%a, %d %b %Y %H:%M:%S GMT"
+_date_cache = [0, b""] # [second, b"Date: ...\r\n"]
+
+def date_header():
+    ''' `Date` header line, formatted at most once per second '''
+    now = int(time())
+    if now != _date_cache[0]:
+        _date_cache[1] = f"Date: {strftime(gmt_format, gmtime(now))}\r\n".encode()
+        _date_cache[0] = now
+    return _date_cache[1]
+
+_status_lines = {("1.1", code, msg): f"HTTP/1.1 {code} {msg}\r\n".encode()
+        for code, msg in STATUS_CODE_MSG.items()}
+
+def status_line(version, code, msg):
+    key = (version, code, msg)
+    line = _status_lines.get(key)
+    if line is None:
+        line = _status_lines[key] = f"HTTP/{version} {code} {msg}\r\n".encode()
+    return line
+
+conn_close_header = b"Connection: close\r\n"
+
+_keep_alive_headers = {} # timeout -> pre-encoded Connection/Keep-Alive
+_head_blocks = {} # (version, code, msg, conn_header, content_type) -> pre-encoded block
+
+def head_block(version, code, msg, conn_header, content_type):
+    ''' status line + Connection + Content-Type, encoded once per combination '''
+    key = (version, code, msg, conn_header, content_type)
+    block = _head_blocks.get(key)
+    if block is None:
+        if len(_head_blocks) > 1024: # custom status messages
+            _head_blocks.clear()
+        block = status_line(version, code, msg) + conn_header
+        if content_type:
+            block += f"Content-Type: {content_type}\r\n".encode()
+        _head_blocks[key] = block
+    return block
+
+def shed_response():
+    ''' connection refused by a full worker '''
+    return (b"HTTP/1.1 503 Service Unavailable\r\n" + date_header() +
+            b"Connection: close\r\nRetry-After: 1\r\nContent-Length: 0\r\n\r\n")
+
 class Response:
     __slots__ = (
         "__protocol",
+        "request",
         "version",
         "code",
         "msg",
-        "headers",
+        "content_type",
+        "conn_header", # pre-encoded Connection/Keep-Alive
+        "headers",     # extra headers
+        "keep_alive",  # client allows it (set once request is complete)
+        "started",     # headers written, body in progress
+        "done",        # completely written (or buffered behind earlier responses)
+        "close_after",
+        "pending",     # bytes buffered until earlier responses are written
+        "turn",        # future: waiting to become head of pipeline
+        "sent",        # bytes written
+        "capture",     # callable(response, body) before body is written (response cache)
+        "handled",     # handler returned
+        "http10"       # HTTP/1.0 client: streamed bodies are not chunked, closed after
     )
 
-    def __init__(self, protocol, version= "1.1"):
+    def __init__(self, protocol, request, version= "1.1"):
+        self.headers = {}
+        self.pending = []
+        self.rebind(protocol, request, version)
+        self.reset()
+
+    def rebind(self, protocol, request, version="1.1"):
+        ''' reused from `ObjectPool` (already reset) '''
         self.__protocol = protocol
+        self.request = request
         self.version = version
-        self.reset()
+        self.conn_header = conn_close_header # default close
 
     def reset(self):
         self.code = 200
         self.msg = "OK"
-        self.headers = {
-                "Content-Type": "text/plain;charset=utf-8",
-                "Connection": "close"} # default close
+        self.content_type = "text/plain; charset=utf-8"
+        if self.headers:
+            self.headers.clear()
+        self.keep_alive = False
+        self.started = False
+        self.done = False
+        self.close_after = False
+        self.turn = None
+        self.sent = 0
+        self.capture = None
+        self.handled = False
+        self.http10 = False
 
     def set_keep_alive(self, keep_alive_tm=60):
         if keep_alive_tm:
-            self.headers["Connection"] = "keep-alive"
-            self.headers["Keep-Alive"] = keep_alive_tm
+            conn_header = _keep_alive_headers.get(keep_alive_tm)
+            if conn_header is None:
+                conn_header = _keep_alive_headers[keep_alive_tm] = (b"Connection: keep-alive\r\n"
+                        b"Keep-Alive: timeout=%d\r\n" % keep_alive_tm)
+            self.conn_header = conn_header
         else:
-            self.headers["Connection"] = "close"
-            self.headers["Keep-Alive"] = None
+            self.conn_header = conn_close_header
+
+    def drain(self):
+        ''' awaitable: wait for the connection's write buffer to drain '''
+        return self.__protocol.drain()
+
+    def wakeup(self):
+        turn = self.turn
+        if turn:
+            self.turn = None
+            if not turn.done():
+                turn.set_result(None)
 
     def update_version(self, version):
         if version > self.version:
@@ -422,48 +1117,191 @@ class Response:
     def update_headers(self, headers={}):
         self.headers.update(headers)
 
-    def encode_headers(self):
-        headers = ""
+    def _head(self, content_length=None, close=False):
+        ''' header lines (status line first) as list of pre-encoded bytes '''
         hs = self.headers
-        for h, v in hs.items():
-            if v:
-                headers += f"{h}: {v}\r\n"
-        title = f"HTTP/{self.version} {self.code} {self.msg}\r\n"
-        return title.encode() + headers.encode()
+        parts = [head_block(self.version, self.code, self.msg,
+                    conn_close_header if close or not self.keep_alive else self.conn_header,
+                    None if hs and "Content-Type" in hs else self.content_type),
+                date_header()]
+        if content_length is not None:
+            parts.append(b"Content-Length: %d\r\n" % content_length)
+        if hs:
+            for h, v in hs.items():
+                if v is not None:
+                    parts.append(f"{h}: {v}\r\n".encode())
+        return parts
 
-    def error(self, unlight_exc):
+    def encode_headers(self, content_length=None):
+        return b"".join(self._head(content_length))
+
+    def entity_head(self, content_length):
+        ''' Content-Type, Content-Length and extra headers, pre-encoded for `send_encoded` '''
+        hs = self.headers
+        parts = []
+        if self.content_type and not (hs and "Content-Type" in hs):
+            parts.append(f"Content-Type: {self.content_type}\r\n".encode())
+        parts.append(b"Content-Length: %d\r\n" % content_length)
+        if hs:
+            for h, v in hs.items():
+                if v is not None:
+                    parts.append(f"{h}: {v}\r\n".encode())
+        return b"".join(parts)
+
+    def _send(self, enc_data):
+        ''' write body, compressed if client accepts it and it is worth it.
+            big bodies are compressed in the loop's thread pool: returns the task '''
+        size = len(enc_data)
+        if size >= compress.min_size and compress.is_compressible(self.content_type):
+            self.headers["Vary"] = "Accept-Encoding"
+            encoding = compress.negotiate(self.request.get_bheader(b"accept-encoding"))
+            if encoding:
+                if size >= compress.offload_size:
+                    return self.__protocol.loop.create_task(
+                            self._send_compressed(enc_data, encoding))
+                enc_data = compress.compress(enc_data, encoding)
+                self.headers["Content-Encoding"] = encoding
+        self._write_body(enc_data)
+
+    async def _send_compressed(self, enc_data, encoding):
+        enc_data = await self.__protocol.loop.run_in_executor(
+                None, compress.compress, enc_data, encoding)
+        self.headers["Content-Encoding"] = encoding
+        self._write_body(enc_data)
+
+    def _write_body(self, enc_data):
+        if self.capture is not None:
+            self.capture(self, enc_data)
+        parts = self._head(len(enc_data))
+        parts.append(b"\r\n")
+        parts.append(enc_data)
+        self.__protocol.write(b"".join(parts), self)
+
+    def error(self, unlight_exc, close=False):
+        ''' error response, written in order like any other (404, handler errors..).
+            `close`: protocol level error (parse, 413, timeout), the connection
+            is closed after it, requests behind it are dropped '''
+        if self.done: # already answered
+            return
+        if self.started: # partly written, can only cut it off
+            self.__protocol.close()
+            return
         self.code = unlight_exc.err_code
         self.msg = unlight_exc.err_msg
-        enc_headers = self.encode_headers()
-        self.__protocol.fatal(enc_headers + b"\r\n" + b"")
-        self.reset() # reset
+        self.content_type = "text/plain; charset=utf-8"
+        parts = self._head(0, close=close)
+        parts.append(b"\r\n")
+        if close:
+            self.__protocol.fatal(b"".join(parts), self)
+        else:
+            self.__protocol.write(b"".join(parts), self)
+
+    def not_modified(self, validators):
+        ''' 304, no body '''
+        self.code = 304
+        self.msg = STATUS_CODE_MSG[304]
+        self.content_type = None
+        self.headers.update(validators)
+        parts = self._head()
+        parts.append(b"\r\n")
+        self.__protocol.write(b"".join(parts), self)
+
+    def send_encoded(self, head, body):
+        ''' pre-encoded entity headers (Content-Type, Content-Length..) and body '''
+        self.content_type = None
+        parts = self._head()
+        parts.append(head)
+        parts.append(b"\r\n")
+        parts.append(body)
+        self.__protocol.write(b"".join(parts), self)
 
     def text(self, data):
-        enc_data = data.encode()
-        self.headers["Content-Type"] = "text/plain"
-        self.headers["Content-Length"] = len(enc_data)
-        self.__protocol.write(self.encode_headers() + b"\r\n" + enc_data)
+        return self._send(data.encode())
 
     def html(self, path):
-        data = None
-        with open(path) as f:
-            data = f.read()
-        enc_data = data.encode()
-        self.headers["Content-Type"] = "text/html"
-        self.headers["Content-Length"] = len(enc_data)
-        self.__protocol.write(self.encode_headers() + b"\r\n" + enc_data)
+        return self.file(path, "text/html")
 
     def json(self, data):
-        enc_data = json.dumps(data)
-        self.headers["Content-Type"] = "application/json"
-        self.headers["Content-Length"] = len(enc_data)
-        self.__protocol.write(self.encode_headers() + b"\r\n" + enc_data)
-
-    def file(self, path):
-        data = None
-        with open(path) as f:
-            data = f.read()
-        enc_data = data.encode()
-        self.headers["Content-Type"] = "application/octet-stream"
-        self.headers["Content-Length"] = len(enc_data)
-        self.__protocol.write(self.encode_headers() + b"\r\n" + enc_data)
+        self.content_type = "application/json"
+        return self._send(json.dumps(data))
+
+    async def stream(self, chunks, trailers=None):
+        ''' send (async) iterable of str/bytes chunks as they are produced:
+                await response.stream(rows_as_csv())
+            `trailers`: dict or callable returning dict, sent after the last chunk '''
+        if hasattr(chunks, "__aiter__"):
+            async for chunk in chunks:
+                await self.send(chunk)
+        else:
+            for chunk in chunks:
+                await self.send(chunk)
+        await self.end(trailers() if callable(trailers) else trailers)
+
+    async def send(self, chunk):
+        ''' write one body chunk (`Transfer-Encoding: chunked`), headers go out
+            with the first one. waits while the client is behind.
+            HTTP/1.0: raw body, the connection is closed at `end()` '''
+        if not self.started:
+            await self._start_chunked()
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if chunk: # empty chunk would end the body
+            protocol = self.__protocol
+            transport = protocol.transport
+            if not transport:
+                raise ConnectionResetError("Connection lost")
+            if self.http10:
+                transport.write(chunk)
+                self.sent += len(chunk)
+            else:
+                bsize = b"%x\r\n" % len(chunk)
+                transport.writelines((bsize, chunk, b"\r\n"))
+                self.sent += len(bsize) + len(chunk) + 2
+            await protocol.drain()
+
+    async def end(self, trailers=None):
+        ''' finish chunked body, with optional trailer headers (dropped for HTTP/1.0) '''
+        if self.done:
+            return
+        if not self.started:
+            await self._start_chunked()
+        protocol = self.__protocol
+        if self.http10: # body ends with the connection
+            protocol.end(self)
+            return
+        parts = [b"0\r\n"]
+        if trailers:
+            for h, v in trailers.items():
+                parts.append(f"{h}: {v}\r\n".encode())
+        parts.append(b"\r\n")
+        if protocol.transport:
+            data = b"".join(parts)
+            protocol.transport.write(data)
+            self.sent += len(data)
+        protocol.end(self)
+
+    async def _start_chunked(self):
+        protocol = self.__protocol
+        if not await protocol.wait_turn(self):
+            raise ConnectionResetError("Connection lost")
+        self.started = True
+        if self.http10: # no chunked encoding, no length: close delimits the body
+            self.close_after = True
+            parts = self._head(close=True)
+        else:
+            self.headers["Transfer-Encoding"] = "chunked"
+            parts = self._head()
+        parts.append(b"\r\n")
+        data = b"".join(parts)
+        protocol.transport.write(data)
+        self.sent += len(data)
+
+    def file(self, path, content_type="application/octet-stream"):
+        ''' stream file without reading it into memory,
+            returns the sending task (awaitable) '''
+        f = open(path, "rb")
+        size = fstat(f.fileno()).st_size
+        self.content_type = content_type
+        protocol = self.__protocol
+        return protocol.loop.create_task(
+                protocol.sendfile(self.encode_headers(size) + b"\r\n", f, size, self))
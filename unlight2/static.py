@@ -0,0 +1,224 @@
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from hashlib import blake2b
+from mimetypes import guess_type
+from os import stat
+from stat import S_ISREG
+
+from . import compress as _compress
+
+
+class StaticEntry:
+    ''' validators and (for small files) pre-encoded response of one file '''
+
+    __slots__ = (
+        "key",   # (inode, mtime_ns, size) -> invalidation
+        "content_type",
+        "etag",
+        "last_modified",
+        "mtime",
+        "size",
+        "head",  # pre-encoded entity headers
+        "body",  # None: not cached, stream it from disk
+        "compressible",
+        "variants" # encoding -> (head, body) | None (not smaller)
+    )
+
+    def __init__(self, st, path, body=None):
+        self.key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self.content_type = guess_type(path)[0] or "application/octet-stream"
+        if body is None:
+            etag = f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+        else:
+            etag = f'"{blake2b(body, digest_size=16).hexdigest()}"'
+        self.etag = etag
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.mtime = int(st.st_mtime)
+        self.size = st.st_size
+        self.compressible = (st.st_size >= _compress.min_size
+                and _compress.is_compressible(self.content_type))
+        self.head = self.encode_head(self.size)
+        self.body = body
+        self.variants = None
+
+    def variant_etag(self, encoding):
+        return f'{self.etag[:-1]}-{encoding}"'
+
+    def encode_head(self, size, encoding=None):
+        head = (f"Content-Type: {self.content_type}\r\n"
+                f"Content-Length: {size}\r\n"
+                f"ETag: {self.variant_etag(encoding) if encoding else self.etag}\r\n"
+                f"Last-Modified: {self.last_modified}\r\n")
+        if self.compressible:
+            head += "Vary: Accept-Encoding\r\n"
+        if encoding:
+            head += f"Content-Encoding: {encoding}\r\n"
+        return head.encode()
+
+    def validators(self, encoding=None):
+        validators = {"ETag": self.variant_etag(encoding) if encoding else self.etag,
+                "Last-Modified": self.last_modified}
+        if self.compressible:
+            validators["Vary"] = "Accept-Encoding"
+        if encoding:
+            validators["Content-Encoding"] = encoding
+        return validators
+
+    def not_modified(self, bif_none_match, bif_modified_since):
+        ''' conditional GET, `If-None-Match` wins over `If-Modified-Since` '''
+        if bif_none_match is not None:
+            etag = self.etag.encode()
+            variant_prefix = etag[:-1] + b"-"
+            for btag in bif_none_match.split(b","):
+                btag = btag.strip().removeprefix(b"W/")
+                if btag == b"*" or btag == etag or btag.startswith(variant_prefix):
+                    return True
+            return False
+        if bif_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(bif_modified_since.decode()).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return self.mtime <= since
+        return False
+
+
+class StaticCache:
+    ''' per-worker LRU of small static files, bounded by bytes.
+        entries are revalidated by stat (inode/mtime/size) on every lookup
+    '''
+
+    __slots__ = (
+        "max_bytes",
+        "max_file_size",
+        "entries",
+        "cur_bytes",
+        "hits",
+        "misses",
+        "evictions"
+    )
+
+    def __init__(self, max_bytes=32*1024*1024, max_file_size=256*1024):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.entries = OrderedDict() # path -> StaticEntry
+        self.cur_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, path):
+        ''' StaticEntry of a regular file or None '''
+        try:
+            st = stat(path)
+        except OSError:
+            return None
+        if not S_ISREG(st.st_mode):
+            return None
+
+        entries = self.entries
+        entry = entries.get(path)
+        if entry is not None:
+            if entry.key == (st.st_ino, st.st_mtime_ns, st.st_size):
+                self.hits += 1
+                entries.move_to_end(path)
+                return entry
+            self._remove(path)
+        self.misses += 1
+
+        if st.st_size > self.max_file_size:
+            return StaticEntry(st, path)
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except PermissionError: # not cached, answered 403 when opened to send
+            return StaticEntry(st, path)
+        except OSError:
+            return None
+        if len(body) != st.st_size: # changed while reading
+            return StaticEntry(st, path)
+        entry = StaticEntry(st, path, body)
+        self._add(path, entry)
+        return entry
+
+    def variant(self, path, entry, encoding):
+        ''' compressed (head, body) of a cached entry, from `<path>.gz|.br|.zst`
+            next to the file or compressed once here. None if not smaller '''
+        variants = entry.variants
+        if variants is None:
+            variants = entry.variants = {}
+        elif encoding in variants:
+            return variants[encoding]
+
+        body = None
+        sibling = self.sibling(path, entry, encoding)
+        if sibling and sibling[1] <= self.max_file_size:
+            try:
+                with open(sibling[0], "rb") as f:
+                    body = f.read()
+            except OSError:
+                body = None
+        if body is None:
+            body = _compress.compress(entry.body, encoding)
+        variant = None
+        if len(body) < entry.size:
+            variant = (entry.encode_head(len(body), encoding), body)
+        variants[encoding] = variant
+
+        if variant and self.entries.get(path) is entry:
+            self.cur_bytes += len(variant[0]) + len(body)
+            self._evict()
+        return variant
+
+    @staticmethod
+    def sibling(path, entry, encoding):
+        ''' (path, size) of precompressed file, if not older than the file itself '''
+        sibling = path + _compress.suffixes[encoding]
+        try:
+            st = stat(sibling)
+        except OSError:
+            return None
+        if not S_ISREG(st.st_mode) or st.st_mtime_ns < entry.key[1]:
+            return None
+        return sibling, st.st_size
+
+    def _add(self, path, entry):
+        size = self._size(entry)
+        if size > self.max_bytes:
+            return
+        entries = self.entries
+        entries[path] = entry
+        self.cur_bytes += size
+        self._evict()
+
+    def _evict(self):
+        entries = self.entries
+        while self.cur_bytes > self.max_bytes:
+            _, old = entries.popitem(last=False)
+            self.cur_bytes -= self._size(old)
+            self.evictions += 1
+
+    def _remove(self, path):
+        entry = self.entries.pop(path)
+        self.cur_bytes -= self._size(entry)
+
+    @staticmethod
+    def _size(entry):
+        size = len(entry.head) + len(entry.body)
+        if entry.variants:
+            for variant in entry.variants.values():
+                if variant:
+                    size += len(variant[0]) + len(variant[1])
+        return size
+
+    def clear(self):
+        self.entries.clear()
+        self.cur_bytes = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.cur_bytes}
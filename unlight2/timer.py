@@ -0,0 +1,122 @@
+#
+# coarse hierarchical timer wheel for connection timeouts
+#
+from time import monotonic
+
+from . import logbuffer
+unlight_logger = logbuffer.get_logger("unlight2")
+
+WHEEL_BITS = 6
+WHEEL_SIZE = 1 << WHEEL_BITS # slots per level
+WHEEL_MASK = WHEEL_SIZE - 1
+WHEEL_LEVELS = 3             # 64, 64*64, 64**3 ticks, longer ones wait in overflow
+
+
+class TimerHandle:
+    ''' same `cancel()` api as asyncio.TimerHandle '''
+
+    __slots__ = ("expires", "callback", "args", "bucket")
+
+    def __init__(self, expires, callback, args):
+        self.expires = expires # tick
+        self.callback = callback
+        self.args = args
+        self.bucket = None
+
+    def cancel(self):
+        bucket = self.bucket
+        if bucket is not None:
+            bucket.discard(self)
+            self.bucket = None
+
+    def cancelled(self):
+        return self.bucket is None
+
+
+class TimerWheel:
+    ''' one per worker loop: insert/cancel are O(1), a single loop timer ticks
+        every `tick` seconds and fires the slot that is due.
+        deadlines are rounded to whole ticks, fine for request/keep-alive timeouts
+    '''
+
+    __slots__ = ("loop", "tick", "now", "levels", "overflow", "start_time", "handle")
+
+    def __init__(self, loop, tick=1.0):
+        self.loop = loop
+        self.tick = tick
+        self.now = 0 # current tick
+        self.levels = [[set() for _ in range(WHEEL_SIZE)] for _ in range(WHEEL_LEVELS)]
+        self.overflow = set()
+        self.start_time = None
+        self.handle = None
+
+    def start(self):
+        if self.handle is None:
+            self.start_time = monotonic() - self.now * self.tick
+            self.handle = self.loop.call_later(self.tick, self._run)
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+    def call_later(self, delay, callback, *args):
+        ''' fires `delay` seconds from now or up to one tick later, never earlier:
+            the deadline is rounded up from the time elapsed into the current tick '''
+        if self.start_time is None: # not ticking yet, counts from `start()`
+            due = self.now * self.tick + delay
+        else:
+            due = monotonic() - self.start_time + delay
+        ticks = -(-due // self.tick) # ceil
+        handle = TimerHandle(max(int(ticks), self.now + 1), callback, args)
+        self._insert(handle)
+        return handle
+
+    def __len__(self):
+        return sum(len(bucket) for level in self.levels for bucket in level) + len(self.overflow)
+
+    def _insert(self, handle):
+        expires = handle.expires
+        delta = expires - self.now
+        for level in range(WHEEL_LEVELS):
+            if delta < WHEEL_SIZE << (WHEEL_BITS * level):
+                bucket = self.levels[level][(expires >> (WHEEL_BITS * level)) & WHEEL_MASK]
+                break
+        else:
+            bucket = self.overflow
+        bucket.add(handle)
+        handle.bucket = bucket
+
+    def _run(self):
+        target = int((monotonic() - self.start_time) / self.tick)
+        while self.now < target: # catch up if the loop was late
+            self._advance()
+        self.handle = self.loop.call_later(
+                self.start_time + (self.now + 1) * self.tick - monotonic(), self._run)
+
+    def _advance(self):
+        self.now += 1
+        now = self.now
+        # cascade upper levels when a lower level wraps around
+        for level in range(1, WHEEL_LEVELS):
+            if now & ((1 << (WHEEL_BITS * level)) - 1):
+                break
+            self._cascade(self.levels[level][(now >> (WHEEL_BITS * level)) & WHEEL_MASK])
+        else:
+            if not now & ((1 << (WHEEL_BITS * WHEEL_LEVELS)) - 1):
+                self._cascade(self.overflow)
+
+        bucket = self.levels[0][now & WHEEL_MASK]
+        while bucket:
+            handle = bucket.pop()
+            handle.bucket = None
+            try:
+                handle.callback(*handle.args)
+            except Exception as e:
+                unlight_logger.error("Unlight2 timer callback error: ------ ", e)
+
+    def _cascade(self, bucket):
+        handles = list(bucket)
+        bucket.clear()
+        for handle in handles:
+            self._insert(handle)
@@ -0,0 +1,171 @@
+#
+# request phase tracing, slow-request records and a sampling profiler
+#
+import asyncio
+import os
+import sys
+import threading
+from time import perf_counter, sleep, strftime
+
+import orjson as json
+
+from .exception import UnlightException
+from . import logbuffer
+unlight_logger = logbuffer.get_logger("unlight2")
+
+# `request.trace` slots, perf_counter() of each phase (0: not reached),
+# the request line (`on_url`) is `request.start`
+HEADERS, BODY, HANDLER_START, HANDLER_END, WRITE = range(5)
+PHASES = ("headers", "body", "handler_start", "handler_end", "write")
+
+MAX_PROFILE_SECONDS = 50 # stays under the default response_timeout
+
+
+class Tracer:
+    ''' per worker: requests get a `trace` list of phase times, the ones
+        taking `slow` seconds or longer (request line -> response written
+        and handler returned) are logged as json records. off (`Server(trace_slow=None)`) every
+        phase hook is a single `is not None` check '''
+
+    __slots__ = ("slow", "count")
+
+    def __init__(self, slow=0.5):
+        self.slow = slow
+        self.count = 0 # slow requests seen
+
+    def finish(self, response, remote_addr):
+        request = response.request
+        if request is None or request.trace is None or not request.start:
+            return
+        trace = request.trace
+        request.trace = None # finished once
+        start = request.start
+        total = perf_counter() - start
+        if total < self.slow:
+            return
+        self.count += 1
+        record = {
+            "method": request.method,
+            "url": (request.get_burl() or b"").decode(errors="replace"),
+            "code": response.code,
+            "remote": remote_addr[0] if remote_addr else None,
+            "received": request.received,
+            "sent": response.sent,
+            "total_ms": round(total * 1000, 3),
+            # ms after the request line, None: phase not reached
+            "phases": {name: round((at - start) * 1000, 3) if at else None
+                for name, at in zip(PHASES, trace)},
+            "pid": os.getpid()}
+        unlight_logger.warning("slow request %s", json.dumps(record).decode())
+
+
+class StackSampler:
+    ''' statistical profiler: a helper thread looks at the stack of
+        `thread_id` (the worker loop) every `interval` seconds and counts
+        it, `collapsed()` is the input of flamegraph.pl, speedscope.. '''
+
+    __slots__ = ("thread_id", "interval", "counts", "samples", "labels")
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {} # "root;..;leaf" -> samples
+        self.samples = 0
+        self.labels = {} # code -> frame label
+
+    def _label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = self.labels[code] = \
+                f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def run(self, seconds):
+        ''' blocks for `seconds`, call it from another thread '''
+        counts = self.counts
+        deadline = perf_counter() + seconds
+        while perf_counter() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None: # thread is gone
+                break
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            del frame
+            key = ";".join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+            self.samples += 1
+            sleep(self.interval)
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n"
+                for stack, count in sorted(self.counts.items()))
+
+
+class Profiler:
+    ''' runs a `StackSampler` on the worker it is asked on, one at a time:
+        1. admin route `GET <profile_path>?seconds=N[&pid=P]`, answered with
+           the collapsed stacks of the worker that took the connection
+           (`pid` given and not this worker: 409, retry on a new connection)
+        2. `kill -USR2 <worker pid>`: `seconds` of samples written to
+           `directory/unlight2-<pid>-<time>.collapsed`
+    '''
+
+    __slots__ = ("seconds", "directory", "interval", "busy")
+
+    def __init__(self, seconds=10, directory=None, interval=0.005):
+        self.seconds = seconds
+        self.directory = directory
+        self.interval = interval
+        self.busy = False
+
+    async def handler(self, request, response):
+        pid = os.getpid()
+        response.update_headers({"X-Worker-Pid": str(pid)})
+        try:
+            seconds = float(request.get_query("seconds", self.seconds))
+            want = int(request.get_query("pid", pid))
+        except ValueError:
+            raise UnlightException(400)
+        if want != pid or self.busy: # another worker took the connection / already sampling
+            raise UnlightException(409)
+        seconds = max(0.0, min(seconds, MAX_PROFILE_SECONDS))
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        self.busy = True
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, sampler.run, seconds)
+        finally:
+            self.busy = False
+        response.update_headers({"Content-Disposition":
+            f'attachment; filename="unlight2-{pid}.collapsed"'})
+        response.text(sampler.collapsed())
+
+    def signal_handler(self):
+        ''' loop signal handler (SIGUSR2) '''
+        if self.busy:
+            unlight_logger.warning("profile already running, SIGUSR2 ignored")
+            return
+        self.busy = True
+        loop = asyncio.get_running_loop()
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        path = os.path.join(self.directory,
+                f"unlight2-{os.getpid()}-{strftime('%Y%m%d%H%M%S')}.collapsed")
+        def run():
+            error = None
+            try:
+                sampler.run(self.seconds)
+                with open(path, "w") as f:
+                    f.write(sampler.collapsed())
+            except OSError as exc:
+                error = exc
+            loop.call_soon_threadsafe(self._written, path, sampler.samples, error)
+        threading.Thread(target=run, name="unlight2-profile", daemon=True).start()
+
+    def _written(self, path, samples, error):
+        self.busy = False
+        if error is not None:
+            unlight_logger.error("profile not written: %s", error)
+        else:
+            unlight_logger.info("profile written %s (%s samples)", path, samples)